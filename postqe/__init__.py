@@ -8,7 +8,9 @@
 from ase import units
 from .compute_vs import compute_v_bare, compute_v_h, compute_v_xc
 from .api import get_eos, get_band_structure, get_dos, get_charge, get_potential
-from .xmlfile import get_cell_data, get_calculation_data, get_band_strucure_data
-from .plot import plot1D_FFTinterp, plot2D_FFTinterp, simple_plot_xy, multiple_plot_xy, plot_EV, plot_bands
+from .xmlfile import get_cell_data, get_calculation_data, get_band_strucure_data, iter_steps, read_band_structure
+from .batch import scan_runs, analyze_runs, write_table
+from .plot import plot1D_FFTinterp, plot2D_FFTinterp, simple_plot_xy, multiple_plot_xy, plot_EV, plot_bands, \
+    set_interactive, render_sections, compute_sections, write_sections
 from .pyqe import *  # import Fortran APIs
 
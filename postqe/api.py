@@ -11,11 +11,11 @@
 A collection of functions to be part of postqe API and exposed to the user.
 """
 from ase.eos import EquationOfState
-from ase.dft import DOS
 from .charge import Charge, Potential
 from .readutils import read_EtotV
 from .ase.io import get_atoms_from_xml_output
 from .ase.calculator import PostqeCalculator
+from .dos_postqe import DOS
 
 
 def get_eos(label, eos='murnaghan'):
@@ -55,29 +55,20 @@ def get_band_structure(label, schema, reference_energy=0):
     return bs
 
 
-def get_dos(label, schema, width=0.01, npts=100):
+def get_dos(label, schema=None, width=0.01, npts=100, smearing=0):
     """
     This function returns an DOS object from an output xml Espresso file containing the results of a DOS calculation.
+    The DOS object has the same methods of ase.dft.DOS (get_energies and get_dos) and the
+    energies are relative to the Fermi level.
 
     :param label: defines the system and the xml file containing the results (possibly including the full path)
-    :param schema: the xml schema to be used to read and validate the xml output file
+    :param schema: not used, the bands are read from the xml file without validation
     :param width: width of the gaussian to be used for the DOS (in eV)
     :param npts:  number of points of the DOS
+    :param smearing: the smearing type, a value of ngauss or a name of pw.x smearing (default is Gaussian)
     :return: a DOS object
     """
-
-    # set a simple calculator, only to read the xml file results
-    calcul = PostqeCalculator(atoms=None, label=label, schema=schema)
-    # define the Atoms structure reading the xml file
-    atoms = get_atoms_from_xml_output(calcul.label + ".xml", schema=schema)
-    atoms.set_calculator(calcul)
-    # read the results
-    atoms.calc.read_results()
-
-    # Create a DOS object with width= eV and npts points
-    dos = DOS(calcul, width=width, npts=npts)
-
-    return dos
+    return DOS.from_xml(label + ".xml", width=width, npts=npts, smearing=smearing)
 
 def get_charge(label, schema):
     """
@@ -15,6 +15,9 @@ from ase.dft.band_structure import BandStructure
 from ase.calculators.calculator import all_changes, FileIOCalculator, Calculator, kpts2ndarray
 import ase.units as units
 from .io import get_atoms_from_xml_output
+from ..xmlfile import get_fast_dict
+from ..fermi import SMEARINGS, get_fermi_energy
+from ..symmetry import get_bz_to_ibz_map, get_grid_kpoints, unfold_kpoints
 
 
 # Fix python3 types
@@ -102,12 +105,22 @@ class PostqeCalculator(Calculator):
         if changed_parameters:
             self.reset()
 
-    def read_results(self):
+    def read_results(self, validation=True):
+        """
+        Reads the results from the xml file *label*.xml.
+
+        :param validation: if False the xml file is decoded with the fast non-validating \
+        path, without using the schema.
+        """
         filename = self.label + '.xml'
-        self.input = xmlschema.to_dict(filename, schema=self.schema, path=None)['input']
-        self.output = xmlschema.to_dict(filename, schema=self.schema, path=None)['output']
+        if validation:
+            data = xmlschema.to_dict(filename, schema=self.schema, path=None)
+        else:
+            data = get_fast_dict(filename)
+        self.input = data['input']
+        self.output = data['output']
         self.atoms = get_atoms_from_xml_output(filename, output=self.output)
-        self.results['energy'] = float(self.output["total_energy"]["etot"]) * units.Ry
+        self.results['energy'] = float(self.output["total_energy"]["etot"]) * units.Hartree
 
     def band_structure(self, reference=0):
         """Create band-structure object for plotting.
@@ -167,19 +180,36 @@ class PostqeCalculator(Calculator):
         return weights
 
     def get_fermi_level(self):
-        """Return the Fermi level.
-        Warning:
-        """
-        try:
-            ef = float(self.output["band_structure"]["fermi_energy"]) * units.Ry
-            return ef
-        except:
-            raise Warning("Fermi energy not defined or not in output file")
+        """Return the Fermi level (in eV, the xml file has it in Hartree).
+
+        If the Fermi energy is not in the xml file (e.g. for insulators and nscf
+        runs) it's computed from the eigenvalues, the number of electrons and the
+        smearing of the calculation. With fixed occupations this is the highest
+        occupied level."""
+        band_structure = self.output["band_structure"]
+        if band_structure.get("fermi_energy") is not None:
+            return float(band_structure["fermi_energy"]) * units.Hartree
+
+        degauss, ngauss = 0.0, 0
+        smearing = band_structure.get("smearing")
+        if isinstance(smearing, dict):
+            degauss = float(smearing["@degauss"]) / 2.0  # from Rydberg to Hartree
+            ngauss = SMEARINGS.get(str(smearing.get("$", "")).lower(), 0)
+        ef = get_fermi_energy(self.get_all_eigenvalues() / units.Hartree, self.get_k_point_weights(),
+                              float(band_structure["nelec"]), degauss, ngauss)
+        return ef * units.Hartree
+
+    def get_all_eigenvalues(self):
+        """Return the eigenvalues of all the k-points as a nks x nbnd array (in eV).
+
+        For spin-polarized calculations each row contains the bands with spin up
+        followed by the ones with spin down."""
+        ks_energies = self.output["band_structure"]["ks_energies"]
+        return np.array([ks['eigenvalues'] for ks in ks_energies], dtype=float) * units.Hartree
 
     def get_eigenvalues(self, kpt=0, spin=0):
-        """Return eigenvalues array."""
+        """Return eigenvalues array (in eV, the xml file has them in Hartree)."""
 
-        nat = (self.output["atomic_structure"]["@nat"])
         nbnd = int(self.output["band_structure"]["nbnd"])
         ks_energies = (self.output["band_structure"]["ks_energies"])
 
@@ -189,18 +219,18 @@ class PostqeCalculator(Calculator):
                 # get bands for spin up
                 for j in range(0, nbnd // 2):
                     # eigenvalue at k-point kpt, band j, spin up
-                    eigenvalues[j] = float(ks_energies[kpt]['eigenvalues'][j]) * 2 * nat * units.Ry
+                    eigenvalues[j] = float(ks_energies[kpt]['eigenvalues'][j]) * units.Hartree
             else:
                 # get bands for spin down
                 for j in range(nbnd // 2, nbnd):
                     # eigenvalue at k-point kpt, band j, spin down
-                    eigenvalues[j - nbnd // 2] = float(ks_energies[kpt]['eigenvalues'][j]) * 2 * nat * units.Ry
+                    eigenvalues[j - nbnd // 2] = float(ks_energies[kpt]['eigenvalues'][j]) * units.Hartree
         else:
             # non magnetic
             eigenvalues = np.zeros(nbnd)
             for j in range(0, nbnd):
                 # eigenvalue at k-point kpt, band j
-                eigenvalues[j] = float(ks_energies[kpt]['eigenvalues'][j]) * 2 * nat * units.Ry
+                eigenvalues[j] = float(ks_energies[kpt]['eigenvalues'][j]) * units.Hartree
 
         return eigenvalues
 
@@ -289,20 +319,57 @@ class PostqeCalculator(Calculator):
             atomic_species = [a_s]
         return atomic_species
 
-    # TODO: methods below are not implemented yet (do it if necessary)
+    def get_symmetry_rotations(self):
+        """Return the rotations of the crystal symmetries, as a nsym x 3 x 3 integer array.
+
+        A rotation transforms the crystal coordinates n of a vector of the direct
+        lattice into np.dot(r, n)."""
+        symmetries = self.output["symmetries"]["symmetry"]
+        if not isinstance(symmetries, list):
+            symmetries = [symmetries]
+
+        rotations = []
+        for symmetry in symmetries:
+            info = symmetry.get("info")
+            if isinstance(info, dict) and info.get("$", "crystal_symmetry") != "crystal_symmetry":
+                continue
+            rotation = symmetry["rotation"]
+            if isinstance(rotation, dict):
+                rotation = rotation["$"]
+            rotations.append(np.rint(np.array(rotation, dtype=float)).astype(int).reshape(3, 3))
+        return np.array(rotations, dtype=int).reshape(-1, 3, 3)
+
+    def _unfold_k_points(self):
+        """Unfolds the k-points of the calculation to the full Brillouin zone, on the
+        Monkhorst-Pack grid if the calculation used one."""
+        b = self.get_b_vectors()
+        time_reversal = not self.output["band_structure"].get("noncolin", False)
+        starting_k_points = self.output["band_structure"].get("starting_k_points") or {}
+        mp = starting_k_points.get("monkhorst_pack")
+        if mp is not None:
+            nk = [int(mp["@nk%d" % k]) for k in (1, 2, 3)]
+            shift = [int(mp["@k%d" % k]) for k in (1, 2, 3)]
+            bz_to_ibz = get_bz_to_ibz_map(self.get_k_points(), b, self.get_symmetry_rotations(),
+                                          nk, shift, time_reversal)[0]
+            return get_grid_kpoints(nk, shift), bz_to_ibz
+        return unfold_kpoints(self.get_k_points(), b, self.get_symmetry_rotations(), time_reversal)
+
     def get_bz_k_points(self):
         """Return all the k-points in the 1. Brillouin zone.
 
         The coordinates are relative to reciprocal lattice vectors."""
-        raise NotImplementedError
-        #return kpoints
+        return self._unfold_k_points()[0]
 
     def get_ibz_k_points(self):
         """Return k-points in the irreducible part of the Brillouin zone.
 
         The coordinates are relative to reciprocal lattice vectors."""
-        raise NotImplementedError
-        #return kpoints
+        return np.dot(self.get_k_points(), np.linalg.inv(self.get_b_vectors()))
+
+    def get_bz_to_ibz_map(self):
+        """Return the indices of the irreducible k-points equivalent to the k-points
+        of the 1. Brillouin zone (in the order of get_bz_k_points)."""
+        return self._unfold_k_points()[1]
 
     def get_pseudo_density(self, spin=None, pad=True):
         """Return pseudo-density array.
@@ -565,4 +632,4 @@ class EspressoCalculator(PostqeCalculator):
         filename = self.directory + '/temp/pwscf.xml'
         self.output = xmlschema.to_dict(filename, schema=self.schema, path="./output")
         self.atoms = get_atoms_from_xml_output(filename, output=self.output)
-        self.results['energy'] = float(self.output["total_energy"]["etot"]) * units.Ry
+        self.results['energy'] = float(self.output["total_energy"]["etot"]) * units.Hartree
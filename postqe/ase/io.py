@@ -10,7 +10,7 @@
 import re
 import numpy as np
 import xmlschema
-from ase.atoms import Atoms, Atom
+from ase.atoms import Atoms
 
 
 def split_atomic_symbol(x):
@@ -37,28 +37,26 @@ def get_atoms_from_xml_output(filename, schema=None, output=None):
         output = xmlschema.to_dict(
             filename, schema=schema, path="./qes:espresso/output"
         )
-    a1 = np.array(output["atomic_structure"]["cell"]["a1"])
-    a2 = np.array(output["atomic_structure"]["cell"]["a2"])
-    a3 = np.array(output["atomic_structure"]["cell"]["a3"])
+    cell = np.array([
+        output["atomic_structure"]["cell"]["a1"],
+        output["atomic_structure"]["cell"]["a2"],
+        output["atomic_structure"]["cell"]["a3"]
+    ], dtype=float)
     a_p = (output["atomic_structure"]["atomic_positions"]["atom"])
+    if not isinstance(a_p, list):
+        a_p = [a_p]
 
-    atoms = Atoms()
-
-    # First define the unit cell from a1, a2, a3 and alat
-    cell = np.zeros((3, 3))
-    cell[0] = a1
-    cell[1] = a2
-    cell[2] = a3
-    atoms.set_cell(cell)
-
-    # Now the atoms in the unit cell
+    # Split the species names only once for each distinct name
+    # TODO: extend to all possible cases the symbol splitting (for now, only numbering up to 9 work). Not a very common case...
+    species = {}
     for atomx in a_p:
-        # TODO: extend to all possible cases the symbol splitting (for now, only numbering up to 9 work). Not a very common case...
-        symbol = split_atomic_symbol(atomx['@name'])[0]
-        x = float(atomx['$'][0])
-        y = float(atomx['$'][1])
-        z = float(atomx['$'][2])
-        atoms.append(Atom(symbol, (x, y, z)))
+        if atomx['@name'] not in species:
+            species[atomx['@name']] = split_atomic_symbol(atomx['@name'])[0]
+    symbols = [species[atomx['@name']] for atomx in a_p]
+    positions = np.array([atomx['$'] for atomx in a_p], dtype=float)
+
+    # Build the Atoms object in a single step, from the symbols, the positions and the unit cell
+    atoms = Atoms(symbols, positions=positions, cell=cell)
 
     return atoms
 
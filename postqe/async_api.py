@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Asyncio counterparts of some functions of postqe API (requires Python 3.5+).
+
+The blocking stages (xml parsing, HDF5 reading and FFTs) are run in an executor, so
+many calls can be awaited together. Concurrent calls for the same label share the same
+pending task, hence a charge file is never loaded twice at the same time.
+"""
+import asyncio
+from .charge import Charge, Potential
+from .ase.calculator import PostqeCalculator
+
+# Pending tasks, keyed by event loop, function name and arguments
+_pending_tasks = {}
+
+
+def _shared_task(key, coroutine_function, *args):
+    """
+    Returns the pending task for *key* or creates a new one running coroutine_function(*args).
+    The task is removed from the pending ones when it's done.
+    """
+    loop = asyncio.get_event_loop()
+    key = (loop,) + key
+    try:
+        return _pending_tasks[key]
+    except KeyError:
+        task = _pending_tasks[key] = loop.create_task(coroutine_function(*args))
+        task.add_done_callback(lambda t: _pending_tasks.pop(key, None))
+        return task
+
+
+def read_calculator(label, schema):
+    """Creates a calculator and reads the results from the xml file (blocking)."""
+    calcul = PostqeCalculator(atoms=None, label=label, schema=schema)
+    calcul.read_results()
+    calcul.atoms.set_calculator(calcul)
+    return calcul
+
+
+def read_charge(calcul):
+    """Reads the charge from the HDF5 file of a calculator (blocking)."""
+    charge = Charge(calcul.get_nr())
+    charge.read(calcul.label + ".save/charge-density.hdf5")
+    charge.set_calculator(calcul)
+    return charge
+
+
+def compute_potential(charge, pot_type):
+    """Computes a potential from a charge (blocking)."""
+    potential = Potential(charge.nr, charge=charge.charge, charge_diff=charge.charge_diff)
+    potential.set_calculator(charge.calculator)
+    potential.compute_potential(pot_type=pot_type)
+    return potential
+
+
+async def _load_charge(label, schema, executor):
+    loop = asyncio.get_event_loop()
+    calcul = await loop.run_in_executor(executor, read_calculator, label, schema)
+    return await loop.run_in_executor(executor, read_charge, calcul)
+
+
+async def _load_potential(label, schema, pot_type, executor):
+    charge = await get_charge(label, schema, executor)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, compute_potential, charge, pot_type)
+
+
+async def get_charge(label, schema, executor=None):
+    """
+    Asyncio version of api.get_charge(). Concurrent calls for the same label and schema
+    return the same Charge object, that is read only once.
+
+    :param label: defines the system and the xml file containing the results (possibly including the full path)
+    :param schema: the xml schema to be used to read and validate the xml output file
+    :param executor: the executor for blocking stages (default is the event loop's default executor)
+    :return a Charge object
+    """
+    task = _shared_task(('charge', label, schema), _load_charge, label, schema, executor)
+    return await asyncio.shield(task)
+
+
+async def get_potential(label, schema, pot_type='v_tot', executor=None):
+    """
+    Asyncio version of api.get_potential(). The charge is loaded with get_charge(), so it's
+    shared with the other pending calls for the same label, and concurrent calls for the
+    same potential return the same Potential object.
+
+    :param label: defines the system and the xml file containing the results (possibly including the full path)
+    :param schema: the xml schema to be used to read and validate the xml output file
+    :param pot_type: 'v_bare', 'v_h', 'v_xc' or 'v_tot'
+    :param executor: the executor for blocking stages (default is the event loop's default executor)
+    :return a Potential object
+    """
+    task = _shared_task(('potential', label, schema, pot_type), _load_potential,
+                        label, schema, pot_type, executor)
+    return await asyncio.shield(task)
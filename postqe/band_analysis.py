@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Analysis of the band edges from the arrays of eigenvalues: band gap, direct or indirect
+nature of the gap and parabolic effective masses at the band extrema.
+
+The effective masses are obtained by a least squares fit of a quadratic form to the
+eigenvalues of the nearest k-points of a full Monkhorst-Pack grid (see
+symmetry.get_bz_to_ibz_map), so they are as accurate as the grid is dense. The fit is
+done for a single band, so the masses of degenerate band edges (like the top of the
+valence band of silicon at Gamma) are not computed. Energies are in eV, effective masses
+in units of the electron mass.
+"""
+import numpy as np
+from .constants import tpi, ev_to_ry
+from .fermi import get_band_edges
+
+
+def get_direct_gap(eigenvalues, ef):
+    """
+    Gets the smallest gap between the occupied and the empty states of the same k-point.
+
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param ef: the Fermi energy (same units of the eigenvalues)
+    :return: the direct gap and the index of its k-point (NaN and -1 if there aren't \
+    occupied and empty states at the same k-points)
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    occupied = eigenvalues <= ef
+    valence = np.where(occupied, eigenvalues, -np.inf).max(axis=1)
+    conduction = np.where(occupied, np.inf, eigenvalues).min(axis=1)
+    gaps = conduction - valence
+    if not np.isfinite(gaps).any():
+        return np.nan, -1
+    ik = int(np.argmin(gaps))
+    return gaps[ik], ik
+
+
+def get_effective_masses(x, energies, center, b, alat, npoints=19):
+    """
+    Computes the principal effective masses of a band at a k-point, from the fit of a
+    quadratic form to the energies of the nearest k-points (the neighbours are taken
+    up to full shells, the distances are the ones between periodic images).
+
+    :param x: the crystal coordinates of the k-points (a nks x 3 array)
+    :param energies: the energies of the band at the k-points (in eV)
+    :param center: the index of the k-point of the band extremum
+    :param b: the reciprocal lattice vectors (2pi/alat units)
+    :param alat: the lattice parameter (in a.u.)
+    :param npoints: the minimum number of k-points of the fit, including the center
+    :return: the three masses, sorted by absolute value. The masses are negative \
+    for a maximum. NaN values are returned if the k-points are not enough for the fit.
+    """
+    x = np.asarray(x, dtype=float).reshape(-1, 3)
+    dx = x - x[center]
+    dk = np.dot(dx - np.rint(dx), b) * tpi / alat  # in a.u.
+    distances = np.linalg.norm(dk, axis=1)
+    if len(x) < 10:
+        return np.full(3, np.nan)
+
+    radius = np.sort(distances)[min(npoints, len(x)) - 1]
+    near = distances <= radius * (1.0 + 1.0E-6)
+    kx, ky, kz = dk[near].T
+    matrix = np.column_stack((np.ones(kx.size), kx, ky, kz, kx * kx, ky * ky, kz * kz, kx * ky, kx * kz, ky * kz))
+    coeffs, residuals, rank, sv = np.linalg.lstsq(matrix, np.asarray(energies)[near] * ev_to_ry / 2.0, rcond=None)
+    if rank < 10:
+        return np.full(3, np.nan)
+
+    # The Hessian is the inverse of the effective mass tensor (in Hartree atomic units)
+    c = coeffs[4:]
+    hessian = np.array([[2.0 * c[0], c[3], c[4]], [c[3], 2.0 * c[1], c[5]], [c[4], c[5], 2.0 * c[2]]])
+    with np.errstate(divide='ignore'):
+        masses = 1.0 / np.linalg.eigvalsh(hessian)
+    return masses[np.argsort(np.abs(masses))]
+
+
+def analyze_bands(eigenvalues, ef, x=None, bz_to_ibz=None, b=None, alat=None, npoints=19, tol=1.0E-4):
+    """
+    Analyzes the band edges. The effective masses are computed only for insulators and
+    when the k-points of the full grid are given. The masses of a band edge shared by
+    more bands at the same k-point are NaN, because the bands of a degenerate edge can
+    cross and they can't be fitted separately.
+
+    :param eigenvalues: the eigenvalues of the irreducible k-points (a nks x nbnd array, in eV)
+    :param ef: the Fermi energy (in eV)
+    :param x: the crystal coordinates of the k-points of the full grid
+    :param bz_to_ibz: the indices of the irreducible k-points equivalent to the k-points of the grid
+    :param b: the reciprocal lattice vectors (2pi/alat units)
+    :param alat: the lattice parameter (in a.u.)
+    :param npoints: the minimum number of k-points of the fits of the effective masses
+    :param tol: the tolerance on the eigenvalues of a degenerate band edge (in eV)
+    :return: a dictionary with the band edges vbm and cbm, the gap, the direct gap, \
+    the flag direct, the indices k_vbm and k_cbm of the irreducible k-points of the band \
+    edges, and the effective masses of the holes and of the electrons (the principal masses \
+    hole_masses and electron_masses, and their conductivity averages hole_mass and electron_mass)
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    vbm, cbm, gap = get_band_edges(eigenvalues, ef)
+    direct_gap, k_direct = get_direct_gap(eigenvalues, ef)
+    result = dict(vbm=vbm, cbm=cbm, gap=gap, direct_gap=direct_gap, direct=False, k_vbm=-1, k_cbm=-1,
+                  hole_masses=np.full(3, np.nan), electron_masses=np.full(3, np.nan),
+                  hole_mass=np.nan, electron_mass=np.nan)
+    if not gap > 0.0:
+        return result
+
+    k_vbm, n_vbm = np.unravel_index(np.argmax(np.where(eigenvalues <= ef, eigenvalues, -np.inf)), eigenvalues.shape)
+    k_cbm, n_cbm = np.unravel_index(np.argmin(np.where(eigenvalues > ef, eigenvalues, np.inf)), eigenvalues.shape)
+    result.update(k_vbm=int(k_vbm), k_cbm=int(k_cbm), direct=bool(np.isclose(direct_gap, gap)))
+
+    if x is not None:
+        grid_eigenvalues = eigenvalues[bz_to_ibz]
+        for name, ik, band, sign in (('hole', k_vbm, n_vbm, -1.0), ('electron', k_cbm, n_cbm, 1.0)):
+            if np.count_nonzero(np.abs(eigenvalues[ik] - eigenvalues[ik, band]) < tol) > 1:
+                continue
+            center = np.flatnonzero(bz_to_ibz == ik)[0]
+            masses = sign * get_effective_masses(x, grid_eigenvalues[:, band], center, b, alat, npoints)
+            result[name + '_masses'] = masses
+            result[name + '_mass'] = 3.0 / np.sum(1.0 / masses)
+    return result
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Interpolation of the bands with star functions (Shankland-Koelling-Wood method, in the
+formulation of W. E. Pickett, H. Krakauer and P. B. Allen, PRB 38, 2721 (1988)).
+
+The bands are expanded in star functions S_m(k), the averages of cos(2pi k.R) over the
+lattice vectors R of a star (the vectors equivalent by symmetry), and the expansion
+passes exactly through the computed eigenvalues while minimizing a roughness function.
+The star functions are computed with array operations, in chunks of k-points.
+
+Units are the ones of the xml file: k-points in 2pi/alat units, lattice vectors in alat units.
+"""
+import numpy as np
+from .xmlfile import read_band_structure, read_symmetries
+from .symmetry import kpoint_keys
+from .constants import ev_to_ry
+
+# Default memory ceiling (in bytes) for the temporary matrix of the phases
+MAX_MEMORY = 64 * 1024 ** 2
+
+
+def get_stars(a, rotations, nstars):
+    """
+    Gets the shortest stars of lattice vectors. The inversion is always added to the
+    symmetries, because of time reversal symmetry.
+
+    :param a: the direct lattice vectors (alat units)
+    :param rotations: the rotations of the crystal symmetries, in crystal coordinates
+    :param nstars: the number of stars
+    :return: the vectors of the stars (in alat units, grouped by star and ordered by \
+    length) and the array of nstars + 1 offsets of each star into the vectors
+    """
+    a = np.asarray(a, dtype=float)
+    rotations = np.asarray(rotations, dtype=int).reshape(-1, 3, 3)
+    rotations = np.unique(np.concatenate((rotations, -rotations)), axis=0)
+    b = np.linalg.inv(a).T
+    volume = abs(np.linalg.det(a))
+
+    # The radius of the sphere that contains about nstars * nsym lattice vectors
+    radius = 1.5 * (3.0 * volume * (nstars + 1) * len(rotations) / (4.0 * np.pi)) ** (1.0 / 3.0)
+    while True:
+        nmax = np.ceil(radius * np.linalg.norm(b, axis=1)).astype(int)
+        n = np.indices(2 * nmax + 1).reshape(3, -1).T - nmax
+        lengths = np.linalg.norm(np.dot(n, a), axis=1)
+        order = np.argsort(lengths[lengths <= radius], kind='stable')
+        n, lengths = n[lengths <= radius][order], lengths[lengths <= radius][order]
+
+        # The key of a star is the minimum index of its vectors into the box
+        sizes = 4 * nmax + 1
+        key = np.full(len(n), np.iinfo(int).max)
+        for rotation in rotations:
+            images = np.dot(n, rotation.T) + 2 * nmax
+            key = np.minimum(key, np.ravel_multi_index(images.T, sizes))
+        first = np.unique(key, return_index=True)[1]
+        first = np.sort(first)
+        complete = lengths[first] < radius - 1.0E-6  # the stars on the surface may be truncated
+        if np.count_nonzero(complete) >= nstars:
+            break
+        radius *= 1.5
+
+    # The stars are ordered by length, as their first vectors
+    star_keys = key[first[:nstars]]
+    sorter = np.argsort(star_keys)
+    rank = sorter[np.minimum(np.searchsorted(star_keys, key, sorter=sorter), nstars - 1)]
+    selected = star_keys[rank] == key
+    order = np.argsort(rank[selected], kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(rank[selected], minlength=nstars))))
+    return np.dot(n[selected][order], a), offsets
+
+
+def star_functions(kpoints, vectors, offsets, max_memory=MAX_MEMORY):
+    """
+    Computes the star functions at the given k-points.
+
+    :param kpoints: the k-points (a nks x 3 array, 2pi/alat units)
+    :param vectors: the vectors of the stars (alat units), see get_stars
+    :param offsets: the offsets of each star into the vectors
+    :param max_memory: the memory ceiling (in bytes) for the temporary matrix of the phases
+    :return: a nks x nstars array
+    """
+    kpoints = np.asarray(kpoints, dtype=float).reshape(-1, 3)
+    counts = np.diff(offsets)
+    values = np.empty((len(kpoints), len(counts)))
+    chunk_size = max(1, int(max_memory // (8 * max(len(vectors), 1))))
+    for start in range(0, len(kpoints), chunk_size):
+        phases = np.cos(2.0 * np.pi * np.dot(kpoints[start:start + chunk_size], vectors.T))
+        values[start:start + chunk_size] = np.add.reduceat(phases, offsets[:-1], axis=1) / counts
+    return values
+
+
+def get_irreducible_kpoints(kpoints, a, rotations, tol=1.0E-6):
+    """
+    Finds the k-points that are not equivalent by symmetry (including time reversal) or
+    by a translation of the reciprocal lattice.
+
+    :param kpoints: the k-points (a nks x 3 array, 2pi/alat units)
+    :param a: the direct lattice vectors (alat units)
+    :param rotations: the rotations of the crystal symmetries, in crystal coordinates
+    :param tol: the tolerance on the crystal coordinates of the k-points
+    :return: the indices of the first k-point of each class of equivalent ones
+    """
+    rotations = np.asarray(rotations, dtype=int).reshape(-1, 3, 3)
+    x = np.dot(kpoints, np.transpose(a))  # crystal coordinates
+
+    # The rotation of a direct lattice vector by r is a rotation of k by inv(r).T
+    keys = None
+    for rotation in np.concatenate((rotations, -rotations)):
+        images = kpoint_keys(np.dot(x, np.linalg.inv(rotation)), tol)
+        keys = images if keys is None else np.minimum(keys, images)
+    return np.sort(np.unique(keys, return_index=True)[1])
+
+
+def fit_bands(kpoints, eigenvalues, a, rotations, lpratio=5, max_memory=MAX_MEMORY):
+    """
+    Fits the bands with star functions. The fit passes exactly through the eigenvalues
+    and minimizes the roughness of the interpolation.
+
+    :param kpoints: the k-points (a nks x 3 array, 2pi/alat units), of the irreducible \
+    wedge or of the full grid (the equivalent k-points are removed)
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param a: the direct lattice vectors (alat units)
+    :param rotations: the rotations of the crystal symmetries, in crystal coordinates
+    :param lpratio: the ratio between the number of star functions and the number of k-points
+    :param max_memory: the memory ceiling (in bytes) for the temporary matrix of the phases
+    :return: the vectors and the offsets of the stars (see get_stars) and the coefficients \
+    of the star functions (a nstars x nbnd array)
+    """
+    kpoints = np.asarray(kpoints, dtype=float).reshape(-1, 3)
+    eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(len(kpoints), -1)
+    irreducible = get_irreducible_kpoints(kpoints, a, rotations)
+    kpoints, eigenvalues = kpoints[irreducible], eigenvalues[irreducible]
+    vectors, offsets = get_stars(a, rotations, max(2, lpratio * len(kpoints)))
+    values = star_functions(kpoints, vectors, offsets, max_memory)
+
+    # Roughness of the star functions, the first star is the origin
+    r = np.linalg.norm(vectors[offsets[1:-1]], axis=1) / np.linalg.norm(vectors[offsets[1]])
+    roughness = (1.0 - 0.75 * r ** 2) ** 2 + 0.75 * r ** 6
+
+    coefficients = np.zeros((len(offsets) - 1, eigenvalues.shape[1]))
+    if len(kpoints) > 1:
+        ds = values[:-1, 1:] - values[-1, 1:]
+        h = np.dot(ds / roughness, ds.T)
+        lambdas = np.linalg.solve(h, eigenvalues[:-1] - eigenvalues[-1])
+        coefficients[1:] = np.dot(ds.T, lambdas) / roughness[:, None]
+    coefficients[0] = eigenvalues[-1] - np.dot(values[-1, 1:], coefficients[1:])
+    return vectors, offsets, coefficients
+
+
+def interpolate_bands(kpoints, vectors, offsets, coefficients, max_memory=MAX_MEMORY):
+    """
+    Computes the bands at the given k-points from the fit of fit_bands.
+
+    :param kpoints: the k-points (a nks x 3 array, 2pi/alat units)
+    :param vectors: the vectors of the stars (alat units)
+    :param offsets: the offsets of each star into the vectors
+    :param coefficients: the coefficients of the star functions
+    :param max_memory: the memory ceiling (in bytes) for the temporary matrix of the phases
+    :return: the bands (a nks x nbnd array, same units of the fitted eigenvalues)
+    """
+    return np.dot(star_functions(kpoints, vectors, offsets, max_memory), coefficients)
+
+
+def get_mp_kpoints(nk, b, shift=(0, 0, 0)):
+    """
+    Gets the k-points of a full Monkhorst-Pack grid, in the order of the flattened grid
+    (C order) used by the tetrahedron methods.
+
+    :param nk: the sizes of the grid
+    :param b: the reciprocal lattice vectors
+    :param shift: the offsets of the grid (0 or 1 for each direction)
+    :return: a nk1*nk2*nk3 x 3 array
+    """
+    nk = np.asarray(nk, dtype=int)
+    x = (np.indices(nk).reshape(3, -1).T + np.asarray(shift) / 2.0) / nk
+    return np.dot(x, b)
+
+
+def interpolate_xml_bands(xmlfile, kpoints, lpratio=5, max_memory=MAX_MEMORY):
+    """
+    Interpolates the bands of a pw.x run at the given k-points, using the k-points
+    and the symmetries of the xml file.
+
+    :param xmlfile: xml output file from QE
+    :param kpoints: the k-points (a nks x 3 array, 2pi/alat units)
+    :param lpratio: the ratio between the number of star functions and the number of k-points
+    :param max_memory: the memory ceiling (in bytes) for the temporary matrix of the phases
+    :return: the bands (a nks x nbnd array, in eV)
+    """
+    bands = read_band_structure(xmlfile)
+    a = np.linalg.inv(bands['b']).T
+    fit = fit_bands(bands['kpoints'], bands['eigenvalues'] * 2.0 / ev_to_ry, a,
+                    read_symmetries(xmlfile), lpratio, max_memory)
+    return interpolate_bands(kpoints, *fit, max_memory=max_memory)
@@ -4,113 +4,371 @@
 """
 Functions to calculate the electronic band structure.
 
-Note: no symmetry recognition is implemented yet.
+The high symmetry points are recognized from a table of the standard points of the
+Brillouin zone of each Bravais lattice. The lattice is identified from the cell vectors,
+so the points are labelled also for the cells given without a Bravais lattice index
+(ibrav=0) in the input of pw.x.
 """
 
+import os
+import itertools
 import numpy as np
-from math import fabs, sqrt
-from postqe.xmlfile import get_cell_data, get_calculation_data, get_band_strucure_data
+from postqe.xmlfile import read_band_structure
+from postqe.symmetry import kpoint_keys
 from postqe.constants import ev_to_ry
 
+# Standard high symmetry points of the Brillouin zone of the Bravais lattices, from
+# W. Setyawan and S. Curtarolo, Comput. Mater. Sci. 49, 299 (2010). The keys are the
+# symbols of get_bravais_lattice, the coordinates are crystal coordinates of the reciprocal
+# vectors of the primitive cells of that paper, and only the points that don't depend on
+# the lattice parameters are listed (so the face-centered orthorhombic and the centered
+# monoclinic lattices have few points). Equivalent points (like U and K of the fcc
+# lattice) get the label of the first one.
+HIGH_SYMMETRY_POINTS = {
+    'cP': {'G': (0.0, 0.0, 0.0), 'X': (0.0, 0.5, 0.0), 'M': (0.5, 0.5, 0.0), 'R': (0.5, 0.5, 0.5)},
+    'cF': {'G': (0.0, 0.0, 0.0), 'X': (0.5, 0.0, 0.5), 'L': (0.5, 0.5, 0.5), 'W': (0.5, 0.25, 0.75),
+           'K': (0.375, 0.375, 0.75), 'U': (0.625, 0.25, 0.625)},
+    'cI': {'G': (0.0, 0.0, 0.0), 'H': (0.5, -0.5, 0.5), 'N': (0.0, 0.0, 0.5), 'P': (0.25, 0.25, 0.25)},
+    'tP': {'G': (0.0, 0.0, 0.0), 'X': (0.0, 0.5, 0.0), 'M': (0.5, 0.5, 0.0), 'Z': (0.0, 0.0, 0.5),
+           'R': (0.0, 0.5, 0.5), 'A': (0.5, 0.5, 0.5)},
+    'tI1': {'G': (0.0, 0.0, 0.0), 'M': (-0.5, 0.5, 0.5), 'N': (0.0, 0.5, 0.0), 'P': (0.25, 0.25, 0.25),
+            'X': (0.0, 0.0, 0.5)},
+    'tI2': {'G': (0.0, 0.0, 0.0), 'N': (0.0, 0.5, 0.0), 'P': (0.25, 0.25, 0.25), 'X': (0.0, 0.0, 0.5),
+            'Z': (0.5, 0.5, -0.5)},
+    'oP': {'G': (0.0, 0.0, 0.0), 'X': (0.5, 0.0, 0.0), 'Y': (0.0, 0.5, 0.0), 'Z': (0.0, 0.0, 0.5),
+           'S': (0.5, 0.5, 0.0), 'U': (0.5, 0.0, 0.5), 'T': (0.0, 0.5, 0.5), 'R': (0.5, 0.5, 0.5)},
+    'oC': {'G': (0.0, 0.0, 0.0), 'S': (0.0, 0.5, 0.0), 'R': (0.0, 0.5, 0.5), 'Y': (-0.5, 0.5, 0.0),
+           'Z': (0.0, 0.0, 0.5), 'T': (-0.5, 0.5, 0.5)},
+    'oI': {'G': (0.0, 0.0, 0.0), 'R': (0.0, 0.5, 0.0), 'S': (0.5, 0.0, 0.0), 'T': (0.0, 0.0, 0.5),
+           'W': (0.25, 0.25, 0.25)},
+    'oF': {'G': (0.0, 0.0, 0.0), 'L': (0.5, 0.5, 0.5)},
+    'hP': {'G': (0.0, 0.0, 0.0), 'M': (0.5, 0.0, 0.0), 'K': (1.0 / 3.0, 1.0 / 3.0, 0.0), 'A': (0.0, 0.0, 0.5),
+           'L': (0.5, 0.0, 0.5), 'H': (1.0 / 3.0, 1.0 / 3.0, 0.5)},
+    'hR1': {'G': (0.0, 0.0, 0.0), 'L': (0.5, 0.0, 0.0), 'F': (0.5, 0.5, 0.0), 'Z': (0.5, 0.5, 0.5)},
+    'hR2': {'G': (0.0, 0.0, 0.0), 'L': (0.5, 0.0, 0.0), 'F': (0.5, -0.5, 0.0), 'Z': (0.5, -0.5, 0.5)},
+    'mP': {'G': (0.0, 0.0, 0.0), 'Z': (0.5, 0.0, 0.0), 'X': (0.0, 0.5, 0.0), 'Y': (0.0, 0.0, 0.5),
+           'A': (0.5, 0.5, 0.0), 'C': (0.0, 0.5, 0.5), 'D': (0.5, 0.0, 0.5), 'E': (0.5, 0.5, 0.5)},
+    'mC': {'G': (0.0, 0.0, 0.0), 'N': (0.5, 0.0, 0.0), 'Z': (0.0, 0.0, 0.5), 'L': (0.5, 0.5, 0.5)},
+    'aP': {'G': (0.0, 0.0, 0.0), 'X': (0.5, 0.0, 0.0), 'Y': (0.0, 0.5, 0.0), 'Z': (0.0, 0.0, 0.5),
+           'L': (0.5, 0.5, 0.0), 'M': (0.0, 0.5, 0.5), 'N': (0.5, 0.0, 0.5), 'R': (0.5, 0.5, 0.5)},
+}
+
+# The primitive cells of the centered lattices, in terms of the vectors of the conventional cell
+PRIMITIVE_CELLS = {
+    'F': ((0.0, 0.5, 0.5), (0.5, 0.0, 0.5), (0.5, 0.5, 0.0)),
+    'I': ((-0.5, 0.5, 0.5), (0.5, -0.5, 0.5), (0.5, 0.5, -0.5)),
+    'oC': ((0.5, -0.5, 0.0), (0.5, 0.5, 0.0), (0.0, 0.0, 1.0)),
+    'mC': ((0.5, 0.5, 0.0), (-0.5, 0.5, 0.0), (0.0, 0.0, 1.0)),
+}
+
 
 def compute_bands(xmlfile, filebands='filebands', spin_component=''):
     """
-    """
+    Reads the band structure from the xml file and writes it into *filebands*, in the
+    text format of bands.x or, for the extensions .npz, .h5 and .hdf5, in a binary file
+    (see write_bands).
 
-    ibrav, alat, a, b, nat, ntyp, atomic_positions, atomic_species = get_cell_data(xmlfile)
-    prefix, outdir, ecutwfc, ecutrho, functional, lsda, noncolin, pseudodir, nr, nr_smooth = \
-        get_calculation_data(xmlfile)
-    nks, nbnd, ks_energies = get_band_strucure_data(xmlfile)
-
-    # open output file
-    fout = open(filebands, "w")
-    fout.write("& plot  nbnd = "+str(nbnd)+" nks = "+str(nks)+" /\n")
-
-    kpoints = np.zeros((nks, 3))
-    bands = np.zeros((nks, nbnd))
-    if lsda:   # magnetic
-        for i in range(0, nks):
-            kpoints[i] = ks_energies[i]['k_point']['$']
-            fout.write(12 * ' ' + ' {:.6E}'.format(kpoints[i,0]) + ' {:.6E}'.format(kpoints[i,1]) + ' {:.6E}\n'.format(kpoints[i,2]))
-            if (spin_component==1):     # get bands for spin up
-                for j in range(0, nbnd // 2):
-                    bands[i,j] = ks_energies[i]['eigenvalues'][j] * 2 * nat / ev_to_ry          # eigenvalue at k-point i, band j
-                    fout.write('   {:.3E}'.format(bands[i,j]))
-            else:                       # get bands for spin down
-                for j in range(nbnd // 2, nbnd):
-                    bands[i, j] = ks_energies[i]['eigenvalues'][j] * 2 * nat / ev_to_ry          # eigenvalue at k-point i, band j
-                    fout.write('   {:.3E}'.format(bands[i,j]))
-            fout.write('\n')
-
-    else:       # non magnetic
-        for i in range(0, nks):
-            kpoints[i] = ks_energies[i]['k_point']['$']
-            fout.write(12 * ' ' + ' {:.6E}'.format(kpoints[i,0]) + ' {:.6E}'.format(kpoints[i,1]) + ' {:.6E}\n'.format(kpoints[i,2]))
-            for j in range(0, nbnd):
-                bands[i, j] = ks_energies[i]['eigenvalues'][j] * nat / ev_to_ry           # eigenvalue at k-point i, band j
-                fout.write('   {:.3E}'.format(bands[i,j]))
-            fout.write('\n')
+    :param xmlfile: xml output file from QE
+    :param filebands: the output file with the bands
+    :param spin_component: for a magnetic calculation, 1 for the bands with spin up, otherwise spin down
+    :return: the k-points (a nks x 3 array, 2pi/alat units) and the bands (a nks x nbnd array, in eV)
+    """
+    data = read_band_structure(xmlfile)
+    kpoints = data['kpoints']
+    bands = data['eigenvalues'] * 2.0 / ev_to_ry  # from Hartree to eV
+    if data.get('lsda'):   # magnetic
+        nbnd_up = data.get('nbnd_up', data['nbnd'] // 2)
+        bands = bands[:, :nbnd_up] if spin_component == 1 else bands[:, nbnd_up:]
 
+    write_bands(filebands, kpoints, bands)
     return kpoints, bands
 
 
+def write_bands(filebands, kpoints, bands):
+    """
+    Writes the bands into a file. The format is determined by the file extension:
+    a NumPy .npz archive or a HDF5 file (.h5, .hdf5) with the arrays kpoints and bands,
+    otherwise the text format of bands.x.
+
+    :param filebands: the output file
+    :param kpoints: the k-points (a nks x 3 array)
+    :param bands: the bands (a nks x nbnd array)
+    """
+    ext = os.path.splitext(filebands)[1].lower()
+    if ext in ('.h5', '.hdf5'):
+        import h5py
+        with h5py.File(filebands, 'w') as h5f:
+            h5f.create_dataset('kpoints', data=kpoints)
+            h5f.create_dataset('bands', data=bands)
+    elif ext == '.npz':
+        np.savez(filebands, kpoints=kpoints, bands=bands)
+    else:
+        nks, nbnd = bands.shape
+        fmt = 12 * ' ' + 3 * ' %.6E' + '\n' + nbnd * '   %.3E'
+        np.savetxt(filebands, np.column_stack((kpoints, bands)), fmt=fmt, comments='',
+                   header="& plot  nbnd = " + str(nbnd) + " nks = " + str(nks) + " /")
+
+
+def read_bands(filebands):
+    """
+    Reads the bands from a file written by write_bands.
+
+    :param filebands: the file with the bands
+    :return: the k-points (a nks x 3 array) and the bands (a nks x nbnd array)
+    """
+    ext = os.path.splitext(filebands)[1].lower()
+    if ext in ('.h5', '.hdf5'):
+        import h5py
+        with h5py.File(filebands, 'r') as h5f:
+            return h5f['kpoints'][()], h5f['bands'][()]
+    elif ext == '.npz':
+        with np.load(filebands) as data:
+            return data['kpoints'], data['bands']
+
+    with open(filebands) as fin:
+        header = fin.readline().replace('=', ' ').split()
+        nbnd, nks = int(header[header.index('nbnd') + 1]), int(header[header.index('nks') + 1])
+        values = np.array(fin.read().split(), dtype=float).reshape(nks, 3 + nbnd)
+    return values[:, :3], values[:, 3:]
+
+
 def set_high_symmetry_points(kpoints):
     """
-    Determines which k-points have "high simmetry" and are at the boundaries of the Brillouin zone.
+    Determines which k-points have "high simmetry" and are at the boundaries of the Brillouin zone,
+    that is the Gamma point, the ends of the path and the points where the path changes direction.
 
     :param kpoints: a matrix (nks,3) with the k-points coordinates. nks is the number of k-points.
     :return high_sym: an array of nks booleans, True if the kpoint is a high symmetry one
     """
-    nks = kpoints.shape[0]
-    high_sym = np.full(nks,False,dtype=bool)
-    high_sym[0] = True
-    high_sym[nks-1] = True
-
-    k1 = np.zeros(3)
-    k2 = np.zeros(3)
-    for i in range(1,nks-1):
-        if np.dot(kpoints[i,:],kpoints[i,:]) < 1.e-9:   # the Gamma point is always a high symmetry one
-            high_sym[i] = True
-        else:
-            k1 = kpoints[i,:] - kpoints[i-1,:]
-            k2 = kpoints[i+1,:] - kpoints[i,:]
-            ps = np.dot(k1,k2) / sqrt(np.dot(k1,k1)) / sqrt(np.dot(k2,k2))
-            if fabs(ps-1.0) > 1.0e-4 :
-                high_sym[i] = True
+    kpoints = np.asarray(kpoints, dtype=float).reshape(-1, 3)
+    high_sym = np.sum(kpoints ** 2, axis=1) < 1.e-9   # the Gamma point is always a high symmetry one
+    high_sym[[0, -1]] = True
 
+    steps = np.diff(kpoints, axis=0)
+    dxmod = np.linalg.norm(steps, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ps = np.sum(steps[:-1] * steps[1:], axis=1) / dxmod[:-1] / dxmod[1:]
+    high_sym[1:-1] |= np.abs(ps - 1.0) > 1.0e-4    # NaN for coincident points, that are not a change of direction
     return high_sym
 
 
 def compute_kx(kpoints):
     """
     This functions "linearize" the path along the k-points list in input and calculate
-    the linear x variable kx for the plot.
+    the linear x variable kx for the plot. A step much longer (5 times) than the previous
+    one is a jump between two different lines of the path, and its two k-points are put
+    on the same point of the graph.
 
     :param kpoints: a matrix (nks,3) with the k-points coordinates. nks is the number of k-points.
     :return kx : linear x variable for the plot determined as the k-points path
     """
+    kpoints = np.asarray(kpoints, dtype=float).reshape(-1, 3)
+    dxmod = np.linalg.norm(np.diff(kpoints, axis=0), axis=1)
+    if dxmod.size == 0:
+        return np.zeros(len(kpoints))
+
+    # The reference for a jump is the last step that is neither a jump nor almost zero,
+    # starting from the second step of the path. The jumps are found iteratively, since
+    # a jump never becomes the reference for the following steps.
+    indices = np.arange(dxmod.size)
+    initial = dxmod[1] if dxmod.size > 1 else dxmod[0]
+    jumps = np.zeros(dxmod.size, dtype=bool)
+    while True:
+        saved = np.where((dxmod > 1.e-5) & ~jumps, indices, -1)
+        saved = np.maximum.accumulate(saved)
+        reference = np.where(saved[:-1] >= 0, dxmod[np.maximum(saved[:-1], 0)], initial)
+        new_jumps = dxmod > 5 * np.concatenate(([initial], reference))
+        if np.array_equal(new_jumps, jumps):
+            break
+        jumps = new_jumps
+
+    return np.concatenate(([0.0], np.cumsum(np.where(jumps, 0.0, dxmod))))
+
+
+def reduce_lattice(a):
+    """
+    Reduces a basis of a lattice to the shortest vectors (Minkowski reduction), by
+    Gauss reduction of the pairs of vectors and of the sums of three vectors.
+
+    :param a: the lattice vectors (a 3 x 3 array with the vectors in the rows)
+    :return: the reduced lattice vectors, sorted by length
+    """
+    a = np.array(a, dtype=float)
+    while True:
+        a = a[np.argsort(np.einsum('ij,ij->i', a, a), kind='stable')]
+        for i, j in itertools.permutations(range(3), 2):
+            q = np.dot(a[i], a[j]) / np.dot(a[j], a[j])
+            if abs(q) > 0.5 + 1.e-8:
+                a[i] -= np.rint(q) * a[j]
+                break
+        else:
+            sums = a[2] + np.dot(list(itertools.product((1, -1), repeat=2)), a[:2])
+            k = np.argmin(np.einsum('ij,ij->i', sums, sums))
+            if np.dot(sums[k], sums[k]) >= np.dot(a[2], a[2]) * (1.0 - 1.e-8):
+                return a
+            a[2] = sums[k]
+
+
+def get_lattice_rotations(a, tol=1.e-6):
+    """
+    Gets the rotations of the point group of a Bravais lattice (its holohedry), as the integer
+    matrices that leave the metric of the lattice unchanged. The rotations transform the
+    vectors of a reduced basis into lattice vectors of the same length.
+
+    :param a: the direct lattice vectors (a 3 x 3 array with the vectors in the rows)
+    :param tol: the relative tolerance on the metric
+    :return: an integer array nrot x 3 x 3, that transforms the crystal coordinates n \
+    of a vector of the direct lattice into np.dot(r, n)
+    """
+    a = np.asarray(a, dtype=float)
+    reduced = reduce_lattice(a)
+    metric = np.dot(reduced, reduced.T)
+    vectors = np.indices((5, 5, 5)).reshape(3, -1).T - 2
+    lengths = np.einsum('ni,ij,nj->n', vectors, metric, vectors)
+    images = [vectors[np.abs(lengths - metric[i, i]) < tol * metric.max()] for i in range(3)]
+
+    rotations = []
+    for columns in itertools.product(*images):
+        r = np.transpose(columns)
+        if np.all(np.abs(np.dot(r.T, np.dot(metric, r)) - metric) < tol * metric.max()):
+            rotations.append(r)
+
+    # From the crystal coordinates of the reduced basis (reduced = np.dot(t, a)) to the ones of a
+    t = np.rint(np.dot(reduced, np.linalg.inv(a))).astype(int)
+    return np.einsum('ji,njk,lk->nil', t, rotations, np.rint(np.linalg.inv(t)).astype(int))
+
+
+def get_bravais_lattice(a, tol=1.e-5):
+    """
+    Identifies the Bravais lattice of a cell from its holohedry, also for a cell of pw.x
+    given by its vectors (ibrav=0) or for a non-standard choice of the primitive vectors.
+    The conventional cell is found from the rotation axes of the holohedry, and its
+    centering from its volume.
+
+    :param a: the direct lattice vectors (a 3 x 3 array with the vectors in the rows)
+    :param tol: the relative tolerance on the lattice vectors
+    :return: the symbol of the lattice (a key of HIGH_SYMMETRY_POINTS) and the primitive \
+    vectors of the standard cell of the lattice, in the same Cartesian frame of a
+    """
+    a = np.asarray(a, dtype=float)
+    volume = abs(np.linalg.det(a))
+    vectors = np.dot(np.indices((7, 7, 7)).reshape(3, -1).T - 3, reduce_lattice(a))
+    lengths = np.linalg.norm(vectors, axis=1)
+    vectors, lengths = vectors[np.argsort(lengths)[1:]], np.sort(lengths)[1:]
+
+    def is_lattice_vector(v):
+        n = np.dot(v, np.linalg.inv(a))
+        return np.all(np.abs(n - np.rint(n)) < tol)
+
+    def shortest_along(d):
+        parallel = np.linalg.norm(np.cross(vectors, d), axis=1) < tol * lengths
+        return vectors[np.flatnonzero(parallel & (np.dot(vectors, d) > 0.0))[0]]
 
-    nks = kpoints.shape[0]
-    kx = np.zeros(nks)
+    def shortest_normal_to(d):
+        return vectors[np.abs(np.dot(vectors, d)) < tol * lengths]
 
-    ktemp = kpoints[2, :] - kpoints[1, :]
-    dxmod_save = sqrt (np.dot(ktemp, ktemp))
+    def get_cell(symbol, cell):
+        return symbol, np.dot(PRIMITIVE_CELLS.get(symbol, PRIMITIVE_CELLS.get(symbol[1], np.eye(3))), cell)
 
-    for i in range(1,nks):
-        ktemp = kpoints[i, :] - kpoints[i-1, :]
-        dxmod = sqrt(np.dot(ktemp, ktemp))
+    # The proper rotations in Cartesian coordinates, and their axes by order
+    rotations = np.einsum('ji,njk,lk->nil', a, get_lattice_rotations(a), np.linalg.inv(a))
+    rotations *= np.linalg.det(rotations)[:, None, None]
+    traces = np.rint(np.trace(rotations, axis1=1, axis2=2)).astype(int)
+    axes = {2: [], 3: [], 4: [], 6: []}
+    for r, trace in zip(rotations, traces):
+        if trace < 3:
+            d = np.linalg.svd(r - np.eye(3))[2][2]
+            d *= np.sign(d[np.flatnonzero(np.abs(d) > tol)[0]])
+            order = {-1: 2, 0: 3, 1: 4, 2: 6}[trace]
+            if not any(np.allclose(d, e) for e in axes[order]):
+                axes[order].append(d)
+
+    if len(rotations) == 48 or len(rotations) == 16:
+        if len(rotations) == 48:
+            family, cell = 'c', np.array([shortest_along(d) for d in axes[4]])
+        else:
+            c = shortest_along(axes[4][0])
+            a1 = min((shortest_along(d) for d in axes[2] if abs(np.dot(d, axes[4][0])) < tol), key=np.linalg.norm)
+            family, cell = 't', np.array([a1, np.dot(rotations[np.flatnonzero(traces == 1)[0]], a1), c])
+        centering = {1: 'P', 2: 'I', 4: 'F'}[int(round(abs(np.linalg.det(cell)) / volume))]
+        if family == 't' and centering == 'I':
+            return get_cell('tI1' if np.linalg.norm(cell[2]) < np.linalg.norm(cell[0]) else 'tI2', cell)
+        return get_cell(family + centering, cell)
+
+    elif len(rotations) == 24:
+        plane = shortest_normal_to(axes[6][0])
+        a2 = plane[np.flatnonzero(np.abs(2.0 * np.dot(plane, plane[0]) / np.dot(plane[0], plane[0]) + 1.0) < tol)[0]]
+        return 'hP', np.array([plane[0], a2, shortest_along(axes[6][0])])
+
+    elif len(rotations) == 12:
+        # The rhombohedral vectors are the shortest at 1/3 of the hexagonal c axis
+        d = axes[3][0]
+        height = np.dot(shortest_along(d), d) / 3.0
+        v = vectors[np.flatnonzero(np.abs(np.dot(vectors, d) - height) < tol * height)[0]]
+        r = rotations[np.flatnonzero(traces == 0)[0]]
+        cell = np.array([v, np.dot(r, v), np.dot(r, np.dot(r, v))])
+        return 'hR1' if np.dot(cell[0], cell[1]) > 0.0 else 'hR2', cell
+
+    elif len(rotations) == 8:
+        cell = np.array(sorted((shortest_along(d) for d in axes[2]), key=np.linalg.norm))
+        centering = int(round(abs(np.linalg.det(cell)) / volume))
+        if centering != 2:
+            return get_cell({1: 'oP', 4: 'oF'}[centering], cell)
+        elif is_lattice_vector(cell.sum(axis=0) / 2.0):
+            return get_cell('oI', cell)
+        k = next(k for k in (2, 1, 0) if is_lattice_vector((cell.sum(axis=0) - cell[k]) / 2.0))
+        return get_cell('oC', np.vstack((np.delete(cell, k, axis=0), cell[k])))
+
+    elif len(rotations) == 4:
+        # The unique axis is the first vector, the other two are a reduced basis of the normal plane
+        u = shortest_along(axes[2][0])
+        plane = shortest_normal_to(axes[2][0])
+        p = plane[0]
+        normal = np.linalg.norm(np.cross(plane, p), axis=1) > tol * np.linalg.norm(p) * np.linalg.norm(plane, axis=1)
+        q = plane[np.flatnonzero(normal)[0]]
+        if abs(np.linalg.det([u, p, q])) < volume * (1.0 + tol):
+            return 'mP', np.array([u, p, q if np.dot(p, q) >= 0.0 else -q])
+
+        # The second vector of the C-centered cell is the one of the centering (u + b) / 2
+        area = np.linalg.norm(np.cross(p, q))
+        combinations = sorted((p, q, p + q, p - q), key=np.linalg.norm)
+        b = next(v for v in combinations if is_lattice_vector((u + v) / 2.0))
+        c = next(v for v in combinations if abs(np.linalg.norm(np.cross(b, v)) - area) < tol * area)
+        return get_cell('mC', np.array([u, b, c if np.dot(b, c) >= 0.0 else -c]))
+
+    return 'aP', reduce_lattice(a)
+
+
+def get_high_symmetry_labels(kpoints, b, tol=1.e-5):
+    """
+    Labels the k-points that are standard high symmetry points of the Brillouin zone,
+    using the table HIGH_SYMMETRY_POINTS for the Bravais lattice of the cell, that is
+    identified from the reciprocal lattice vectors (see get_bravais_lattice). The points
+    are recognized also when equivalent by a rotation of the lattice or a translation
+    of the reciprocal lattice.
+
+    :param kpoints: a matrix (nks,3) with the k-points coordinates (2pi/alat units)
+    :param b: the reciprocal lattice vectors (2pi/alat units)
+    :param tol: the tolerance on the crystal coordinates of the k-points
+    :return: an array of nks strings, empty for the points that are not in the table
+    """
+    a = np.linalg.inv(np.asarray(b, dtype=float)).T
+    x = np.dot(np.asarray(kpoints, dtype=float).reshape(-1, 3), a.T)   # crystal coordinates
+    symbol, cell = get_bravais_lattice(a)
+    points = HIGH_SYMMETRY_POINTS[symbol]
+    labels = list(points)
 
-        if dxmod > 5*dxmod_save:    # a big jump in dxmod is a sign the points kpoints[i] and kpoints[i]
-                                    # are quite distant and belong to two different lines. We put them on
-                                    # the same point in the graph
-            kx[i] = kx[i-1]
-        elif dxmod > 1.e-5:         # this is the usual case. The two points kpoints[i] and kpoints[i] are in the
-                                    # same path.
-            kx[i] = kx[i-1] + dxmod
-            dxmod_save = dxmod
-        else:                       # !  This is the case in which dxmod is almost zero. The two points coincide
-                                    # in the graph, but we do not save dxmod.
-            kx[i] = kx[i-1] + dxmod
+    # From the crystal coordinates of the standard cell to the ones of the cell
+    coords = np.dot(np.dot(np.array(list(points.values()), dtype=float), np.linalg.inv(cell).T), a.T)
 
-    return kx
+    # A rotation r of the direct lattice transforms the crystal coordinates of k into np.dot(x, inv(r)),
+    # so the images of a point by the group are np.dot(x, r)
+    rotations = get_lattice_rotations(a)
+    images = np.einsum('pi,nij->pnj', coords, rotations).reshape(-1, 3)
+    owners = np.repeat(np.arange(len(labels)), len(rotations))
 
+    table_keys, first = np.unique(kpoint_keys(images, tol), return_index=True)
+    keys = kpoint_keys(x, tol)
+    position = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    found = table_keys[position] == keys
+    return np.where(found, np.array(labels)[owners[first[position]]], '')
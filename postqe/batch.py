@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Functions to scan directories of finished pw.x runs and collect their main results, or the
+analysis of their band edges, in a table.
+"""
+import os
+import fnmatch
+from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .ase.calculator import PostqeCalculator
+from .fermi import get_band_edges
+from .band_analysis import analyze_bands
+
+# Columns of the table, in the order they are written
+COLUMNS = ('filename', 'energy', 'volume', 'fermi_energy', 'gap', 'nat', 'functional', 'error')
+
+# Columns of the table of the band edges analysis
+BAND_COLUMNS = ('filename', 'fermi_energy', 'vbm', 'cbm', 'gap', 'direct_gap', 'direct', 'hole_mass', 'electron_mass')
+
+
+def find_xml_outputs(topdir, pattern='*.xml'):
+    """
+    Finds the xml output files under the directory tree *topdir*. The *.save* directories
+    are skipped, because they contain a copy of the xml output of the run.
+
+    :param topdir: the root of the directory tree to scan
+    :param pattern: the filename pattern of the xml output files
+    :return: the sorted list of the xml files found
+    """
+    xmlfiles = []
+    for dirpath, dirnames, filenames in os.walk(topdir):
+        dirnames[:] = [d for d in dirnames if not d.endswith('.save')]
+        xmlfiles.extend(os.path.join(dirpath, f) for f in fnmatch.filter(filenames, pattern))
+    return sorted(xmlfiles)
+
+
+def get_gap(calcul):
+    """
+    Gets the band gap (in eV) from the eigenvalues of a calculator. The states below
+    the Fermi energy are the occupied ones and the gap is 0 if a band crosses it.
+    """
+    vbm, cbm, gap = get_band_edges(calcul.get_all_eigenvalues(), calcul.get_fermi_level())
+    return gap
+
+
+def scan_run(xmlfile):
+    """
+    Extracts the main results of a pw.x run from its xml output file, using the fast
+    non-validating decoding. Energies are in eV and the volume in a.u.^3. If the file
+    can't be read, or it misses some results, the missing values are set to NaN and the
+    error is recorded in the row.
+
+    :param xmlfile: the xml output file
+    :return: a dictionary with an item for each column of the table
+    """
+    row = dict(filename=xmlfile, energy=np.nan, volume=np.nan, fermi_energy=np.nan,
+               gap=np.nan, nat=0, functional='', error='')
+    calcul = PostqeCalculator(atoms=None, label=os.path.splitext(xmlfile)[0])
+    try:
+        calcul.read_results(validation=False)
+        row['energy'] = calcul.results['energy']
+        row['volume'] = calcul.atoms.get_volume()
+        row['nat'] = len(calcul.atoms)
+        row['functional'] = str(calcul.get_xc_functional())
+        row['gap'] = get_gap(calcul)
+        row['fermi_energy'] = calcul.get_fermi_level()
+    except (KeyError, ValueError, OSError, ElementTree.ParseError) as err:
+        row['error'] = '%s: %s' % (type(err).__name__, err)
+    return row
+
+
+def analyze_run(xmlfile, npoints=19):
+    """
+    Analyzes the band edges of a pw.x run from its xml output file (see
+    band_analysis.analyze_bands), without plotting. The effective masses are computed
+    only for the runs on a Monkhorst-Pack grid, unfolded to the full Brillouin zone: for
+    the band structures along lines they are NaN. If the file can't be read the values
+    are set to NaN.
+
+    :param xmlfile: the xml output file
+    :param npoints: the minimum number of k-points of the fits of the effective masses
+    :return: a dictionary with an item for each column of BAND_COLUMNS
+    """
+    row = dict(filename=xmlfile, fermi_energy=np.nan, vbm=np.nan, cbm=np.nan, gap=np.nan, direct_gap=np.nan,
+               direct=False, hole_mass=np.nan, electron_mass=np.nan)
+    calcul = PostqeCalculator(atoms=None, label=os.path.splitext(xmlfile)[0])
+    try:
+        calcul.read_results(validation=False)
+        eigenvalues = calcul.get_all_eigenvalues()
+        row['fermi_energy'] = ef = calcul.get_fermi_level()
+        x = bz_to_ibz = None
+        starting_k_points = calcul.output['band_structure'].get('starting_k_points') or {}
+        if 'monkhorst_pack' in starting_k_points:
+            try:
+                x, bz_to_ibz = calcul._unfold_k_points()
+            except ValueError:
+                pass
+        result = analyze_bands(eigenvalues, ef, x, bz_to_ibz, calcul.get_b_vectors(), calcul.get_alat(), npoints)
+        row.update((name, result[name]) for name in BAND_COLUMNS if name in result)
+    except (KeyError, ValueError, OSError, ElementTree.ParseError):
+        pass
+    return row
+
+
+def _map_runs(function, topdir, pattern, max_workers, columns):
+    # Applies the function to the xml files in a pool of processes and builds the table
+    xmlfiles = find_xml_outputs(topdir, pattern)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(function, xmlfiles, chunksize=max(1, len(xmlfiles) // 256)))
+
+    table = {}
+    for name in columns:
+        table[name] = np.array([row[name] for row in rows])
+    return table
+
+
+def scan_runs(topdir, pattern='*.xml', max_workers=None):
+    """
+    Scans the xml output files of the pw.x runs under a directory tree, using a pool
+    of processes, and collects the results in a columnar table.
+
+    :param topdir: the root of the directory tree to scan
+    :param pattern: the filename pattern of the xml output files
+    :param max_workers: the number of worker processes (default is the number of CPUs)
+    :return: a dictionary with an array for each column of COLUMNS
+    """
+    return _map_runs(scan_run, topdir, pattern, max_workers, COLUMNS)
+
+
+def analyze_runs(topdir, pattern='*.xml', max_workers=None):
+    """
+    Analyzes the band edges of the pw.x runs under a directory tree, using a pool
+    of processes, and collects the results in a columnar table.
+
+    :param topdir: the root of the directory tree to scan
+    :param pattern: the filename pattern of the xml output files
+    :param max_workers: the number of worker processes (default is the number of CPUs)
+    :return: a dictionary with an array for each column of BAND_COLUMNS
+    """
+    return _map_runs(analyze_run, topdir, pattern, max_workers, BAND_COLUMNS)
+
+
+def write_table(table, filename, columns=COLUMNS):
+    """
+    Writes a table produced by scan_runs() or analyze_runs() into a file. The format
+    is determined by the file extension: CSV (.csv), HDF5 (.h5, .hdf5) or Parquet
+    (.parquet, requires pandas and pyarrow).
+
+    :param table: a dictionary with a column array for each key of *columns*
+    :param filename: the output file
+    :param columns: the columns to write, COLUMNS for scan_runs() or BAND_COLUMNS for analyze_runs()
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.h5', '.hdf5'):
+        import h5py
+        with h5py.File(filename, 'w') as h5f:
+            for name in columns:
+                if table[name].dtype.kind == 'U':
+                    h5f.create_dataset(name, data=table[name].astype(np.bytes_))
+                else:
+                    h5f.create_dataset(name, data=table[name])
+    elif ext == '.parquet':
+        import pandas
+        pandas.DataFrame({name: table[name] for name in columns}).to_parquet(filename)
+    else:
+        import csv
+        with open(filename, 'w') as fout:
+            writer = csv.writer(fout)
+            writer.writerow(columns)
+            writer.writerows(zip(*[table[name] for name in columns]))
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 #encoding: UTF-8
 
+import copy
 import numpy as np
 import h5py
-from .plot import plot1D_FFTinterp, plot2D_FFTinterp
+from .plot import plot1D_FFTinterp, plot2D_FFTinterp, plot_spherical_average, plot_polar_sphere, \
+    compute_sections, write_sections
 from .compute_vs import compute_G, compute_v_bare, compute_v_h, compute_v_xc
+from .fourier import MAX_MEMORY, get_gcutm, resample, get_grid_coefficients, interpolate, \
+    spherical_average, sphere_interpolate, planar_average
 
 def read_charge_file_hdf5(filename, nr):
     """
@@ -70,6 +74,9 @@ class Charge:
     """
     A class for charge density.
     """
+    charge = None
+    charge_diff = None
+
     # TODO: include the Miller index as in HDF5 file?
     def __init__(self, *args, **kwargs):
         """Create charge object from """
@@ -125,63 +132,239 @@ class Charge:
             write_charge(filename + '_up', charge_up, header)
             write_charge(filename + '_down', charge_down, header)
 
+    def resample(self, new_nr):
+        """
+        Interpolates the charge on a finer FFT grid by zero padding its Fourier coefficients
+        (one FFT for each quantity, exact as the Fourier interpolation on the new grid points).
+        The cached coefficients are used, so the components beyond gcutm are left out.
+
+        :param new_nr: a numpy array or list of length 3 containing the new grid dimensions
+        :return: a new object of the same class with the quantities defined on the new grid
+        """
+        new = copy.copy(self)
+        new.nr = np.array(new_nr)
+        new.clear_cache()
+        # The coefficients of the charge also for a Potential, that overrides _get_grid_coefficients
+        if self.charge is not None:
+            new.charge = resample(self.charge, new.nr, Charge._get_grid_coefficients(self))
+        if self.charge_diff is not None:
+            new.charge_diff = resample(self.charge_diff, new.nr, Charge._get_grid_coefficients(self, 'diff'))
+        return new
+
+    def clear_cache(self):
+        """
+        Clears the cached Fourier coefficients and G vectors. The cache is refreshed when
+        the arrays or the calculator are replaced, this is needed only if they are
+        modified in place.
+        """
+        self._cache = {}
+
+    def _cached(self, key, sources, function, *args):
+        """
+        Returns function(*args), cached with *key* as long as the objects in *sources* (the
+        arrays and the calculator it's computed from) are the same.
+        """
+        cache = self.__dict__.setdefault('_cache', {})
+        try:
+            cached_sources, value = cache[key]
+        except KeyError:
+            pass
+        else:
+            if all(x is y for x, y in zip(cached_sources, sources)):
+                return value
+        value = function(*args)
+        cache[key] = sources, value
+        return value
+
+    def _get_gcutm(self):
+        """Returns the cutoff for G^2, the charge has no components beyond it."""
+        return get_gcutm(self.calculator.get_ecutrho(), self.calculator.get_alat())
+
+    def _compute_lattice(self):
+        a = self.calculator.get_a_vectors() / self.calculator.get_alat()
+        return a, compute_G(self.calculator.get_b_vectors(), self.nr)
+
+    def _get_lattice(self):
+        """Returns the direct lattice vectors (alat units) and the G vectors of the grid (cached)."""
+        return self._cached('lattice', (self.calculator,), self._compute_lattice)
+
+    def _get_grid_coefficients(self, ifmagn='total'):
+        """
+        Returns the Fourier coefficients of the total charge or, for ifmagn='up' or 'down',
+        of the spin channel on the grid (cached). The spin channels are combined from
+        the coefficients of the charge and of the difference up - down (ifmagn='diff').
+        """
+        a, G = self._get_lattice()
+        if ifmagn != 'diff':
+            total = self._cached('total', (self.charge, self.calculator), get_grid_coefficients,
+                                 self.charge, G, self._get_gcutm())
+            if ifmagn != 'up' and ifmagn != 'down':
+                return total
+        diff = self._cached('diff', (self.charge_diff, self.calculator), get_grid_coefficients,
+                            self.charge_diff, G, self._get_gcutm())
+        if ifmagn == 'diff':
+            return diff
+        sign = 1.0 if ifmagn == 'up' else -1.0
+        return self._cached(ifmagn, (total, diff), lambda: (total + sign * diff) / 2.0)
+
+    def _get_coefficients(self, ifmagn='total'):
+        """Returns the G vectors with non-zero coefficients and the coefficients (cached)."""
+        a, G = self._get_lattice()
+        coeffs = self._get_grid_coefficients(ifmagn)
+        return self._cached(('list', ifmagn), (coeffs,),
+                            lambda: (G[coeffs != 0.0], coeffs[coeffs != 0.0]))
+
+    def _get_centers(self, x0=None):
+        """Returns x0 or, if it's None, the atomic positions (alat units)."""
+        if x0 is not None:
+            return np.reshape(np.asarray(x0, dtype=float), (-1, 3))
+        alat = self.calculator.get_alat()
+        return np.array([atom['$'] for atom in self.calculator.get_atomic_positions()]) / alat
+
+    def evaluate(self, points, ifmagn='total', max_memory=MAX_MEMORY, max_workers=None):
+        """
+        Computes the charge at arbitrary points using Fourier interpolation. The points
+        are evaluated in chunks, so that the temporary matrix of the phases never exceeds
+        *max_memory* bytes, or with a non-uniform FFT if they are more than NUFFT_MIN_POINTS.
+
+        :param points: a list or a N x 3 array of cartesian coordinates (alat units, as x0 in plot)
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+        :param max_workers: if given, the chunks are evaluated by a pool of max_workers threads
+        :return: a numpy array with the N values of the charge
+        """
+        a, G = self._get_lattice()
+        return interpolate(points, self._get_grid_coefficients(ifmagn), G, a, max_memory, max_workers).real
 
-    def plot(self, x0 = (0., 0., 0.), e1 = (1., 0., 0.), nx = 50, e2 = (1., 0., 0.), ny=50, dim=1, ifmagn='total'):
+    def spherical_average(self, rmax, nr=50, x0=None, ifmagn='total', max_memory=MAX_MEMORY):
+        """
+        Computes the spherical average of the charge as a function of the distance from
+        x0 or, if x0 is None, from each atom. All the profiles are computed in one pass.
+
+        :param rmax: the maximum radius (alat units)
+        :param nr: the number of radii, from 0 to rmax
+        :param x0: a center or a list of centers (alat units), default are the atomic positions
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+        :return: the radii and the averages (a numpy array with a row for each center)
+        """
+        r = np.linspace(0.0, rmax, nr)
+        g, coeffs = self._get_coefficients(ifmagn)
+        return r, spherical_average(self._get_centers(x0), r, g, coeffs, max_memory)
+
+    def sphere(self, radius, npoints=1000, x0=None, ifmagn='total', max_memory=MAX_MEMORY, max_workers=None):
+        """
+        Computes the charge on spheres of given radius around x0 or, if x0 is None, around
+        each atom. The spheres are sampled with a Fibonacci lattice of npoints points.
+
+        :param radius: the radius of the spheres (alat units)
+        :param npoints: the number of points on each sphere
+        :param x0: a center or a list of centers (alat units), default are the atomic positions
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+        :param max_workers: if given, the chunks are evaluated by a pool of max_workers threads
+        :return: the polar and azimuthal angles of the points and the values (a row for each center)
+        """
+        a, G = self._get_lattice()
+        theta, phi, values = sphere_interpolate(self._get_centers(x0), radius, npoints,
+                                                self._get_grid_coefficients(ifmagn), G, a, max_memory, max_workers)
+        return theta, phi, values.real
+
+    def sections(self, sections, ifmagn='total', filename='', max_memory=MAX_MEMORY):
+        """
+        Computes many 1D and 2D sections of the charge together, sharing the same Fourier
+        coefficients (see plot.compute_sections).
+
+        :param sections: a list of dictionaries with the arguments of each section: dim (1 or 2), \
+        x0, e1, e2, nx and ny (as for plot)
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :param filename: if filename!='', write all the sections into this .npz or HDF5 file
+        :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+        :return: the list of the arrays of each section, (X, Y) for a line and (X, Y, Z) for a plane
+        """
+        a, G = self._get_lattice()
+        results = compute_sections(None, G, a, sections, coeffs=self._get_grid_coefficients(ifmagn),
+                                   max_memory=max_memory)
+        if filename != '':
+            write_sections(filename, results)
+        return results
+
+    def planar_average(self, axis=2, npoints=None, ifmagn='total'):
+        """
+        Computes the average of the charge on the planes parallel to the two lattice vectors
+        different from a[axis], from its Fourier components with G parallel to the planes
+        equal to 0. With more points than the grid the average is Fourier interpolated.
+
+        :param axis: 0, 1 or 2, the index of the lattice vector along which the average is computed
+        :param npoints: the number of points (default is the grid dimension along axis)
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :return: the distances of the planes from the origin (alat units) and the averages
+        """
+        return self.macroscopic_average(axis, (), npoints, ifmagn)
+
+    def macroscopic_average(self, axis=2, window=(), npoints=None, ifmagn='total'):
+        """
+        Computes the macroscopic average, ie. the planar average (see planar_average) convolved
+        with square windows of the given widths. The convolutions are products in reciprocal
+        space. For an interface the windows are usually the periods of the two materials.
+
+        :param axis: 0, 1 or 2, the index of the lattice vector along which the average is computed
+        :param window: the width of the window or a list of widths (alat units, as the distances)
+        :param npoints: the number of points (default is the grid dimension along axis)
+        :param ifmagn: for a magnetic calculation, 'total' for the total charge, 'up' for the charge with spin up, 'down' for spin down
+        :return: the distances of the planes from the origin (alat units) and the averages
+        """
+        # the distance between the planes with crystal coordinates 0 and 1 is 1/|b[axis]|
+        period = 1.0 / np.linalg.norm(self.calculator.get_b_vectors()[axis])
+        windows = np.atleast_1d(window) / period
+        values = planar_average(self._get_grid_coefficients(ifmagn), axis, npoints, windows).real
+        return np.arange(values.size) * period / values.size, values
+
+    def _plot(self, x0, e1, nx, e2, ny, dim, ifmagn, label, plot_file, fig_file):
+        """Plots the quantity with coefficients _get_grid_coefficients(ifmagn), see plot()."""
+        if dim == 0:
+            r, averages = self.spherical_average(np.linalg.norm(e1), nx, x0, ifmagn)
+            return plot_spherical_average(r, averages[0], ylab=label, fig_file=fig_file)
+        elif dim == 4:
+            theta, phi, values = self.sphere(np.linalg.norm(e1), nx * ny, x0, ifmagn)
+            return plot_polar_sphere(theta, phi, values[0], zlab=label, fig_file=fig_file)
+
+        a, G = self._get_lattice()
+        coeffs = self._get_grid_coefficients(ifmagn)
+        if dim == 1:  # 1D section
+            return plot1D_FFTinterp(None, G, a, x0, e1, nx, label, plot_file, fig_file=fig_file, coeffs=coeffs)
+        else:
+            return plot2D_FFTinterp(None, G, a, x0, e1, e2, nx, ny, label, plot_file, fig_file=fig_file,
+                                    coeffs=coeffs)
+
+    def plot(self, x0 = (0., 0., 0.), e1 = (1., 0., 0.), nx = 50, e2 = (1., 0., 0.), ny=50, dim=1, ifmagn='total',
+             plot_file='', fig_file=''):
         """
         Plot a 1D or 2D section of the charge from x0 along e1 (e2) direction(s) using Fourier interpolation.
 
         :param x0: 3D vector, origin of the line
         :param e1, e2: 3D vectors which determines the plotting lines
         :param nx, ny: number of points along e1, e2
-        :param dim: 1 for a 1D section, 2 for a 2D section
+        :param dim: 1 for a 1D section, 2 for a 2D section, 0 for the spherical average and 4 for a polar plot \
+        on the sphere around x0 of radius |e1| (nx radii or nx*ny points on the sphere)
         :param ifmagn: for a magnetic calculation, 'total' plot the total charge, 'up' plot the charge with spin up, 'down' for spin down
+        :param plot_file: if plot_file!='', write the plotting values of a section on a text file
+        :param fig_file: if fig_file!='', save the figure into this file (see also plot.set_interactive)
         :return: a Matplotlib figure object
         """
-        try:
-            self.charge
-        except:
+        if self.charge is None:
             return
-        a = self.calculator.get_a_vectors()
-        b = self.calculator.get_b_vectors()
-        G = compute_G(b, self.nr)
-
         if not self.calculator.get_spin_polarized():  # non magnetic calculation
-            if dim == 1:  # 1D section
-                fig = plot1D_FFTinterp(self.charge, G, a, x0, e1, nx)
-            else:
-                fig = plot2D_FFTinterp(self.charge, G, a, x0, e1, e2, nx, ny)
-            fig.show()
-            return fig
-        else:  # magnetic calculation, plot as ifmagn
-            if ifmagn == 'up':
-                charge_up = (self.charge + self.charge_diff) / 2.0
-                if dim == 1:  # 1D section
-                    fig = plot1D_FFTinterp(charge_up, G, a, x0, e1, nx)
-                else:
-                    fig = plot2D_FFTinterp(charge_up, G, a, x0, e1, e2, nx, ny)
-                fig.show()
-            elif ifmagn == 'down':
-                charge_down = (self.charge - self.charge_diff) / 2.0
-                if dim == 1:  # 1D section
-                    fig = plot1D_FFTinterp(charge_down, G, a, x0, e1, nx)
-                else:
-                    fig = plot2D_FFTinterp(charge_down, G, a, x0, e1, e2, nx, ny)
-                fig.show()
-            else:
-                if dim == 1:  # 1D section
-                    fig = plot1D_FFTinterp(self.charge, G, a, x0, e1, nx)
-                else:
-                    fig = plot2D_FFTinterp(self.charge, G, a, x0, e1, e2, nx, ny)
-                fig.show()
-            return fig
-
-
+            ifmagn = 'total'
+        return self._plot(x0, e1, nx, e2, ny, dim, ifmagn, 'charge', plot_file, fig_file)
 
 
 class Potential(Charge):
     """
     A class for a potential. This is derived from a Charge class and additionally contains the potential.
     """
+    v = None
+
     def __init__(self, *args, **kwargs):
         """Call the Charge constructor """
         self.setvars(*args, **kwargs)
@@ -195,10 +378,15 @@ class Potential(Charge):
         except:
             pass
 
+    def resample(self, new_nr):
+        """Interpolates the charge and the potential on a finer FFT grid (see Charge.resample)."""
+        new = super().resample(new_nr)
+        if self.v is not None:
+            new.v = resample(self.v, new.nr, self._get_grid_coefficients())
+        return new
+
     def compute_potential(self, pot_type='v_tot'):
-        try:
-            self.charge
-        except:
+        if self.charge is None:
             return
         self.pot_type = pot_type
         alat = self.calculator.get_alat()
@@ -226,28 +414,42 @@ class Potential(Charge):
             v_xc = compute_v_xc(self.charge, charge_core, str(functional))
             self.v = v_bare + v_h + v_xc
 
-    def plot(self, x0 = (0., 0., 0.), e1 = (1., 0., 0.), nx = 50, e2 = (1., 0., 0.), ny=50, dim=1, ifmagn='total'):
+    def _get_grid_coefficients(self, ifmagn='total'):
         """
-        Plot a 1D or 2D section of the charge from x0 along e1 (e2) direction(s) using Fourier interpolation.
+        Returns the Fourier coefficients of the potential on the grid (cached). The potential
+        is not band-limited (eg. v_xc), so all the G vectors are used.
+        """
+        return self._cached('v', (self.v,), get_grid_coefficients, self.v)
+
+    def evaluate(self, points, max_memory=MAX_MEMORY, max_workers=None):
+        """
+        Computes the potential at arbitrary points using Fourier interpolation. The points
+        are evaluated in chunks, so that the temporary matrix of the phases never exceeds
+        *max_memory* bytes, or with a non-uniform FFT if they are more than NUFFT_MIN_POINTS.
+
+        :param points: a list or a N x 3 array of cartesian coordinates (alat units, as x0 in plot)
+        :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+        :param max_workers: if given, the chunks are evaluated by a pool of max_workers threads
+        :return: a numpy array with the N values of the potential
+        """
+        a, G = self._get_lattice()
+        return interpolate(points, self._get_grid_coefficients(), G, a, max_memory, max_workers).real
+
+    def plot(self, x0 = (0., 0., 0.), e1 = (1., 0., 0.), nx = 50, e2 = (1., 0., 0.), ny=50, dim=1, ifmagn='total',
+             plot_file='', fig_file=''):
+        """
+        Plot a 1D or 2D section of the potential from x0 along e1 (e2) direction(s) using Fourier interpolation.
 
         :param x0: 3D vector, origin of the line
         :param e1, e2: 3D vectors which determines the plotting lines
         :param nx, ny: number of points along e1, e2
-        :param dim: 1 for a 1D section, 2 for a 2D section
-        :param ifmagn: for a magnetic calculation, 'total' plot the total charge, 'up' plot the charge with spin up, 'down' for spin down
+        :param dim: 1 for a 1D section, 2 for a 2D section, 0 for the spherical average and 4 for a polar plot \
+        on the sphere around x0 of radius |e1| (nx radii or nx*ny points on the sphere)
+        :param ifmagn: not used for a potential
+        :param plot_file: if plot_file!='', write the plotting values of a section on a text file
+        :param fig_file: if fig_file!='', save the figure into this file (see also plot.set_interactive)
         :return: a Matplotlib figure object
         """
-        try:
-            self.v
-        except:
+        if self.v is None:
             return
-        a = self.calculator.get_a_vectors()
-        b = self.calculator.get_b_vectors()
-        G = compute_G(b, self.nr)
-
-        if dim == 1:  # 1D section
-            fig = plot1D_FFTinterp(self.v, G, a, x0, e1, nx)
-        else:
-            fig = plot2D_FFTinterp(self.v, G, a, x0, e1, e2, nx, ny)
-        fig.show()
-        return fig
+        return self._plot(x0, e1, nx, e2, ny, dim, ifmagn, self.pot_type, plot_file, fig_file)
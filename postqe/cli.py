@@ -92,12 +92,43 @@ def get_cli_parser():
     return parser
 
 
+def get_scan_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='postqe scan',
+                                     description='Collect the results of the pw.x runs under a directory tree')
+    parser.add_argument('topdir', type=str, help='root of the directory tree containing the xml output files')
+    parser.add_argument('-pattern', type=str, nargs='?', default='*.xml',
+                        help='filename pattern of the xml output files')
+    parser.add_argument('-output', type=str, nargs='?', default='runs.csv',
+                        help='output table, the format (CSV, HDF5 or Parquet) is chosen from \
+                        the extension (.csv, .h5/.hdf5 or .parquet)')
+    parser.add_argument('-nproc', type=int, nargs='?', default=None,
+                        help='number of worker processes (default is the number of CPUs)')
+    return parser
+
+
+def scan(args):
+    """Run the scan subcommand with the command line arguments *args*."""
+    pars = get_scan_parser().parse_args(args)
+
+    from .batch import scan_runs, write_table
+    table = scan_runs(pars.topdir, pattern=pars.pattern, max_workers=pars.nproc)
+    write_table(table, pars.output)
+    print("Scanned %d xml files, results written to %s" % (len(table['filename']), pars.output))
+
+
 def main():
     if sys.version_info < (2, 7, 0):
         sys.stderr.write("You need python 2.7 or later to run this program\n")
         sys.exit(1)
 
     start_time = time.time()
+    if sys.argv[1:2] == ['scan']:
+        scan(sys.argv[2:])
+        print("Finished. Elapsed time: " + str(time.time() - start_time) + " s.")
+        return
+
     cli_parser = get_cli_parser()
     pars = cli_parser.parse_args()
 
@@ -4,101 +4,469 @@
 """
 Functions to calculate the electronic density of states (DOS).
 
-TODO: Tetrahedra methods (linear and optimized).
-"""
+The smearing functions are evaluated on blocks of (energies x eigenvalues) with array
+operations. The blocks are limited in size, so the memory used doesn't grow with the
+number of energies.
+
+The tetrahedron methods (linear and optimized, see P. E. Bloechl et al., PRB 49, 16223
+(1994) and M. Kawamura et al., PRB 89, 094515 (2014)) use the eigenvalues on a full
+Monkhorst-Pack grid. The corners of the tetrahedra are precomputed as arrays of indices
+of the grid and the contributions of all the tetrahedra are summed with array operations.
 
+The DOS class is a replacement of ase.dft.DOS that works on the arrays of eigenvalues
+read from the xml file.
+"""
+import itertools
 import numpy as np
 from .constants import ev_to_ry
-from .xmlfile import get_cell_data, get_calculation_data, get_band_strucure_data
-from .pyqe import py_w0gauss
+from .xmlfile import read_band_structure, read_symmetries
+from .symmetry import get_bz_to_ibz_map
+from .fermi import SMEARINGS, get_fermi_energy
+
+# Default memory ceiling (in bytes) for a block of the smearing function
+MAX_MEMORY = 64 * 1024 ** 2
+
+sqrtpm1 = 1.0 / np.sqrt(np.pi)
+sqrt2 = np.sqrt(2.0)
 
+# Additional points of a tetrahedron for the optimized method, as linear combinations
+# of its corners (2 * c[i] - c[j] and c[i] - c[j] + c[k])
+OPT_TETRA_PAIRS = ((0, 1), (1, 2), (2, 3), (3, 0), (0, 2), (1, 3), (2, 0), (3, 1),
+                   (0, 3), (1, 0), (2, 1), (3, 2))
+OPT_TETRA_TRIPLES = ((3, 0, 1), (0, 1, 2), (1, 2, 3), (2, 3, 0))
 
-def dos_gaussian(e, nat, ks_energies, lsda, nbnd, nks, degauss, ngauss=0):
+# Matrix of the optimized tetrahedron method, that gives the effective energies
+# of the corners from the energies of the 20 points of a tetrahedron
+OPT_TETRA_WLSM = np.array([
+    [1440, 0, 30, 0, -38, 7, 17, -28, -56, 9, -46, 9, -38, -28, 17, 7, -18, -18, 12, -18],
+    [0, 1440, 0, 30, -28, -38, 7, 17, 9, -56, 9, -46, 7, -38, -28, 17, -18, -18, -18, 12],
+    [30, 0, 1440, 0, 17, -28, -38, 7, -46, 9, -56, 9, 17, 7, -38, -28, 12, -18, -18, -18],
+    [0, 30, 0, 1440, 7, 17, -28, -38, 9, -46, 9, -56, -28, 17, 7, -38, -18, 12, -18, -18]
+]) / 1260.0
+
+
+def w0gauss(x, ngauss=0):
     """
-    Calculated the electronic density of states with Gaussian broadening.
+    Computes the derivative of the smearing function (an approximation of the delta
+    function) for an array of values. It's the same of w0gauss function of QE.
 
-    :param e energy values (for which calculate the dos)
-    :param ks_energies: eigenvalues with weights and k-points
-    :param lsda: if true = magnetic calculation
-    :param nbnd: number of bands
-    :param nks: number of k-points
-    :param degauss: value for the Gaussian broadening
+    :param x: the points where to compute the function (in units of the broadening)
     :param ngauss:  0   -> Simple Gaussian (default)
-                    1   -> Methfessel-Paxton of order 1
+                    n>0 -> Methfessel-Paxton of order n
                     -1  -> Marzari-Vanderbilt "cold smearing"
                     -99 -> Fermi-Dirac function
-    :return: dos_up, dos_down (for the given value of energy)
+    :return: an array with the values of the function
     """
+    x = np.asarray(x, dtype=float)
+    if ngauss == -99:
+        # 1 / (2 + exp(-x) + exp(x)), written to avoid overflows
+        ex = np.exp(-np.abs(x))
+        return ex / (1.0 + ex) ** 2
+    elif ngauss == -1:
+        arg = np.minimum(200.0, (x - 1.0 / sqrt2) ** 2)
+        return sqrtpm1 * np.exp(-arg) * (2.0 - sqrt2 * x)
+    elif ngauss < 0:
+        raise ValueError("Unknown smearing type ngauss=%d" % ngauss)
 
-    # TODO non collinear case to be implemented
-    dos_up = 0.
-    dos_down = 0.
+    # Methfessel-Paxton (simple Gaussian for ngauss=0)
+    hp = np.exp(-np.minimum(200.0, x ** 2))
+    w0 = sqrtpm1 * hp
+    hd = np.zeros_like(x)
+    a = sqrtpm1
+    ni = 0
+    for i in range(1, ngauss + 1):
+        hd = 2.0 * x * hp - 2.0 * ni * hd
+        ni += 1
+        a = -a / (i * 4.0)
+        hp = 2.0 * x * hd - 2.0 * ni * hp
+        ni += 1
+        w0 += a * hp
+    return w0
+
+
+def dos_gaussian(e, eigenvalues, weights, degauss, ngauss=0, max_memory=MAX_MEMORY):
+    """
+    Calculates the electronic density of states with Gaussian broadening.
+
+    :param e: energy values (for which calculate the dos)
+    :param eigenvalues: the eigenvalues (a nks x nbnd array, same units of e)
+    :param weights: the weights of the k-points
+    :param degauss: value for the Gaussian broadening (same units of e)
+    :param ngauss:  0   -> Simple Gaussian (default)
+                    n>0 -> Methfessel-Paxton of order n
+                    -1  -> Marzari-Vanderbilt "cold smearing"
+                    -99 -> Fermi-Dirac function
+    :param max_memory: the memory ceiling (in bytes) for a block of the smearing function
+    :return: an array with the dos for each energy value
+    """
+    e = np.asarray(e, dtype=float).ravel()
+    weights = np.asarray(weights, dtype=float)
+    eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(weights.size, -1)
+    w = np.repeat(weights, eigenvalues.shape[1])
+    eigenvalues = eigenvalues.ravel()
+
+    dos = np.empty(e.size)
+    chunk_size = max(1, int(max_memory // (8 * max(eigenvalues.size, 1))))
+    for start in range(0, e.size, chunk_size):
+        x = (e[start:start + chunk_size, None] - eigenvalues) / degauss
+        dos[start:start + chunk_size] = np.dot(w0gauss(x, ngauss), w)
+    return dos / degauss
+
+
+def get_tetrahedra(nk, b=None, optimized=False):
+    """
+    Divides each cell of a k-points grid into 6 tetrahedra sharing its shortest
+    main diagonal.
+
+    :param nk: the sizes of the grid
+    :param b: the reciprocal lattice vectors, used to find the shortest diagonal
+    :param optimized: if True also the 16 additional points of the optimized method are included
+    :return: an array with the indices of the corners (ntetra x 4, or ntetra x 20 for the \
+    optimized method) into the flattened grid (in C order)
+    """
+    nk = tuple(int(n) for n in nk)
+    if b is None:
+        b = np.identity(3)
+    diagonals = np.array([[1, 1, 1], [-1, 1, 1], [1, -1, 1], [1, 1, -1]])
+    lengths = np.linalg.norm(np.dot(diagonals, np.asarray(b) / np.array(nk)[:, None]), axis=1)
+    diagonal = diagonals[np.argmin(lengths)]
+
+    # Each tetrahedron is a path of steps along the three axes, from a corner of the cell to the opposite one
+    corners = np.zeros((6, 4, 3), dtype=int)
+    for k, axes in enumerate(itertools.permutations(range(3))):
+        for i, axis in enumerate(axes):
+            corners[k, i + 1:, axis] = diagonal[axis]
+    if optimized:
+        points = [2 * corners[:, i] - corners[:, j] for i, j in OPT_TETRA_PAIRS]
+        points.extend(corners[:, i] - corners[:, j] + corners[:, k] for i, j, k in OPT_TETRA_TRIPLES)
+        corners = np.concatenate((corners, np.stack(points, axis=1)), axis=1)
+
+    origins = np.indices(nk).reshape(3, -1).T
+    points = (origins[:, None, None, :] + corners) % nk
+    return np.ravel_multi_index(np.moveaxis(points, -1, 0), nk).reshape(-1, corners.shape[1])
+
+
+def get_grid_eigenvalues(kpoints, eigenvalues, b, nk, shift=(0, 0, 0), rotations=None, time_reversal=True):
+    """
+    Puts the eigenvalues of the k-points on a full Monkhorst-Pack grid. Without the
+    rotations the k-points must cover the full grid, otherwise the k-points of the
+    irreducible wedge are unfolded with the symmetries (see symmetry.get_bz_to_ibz_map).
+
+    :param kpoints: the k-points (a nks x 3 array, in the same units of b)
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param b: the reciprocal lattice vectors
+    :param nk: the sizes of the grid
+    :param shift: the offsets of the grid (0 or 1 for each direction)
+    :param rotations: the rotations of the crystal symmetries (see xmlfile.read_symmetries)
+    :param time_reversal: if True the time reversal symmetry is used for unfolding the k-points
+    :return: the eigenvalues on the flattened grid (a nk1*nk2*nk3 x nbnd array)
+    """
+    if rotations is None:
+        rotations, time_reversal = np.identity(3, dtype=int), False
+    bz_to_ibz = get_bz_to_ibz_map(kpoints, b, rotations, nk, shift, time_reversal)[0]
+    return np.asarray(eigenvalues)[bz_to_ibz]
+
+
+def tetra_dos(e, etetra):
+    """
+    Computes the DOS and the integrated DOS of the linear tetrahedron method, summed
+    over the tetrahedra. Only the couples of energies and tetrahedra with the energy
+    between the lowest and the highest corner are computed.
+
+    :param e: energy values, in ascending order
+    :param etetra: the sorted energies of the corners of each tetrahedron (a ntetra x 4 array)
+    :return: two arrays with the dos and the integrated dos for each energy value
+    """
+    start = np.searchsorted(e, etetra[:, 0])
+    counts = np.searchsorted(e, etetra[:, 3]) - start
+    offsets = np.cumsum(counts) - counts
+    it = np.repeat(np.arange(len(etetra)), counts)
+    ie = np.arange(counts.sum()) - np.repeat(offsets - start, counts)
+
+    x = e[ie]
+    e1, e2, e3, e4 = etetra[it].T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # The values of each case are finite where the case is selected
+        d1, d2, d3 = x - e1, x - e2, e4 - x
+        v1 = (e2 - e1) * (e3 - e1) * (e4 - e1)
+        v2 = (e3 - e1) * (e4 - e1)
+        v3 = (e4 - e1) * (e4 - e2) * (e4 - e3)
+        c2 = (e3 - e1 + e4 - e2) / ((e3 - e2) * (e4 - e2))
+        dos = np.where(x < e2, 3.0 * d1 ** 2 / v1,
+                       np.where(x < e3, (3.0 * (e2 - e1) + 6.0 * d2 - 3.0 * c2 * d2 ** 2) / v2,
+                                3.0 * d3 ** 2 / v3))
+        idos = np.where(x < e2, d1 ** 3 / v1,
+                        np.where(x < e3, ((e2 - e1) ** 2 + 3.0 * (e2 - e1) * d2 + 3.0 * d2 ** 2 - c2 * d2 ** 3) / v2,
+                                 1.0 - d3 ** 3 / v3))
+
+    # The tetrahedra below an energy add 1 to the integrated dos
+    below = np.searchsorted(np.sort(etetra[:, 3]), e, side='right')
+    return np.bincount(ie, dos, e.size), np.bincount(ie, idos, e.size) + below
+
+
+def dos_tetrahedra(e, eigenvalues, nk, b=None, weight=1.0, optimized=False, max_memory=MAX_MEMORY):
+    """
+    Calculates the electronic density of states and the integrated density of states with
+    the linear or the optimized tetrahedron method.
+
+    :param e: energy values (for which calculate the dos)
+    :param eigenvalues: the eigenvalues on the full grid (a nk1*nk2*nk3 x nbnd array, in C order)
+    :param nk: the sizes of the grid
+    :param b: the reciprocal lattice vectors
+    :param weight: the sum of the weights of the k-points (2 for non spin-polarized calculations)
+    :param optimized: if True use the optimized tetrahedron method, otherwise the linear one
+    :param max_memory: the memory ceiling (in bytes) for a block of the temporary arrays
+    :return: two arrays with the dos and the integrated dos for each energy value
+    """
+    e = np.asarray(e, dtype=float).ravel()
+    eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(np.prod(nk), -1)
+    tetrahedra = get_tetrahedra(nk, b, optimized)
+    etetra = eigenvalues[tetrahedra]  # ntetra x ncorners x nbnd
+    if optimized:
+        etetra = np.einsum('ij,tjb->tib', OPT_TETRA_WLSM, etetra)
+    etetra = np.sort(etetra.transpose(0, 2, 1).reshape(-1, 4), axis=1)
+
+    order = np.argsort(e)
+    e_sorted = e[order]
+    dos = np.zeros(e.size)
+    idos = np.zeros(e.size)
+
+    # Splits the tetrahedra into blocks with a limited number of couples (energy, tetrahedron)
+    couples = np.cumsum(np.searchsorted(e_sorted, etetra[:, 3]) - np.searchsorted(e_sorted, etetra[:, 0]))
+    max_couples = max(1, int(max_memory // 160))
+    splits = np.searchsorted(couples, np.arange(max_couples, couples[-1] if couples.size else 0, max_couples))
+    for block in np.split(etetra, splits):
+        dos_block, idos_block = tetra_dos(e_sorted, block)
+        dos[order] += dos_block
+        idos[order] += idos_block
 
-    if lsda:   # if magnetic
-        for i in range(0, nks):
-            weight = ks_energies[i]['k_point']['@weight']  # weight at k-point i
-            for j in range(0, nbnd // 2):
-                eigenvalue = ks_energies[i]['eigenvalues'][j] * 2 * nat           # eigenvalue at k-point i, band j
-                dos_up += weight * py_w0gauss((e - eigenvalue) / degauss, ngauss)
-            for j in range(nbnd // 2, nbnd):
-                eigenvalue = ks_energies[i]['eigenvalues'][j] * 2 * nat        # eigenvalue at k-point i, band j
-                dos_down += weight * py_w0gauss((e - eigenvalue) / degauss, ngauss)
+    factor = weight / len(tetrahedra)
+    return dos * factor, idos * factor
 
-    else:       # non magnetic
-        for i in range(0, nks):
-            weight = ks_energies[i]['k_point']['@weight']  # weight at k-point i
-            for j in range(0, nbnd):
-                eigenvalue = ks_energies[i]['eigenvalues'][j] * nat           # eigenvalue at k-point i, band j
-                dos_up += weight * py_w0gauss((e - eigenvalue) / degauss, ngauss)
 
-    dos_up /= degauss
-    dos_down /= degauss
+def write_dos(filedos, e, dos_up, dos_down):
+    """Writes the DOS into a file."""
+    header = " E" + 18 * ' ' + " dos up " + 13 * ' ' + " dos down \n" + \
+             " (eV)" + 16 * ' ' + "(states/eV/cell)" + 4 * ' ' + " (states/eV/cell)"
+    np.savetxt(filedos, np.column_stack((e, dos_up, dos_down)), fmt=('  %.9E', '%.9E', ' %.9E'),
+               delimiter=5 * ' ', header=header)
 
-    return dos_up, dos_down
 
+def get_energy_range(eigenvalues, degauss=0.0, margin=5.0):
+    """
+    Gets an energy range that contains all the eigenvalues and the tails of the
+    smearing function.
 
-def compute_dos(xmlfile, filedos='filedos', e_min='', e_max='', e_step=0.01, degauss=0.02, ngauss=0):
+    :param eigenvalues: the eigenvalues
+    :param degauss: value for the Gaussian broadening (same units of the eigenvalues)
+    :param margin: the margin outside the eigenvalues, in units of degauss
+    :return: the minimum and the maximum energy of the range
+    """
+    return np.min(eigenvalues) - margin * degauss, np.max(eigenvalues) + margin * degauss
+
+
+def refine_grid(function, e_min, e_max, e_step, max_step=None, tol=1.0E-3):
+    """
+    Computes a function on an adaptive grid of energies. The function is first computed
+    with a step *max_step*, then each interval is halved (down to the step *e_step*) while
+    the value at its midpoint differs from the linear interpolation by more than *tol*
+    times the maximum of the function. All the new midpoints of a refinement level are
+    computed together.
+
+    :param function: a function of an array of energies, that returns an array with the \
+    energies on the last axis (eg. a 2 x ne array for the dos of two spins)
+    :param e_min, e_max: the energy range
+    :param e_step: the minimum step of the grid
+    :param max_step: the maximum step of the grid (rounded down to e_step times a power of 2)
+    :param tol: the relative tolerance of the linear interpolation between the points of the grid
+    :return: the array of the energies and the array of the values of the function
+    """
+    n = max(1, int(np.ceil((e_max - e_min) / e_step - 1.0E-9)))
+    coarse = 2 ** int(np.log2(max(1.0, (max_step or 16.0 * e_step) / e_step)))
+    nodes = np.unique(np.append(np.arange(0, n, coarse), n))
+    values = np.asarray(function(e_min + nodes * e_step))
+    threshold = tol * np.abs(values).max()
+
+    left, right = nodes[:-1], nodes[1:]
+    while True:
+        left, right = left[right - left > 1], right[right - left > 1]
+        if not left.size:
+            break
+        middle = (left + right) // 2
+        new_values = np.asarray(function(e_min + middle * e_step))
+        i, j = np.searchsorted(nodes, left), np.searchsorted(nodes, right)
+        interpolated = values[..., i] + (values[..., j] - values[..., i]) * \
+            ((middle - left) / (right - left).astype(float))
+        error = np.abs(new_values - interpolated).reshape(-1, middle.size).max(axis=0)
+
+        nodes = np.append(nodes, middle)
+        values = np.concatenate((values, new_values), axis=-1)
+        order = np.argsort(nodes)
+        nodes, values = nodes[order], values[..., order]
+
+        refine = error > threshold
+        left, right = np.append(left[refine], middle[refine]), np.append(middle[refine], right[refine])
+
+    return e_min + nodes * e_step, values
+
+
+def compute_dos(xmlfile, filedos='filedos', e_min=None, e_max=None, e_step=0.01, degauss=0.02, ngauss=0,
+                bz_sum='smearing', adaptive=False, tol=1.0E-3, max_memory=MAX_MEMORY):
     """
     Compute the electronic density of states between *e_min* and *e_max*, with step *e_step*, using
-    Gaussian broadening type *ngauss* and value *degauss*.
+    Gaussian broadening type *ngauss* and value *degauss* or a tetrahedron method.
 
     :param xmlfile: xml output file from QE
     :param filedos: output dos file containing the DOS values
-    :param e_min, e_max, e_step: calculate the DOS in the range (*e_min*,*e_max*) with step *e_step*
-    :param degauss: value for the Gaussian broadening
+    :param e_min, e_max, e_step: calculate the DOS in the range (*e_min*,*e_max*) with step *e_step* \
+    (in eV). If *e_min* or *e_max* are None they are set from the eigenvalues, with a margin of \
+    5 * *degauss*.
+    :param degauss: value for the Gaussian broadening (in Ry)
     :param ngauss:  0   -> Simple Gaussian (default)
-                    1   -> Methfessel-Paxton of order 1
+                    n>0 -> Methfessel-Paxton of order n
                     -1  -> Marzari-Vanderbilt "cold smearing"
                     -99 -> Fermi-Dirac function
+    :param bz_sum: 'smearing' (default), 'tetrahedra' or 'tetrahedra_lin' for the linear \
+    tetrahedron method, 'tetrahedra_opt' for the optimized tetrahedron method. The tetrahedron \
+    methods require a Monkhorst-Pack grid, the k-points of the irreducible wedge are unfolded \
+    to the full grid with the symmetries of the xml file.
+    :param adaptive: if True the DOS is computed on an adaptive grid (see refine_grid), with \
+    steps between *e_step* and *degauss* (16 * *e_step* for the tetrahedron methods)
+    :param tol: the relative tolerance for the adaptive grid
+    :param max_memory: the memory ceiling (in bytes) for a block of the temporary arrays
     :return: np.array(e), np.array(dos_up), np.array(dos_down)
     """
+    # TODO non collinear case to be implemented
+    bands = read_band_structure(xmlfile)
+    eigenvalues = 2.0 * bands['eigenvalues']  # from Hartree to Rydberg
+    weights = bands['weights']
+
+    if e_min is None or e_max is None:
+        e_range = get_energy_range(eigenvalues / ev_to_ry, degauss / ev_to_ry)
+        e_min = e_range[0] if e_min is None else e_min
+        e_max = e_range[1] if e_max is None else e_max
+
+    if bz_sum == 'smearing':
+        max_step = degauss / ev_to_ry
+
+        def get_dos(e_ry, eig):
+            return dos_gaussian(e_ry, eig, weights, degauss, ngauss, max_memory)
+    elif bz_sum in ('tetrahedra', 'tetrahedra_lin', 'tetrahedra_opt'):
+        if 'mp_grid' not in bands:
+            raise ValueError("The tetrahedron methods require a Monkhorst-Pack grid of k-points")
+        nk = bands['mp_grid']
+        eigenvalues = get_grid_eigenvalues(bands['kpoints'], eigenvalues, bands['b'], nk, bands['mp_shift'],
+                                           read_symmetries(xmlfile), not bands.get('noncolin'))
+        max_step = 16.0 * e_step
+
+        def get_dos(e_ry, eig):
+            return dos_tetrahedra(e_ry, eig, nk, bands['b'], weights.sum(), bz_sum == 'tetrahedra_opt', max_memory)[0]
+    else:
+        raise ValueError("Unknown bz_sum %r" % bz_sum)
+
+    def get_spin_dos(e):
+        # The dos for spin up and down, in states/eV
+        e_ry = e * ev_to_ry
+        if bands.get('lsda'):
+            nbnd_up = bands.get('nbnd_up', bands['nbnd'] // 2)
+            return np.array([get_dos(e_ry, eigenvalues[:, :nbnd_up]),
+                             get_dos(e_ry, eigenvalues[:, nbnd_up:])]) * ev_to_ry
+        return np.array([get_dos(e_ry, eigenvalues) * ev_to_ry, np.zeros(e.size)])
+
+    if adaptive:
+        e, (dos_up, dos_down) = refine_grid(get_spin_dos, e_min, e_max, e_step, max_step, tol)
+    else:
+        e = np.arange(e_min, e_max, e_step)
+        dos_up, dos_down = get_spin_dos(e)
+
+    write_dos(filedos, e, dos_up, dos_down)
+    return e, dos_up, dos_down
+
+
+class DOS:
+    """
+    Electronic density of states computed from the arrays of eigenvalues with the smearing
+    functions. It has the public methods of ase.dft.DOS (get_energies and get_dos), with
+    energies in eV relative to the Fermi level. The DOS is computed for all the spins at
+    once and cached for each set of (width, npts, smearing, window), so changing back and
+    forth the attributes doesn't recompute the DOS.
+
+    :param eigenvalues: the eigenvalues (a nks x nbnd array, in eV). For spin-polarized \
+    calculations each row contains the bands with spin up followed by the ones with spin down.
+    :param weights: the weights of the k-points (normalized to 1)
+    :param fermi_level: the Fermi energy (in eV), or a couple of energies for the two spins
+    :param width: the width of the smearing (in eV)
+    :param window: the energy range (emin, emax), relative to the Fermi level. If not \
+    specified, a range holding all the eigenvalues with a margin of 5 * *width* is used.
+    :param npts: the number of points
+    :param smearing: the smearing type, a value of ngauss (see w0gauss) or a name of pw.x smearing
+    :param nspins: 2 for spin-polarized calculations, 1 otherwise
+    :param max_memory: the memory ceiling (in bytes) for a block of the smearing function
+    """
+    def __init__(self, eigenvalues, weights, fermi_level=0.0, width=0.1, window=None, npts=401, smearing=0,
+                 nspins=1, max_memory=MAX_MEMORY):
+        weights = np.asarray(weights, dtype=float)
+        eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(weights.size, -1)
+        self.nspins = nspins
+        self.w_k = weights / weights.sum()
+        self.e_skn = np.array(np.split(eigenvalues, nspins, axis=1))
+        self.e_skn -= np.reshape(fermi_level, (-1, 1, 1))
+        self.width = width
+        self.window = window
+        self.npts = npts
+        self.smearing = smearing
+        self.max_memory = max_memory
+        self._cache = {}
+
+    @classmethod
+    def from_xml(cls, xmlfile, width=0.1, window=None, npts=401, smearing=0, max_memory=MAX_MEMORY):
+        """
+        Creates the DOS of a pw.x run from its xml output file. If the Fermi energy isn't in
+        the file (e.g. for insulators) it's the highest occupied level or, for an nscf run
+        with smearing, it's computed from the eigenvalues.
+
+        :param xmlfile: xml output file from QE
+        :return: a DOS object, the other arguments are the ones of the class
+        """
+        bands = read_band_structure(xmlfile)
+        if 'two_fermi_energies' in bands:
+            ef = bands['two_fermi_energies']
+        elif 'fermi_energy' in bands:
+            ef = bands['fermi_energy']
+        elif 'highestOccupiedLevel' in bands:
+            ef = bands['highestOccupiedLevel']
+        else:
+            ngauss = SMEARINGS.get(bands.get('smearing', '').lower(), 0)
+            ef = get_fermi_energy(bands['eigenvalues'], bands['weights'], bands['nelec'],
+                                  bands.get('degauss', 0.0) / 2.0, ngauss)
+
+        hartree = 2.0 / ev_to_ry  # from Hartree to eV
+        return cls(bands['eigenvalues'] * hartree, bands['weights'], np.asarray(ef) * hartree, width, window, npts,
+                   smearing, 2 if bands.get('lsda') else 1, max_memory)
+
+    def get_energies(self):
+        """Return the array of energies used to sample the DOS.
+
+        The energies are reported relative to the Fermi level."""
+        if self.window is None:
+            emin, emax = get_energy_range(self.e_skn, self.width)
+        else:
+            emin, emax = self.window
+        return np.linspace(emin, emax, self.npts)
+
+    def get_dos(self, spin=None):
+        """Get array of DOS values.
+
+        The *spin* argument can be 0 or 1 (spin up or down) - if not
+        specified, the total DOS is returned."""
+        key = (self.width, self.npts, self.smearing, None if self.window is None else tuple(self.window))
+        if key not in self._cache:
+            ngauss = SMEARINGS.get(self.smearing.lower(), 0) if isinstance(self.smearing, str) else self.smearing
+            e = self.get_energies()
+            self._cache[key] = np.array([dos_gaussian(e, e_kn, self.w_k, self.width, ngauss, self.max_memory)
+                                         for e_kn in self.e_skn])
+        dos = self._cache[key]
 
-    ibrav, alat, a, b, nat, ntyp, atomic_positions, atomic_species = get_cell_data(xmlfile)
-    prefix, outdir, ecutwfc, ecutrho, functional, lsda, noncolin, pseudodir, nr, nr_smooth = \
-        get_calculation_data(xmlfile)
-    nks, nbnd, ks_energies = get_band_strucure_data(xmlfile)
-
-    # TODO determine E_min, E_max automatically from ks_energies if not set in input parameters
-
-    # Convert to rydberg
-    e_min = e_min * ev_to_ry
-    e_max = e_max * ev_to_ry
-    e_step = e_step * ev_to_ry
-
-    fout = open(filedos, "w")
-    fout.write("#  E"+18*' '+" dos up "+13*' '+" dos down \n")
-    fout.write("#  (eV)"+16*' '+"(states/eV/cell)"+4*' '+" (states/eV/cell)\n")
-    te = e_min
-    e = []
-    dos_up = []
-    dos_down = []
-    while te < e_max:
-        tdos_up, tdos_down = dos_gaussian(te, nat, ks_energies, lsda, nbnd, nks, degauss, ngauss)
-        fout.write( "  {:.9E}".format(te / ev_to_ry)+4*' '+" {:.9E}".format(tdos_up * ev_to_ry) +
-                    4*' '+"  {:.9E}\n".format(tdos_down * ev_to_ry) )
-        e.append(te / ev_to_ry)
-        dos_up.append(tdos_up * ev_to_ry)
-        dos_down.append(tdos_down * ev_to_ry)
-        te += e_step
-
-    return np.array(e), np.array(dos_up), np.array(dos_down)
\ No newline at end of file
+        if spin is None:
+            return dos.sum(axis=0) if self.nspins == 2 else 2.0 * dos[0]
+        return dos[spin if self.nspins == 2 else 0]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Functions to compute the Fermi energy, the occupations and the band edges from the
+arrays of eigenvalues and k-point weights (as returned by xmlfile.read_band_structure).
+
+The weights are the ones of the xml file: their sum is 2 for non spin-polarized runs,
+with single occupations of the states, and 1 for spin-polarized runs, where the bands
+of both the spins are in the same rows of the eigenvalues.
+"""
+import numpy as np
+from scipy.special import erf, erfc
+
+sqrtpm1 = 1.0 / np.sqrt(np.pi)
+sqrt2 = np.sqrt(2.0)
+
+# Smearing names of pw.x and the corresponding values of ngauss
+SMEARINGS = {
+    'gaussian': 0, 'gauss': 0,
+    'methfessel-paxton': 1, 'm-p': 1, 'mp': 1,
+    'marzari-vanderbilt': -1, 'cold': -1, 'm-v': -1, 'mv': -1,
+    'fermi-dirac': -99, 'f-d': -99, 'fd': -99
+}
+
+
+def wgauss(x, ngauss=0):
+    """
+    Computes the smearing function (an approximation of the step function) for an
+    array of values. It's the same of wgauss function of QE.
+
+    :param x: the points where to compute the function (in units of the broadening)
+    :param ngauss:  0   -> Simple Gaussian (default)
+                    n>0 -> Methfessel-Paxton of order n
+                    -1  -> Marzari-Vanderbilt "cold smearing"
+                    -99 -> Fermi-Dirac function
+    :return: an array with the values of the function
+    """
+    x = np.asarray(x, dtype=float)
+    if ngauss == -99:
+        return 0.5 * (1.0 + np.tanh(0.5 * x))
+    elif ngauss == -1:
+        xp = x - 1.0 / sqrt2
+        return 0.5 * erf(xp) + sqrtpm1 / sqrt2 * np.exp(-np.minimum(200.0, xp ** 2)) + 0.5
+    elif ngauss < 0:
+        raise ValueError("Unknown smearing type ngauss=%d" % ngauss)
+
+    # Methfessel-Paxton (simple Gaussian for ngauss=0)
+    w = 0.5 * erfc(-x)
+    hp = np.exp(-np.minimum(200.0, x ** 2))
+    hd = np.zeros_like(x)
+    a = sqrtpm1
+    ni = 0
+    for i in range(1, ngauss + 1):
+        hd = 2.0 * x * hp - 2.0 * ni * hd
+        ni += 1
+        a = -a / (i * 4.0)
+        w -= a * hd
+        hp = 2.0 * x * hd - 2.0 * ni * hp
+        ni += 1
+    return w
+
+
+def get_occupations(eigenvalues, ef, degauss=0.0, ngauss=0):
+    """
+    Computes the occupations of the states for a given Fermi energy.
+
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param ef: the Fermi energy (same units of the eigenvalues)
+    :param degauss: the smearing width (same units of the eigenvalues), 0 for fixed occupations
+    :param ngauss: the smearing type (see wgauss)
+    :return: an array with the occupations of the states, between 0 and 1 (except for the \\
+    non-monotonic smearing functions)
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    if degauss > 0.0:
+        return wgauss((ef - eigenvalues) / degauss, ngauss)
+    return (eigenvalues <= ef).astype(float)
+
+
+def get_fermi_energy(eigenvalues, weights, nelec, degauss=0.0, ngauss=0, tol=1.0E-10, maxiter=300):
+    """
+    Computes the Fermi energy from the eigenvalues. With a smearing the Fermi energy is found
+    by bisection on the number of electrons, otherwise the states are filled in order of
+    energy and the Fermi energy is the highest occupied level.
+
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param weights: the weights of the k-points
+    :param nelec: the number of electrons
+    :param degauss: the smearing width (same units of the eigenvalues), 0 for fixed occupations
+    :param ngauss: the smearing type (see wgauss)
+    :param tol: the tolerance on the number of electrons
+    :param maxiter: the maximum number of bisection steps
+    :return: the Fermi energy (same units of the eigenvalues)
+    """
+    weights = np.asarray(weights, dtype=float)
+    eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(weights.size, -1)
+    if nelec > weights.sum() * eigenvalues.shape[1] + tol:
+        raise ValueError("Not enough bands for %g electrons" % nelec)
+
+    if degauss <= 0.0:
+        order = np.argsort(eigenvalues, axis=None)
+        counts = np.cumsum(np.broadcast_to(weights[:, None], eigenvalues.shape).ravel()[order])
+        k = min(np.searchsorted(counts, nelec - tol), order.size - 1)
+        return eigenvalues.ravel()[order[k]]
+
+    e_low = eigenvalues.min() - 2.0 * degauss
+    e_high = eigenvalues.max() + 2.0 * degauss
+    ef = 0.5 * (e_low + e_high)
+    for _ in range(maxiter):
+        ef = 0.5 * (e_low + e_high)
+        count = np.dot(wgauss((ef - eigenvalues) / degauss, ngauss).sum(axis=1), weights)
+        if abs(count - nelec) < tol:
+            break
+        elif count < nelec:
+            e_low = ef
+        else:
+            e_high = ef
+    return ef
+
+
+def get_band_edges(eigenvalues, ef):
+    """
+    Gets the band edges and the band gap. A band (a column of the eigenvalues) that
+    crosses the Fermi energy makes the gap null.
+
+    :param eigenvalues: the eigenvalues (a nks x nbnd array)
+    :param ef: the Fermi energy (same units of the eigenvalues)
+    :return: the valence band maximum, the conduction band minimum and the band gap. \\
+    The edges are NaN if there aren't states below or above the Fermi energy.
+    """
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    eigenvalues = eigenvalues.reshape(-1, eigenvalues.shape[-1])
+    occupied = eigenvalues <= ef
+    vbm = eigenvalues[occupied].max() if occupied.any() else np.nan
+    cbm = eigenvalues[~occupied].min() if not occupied.all() else np.nan
+
+    crossing = np.any(occupied.any(axis=0) & ~occupied.all(axis=0))
+    gap = 0.0 if crossing else cbm - vbm
+    return vbm, cbm, gap
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Fourier interpolation of periodic quantities (charge, potentials) given on the FFT grid.
+
+A quantity f(r) on the grid is expanded as f(r) = sum_G f(G) exp(2*pi*i*G.r), with r in
+alat units and G in 2*pi/alat units (as the output of compute_G). The sum is evaluated
+for many points at once as a product between the matrix of the phases and the vector of
+the coefficients, in chunks of points to bound the memory used.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .constants import pi
+
+try:
+    import finufft
+except ImportError:
+    finufft = None
+
+# Default memory ceiling (in bytes) for the temporary matrix of the phases
+MAX_MEMORY = 64 * 1024 ** 2
+
+
+def get_gcutm(ecutrho, alat):
+    """
+    Returns the cutoff for G^2 (in (2*pi/alat)^2 units) from the cutoff on the charge
+    *ecutrho* (in Hartree, as in the xml file) and the lattice parameter *alat*.
+    """
+    return 2.0 * ecutrho / ((2.0 * pi / alat) ** 2)
+
+
+def get_fourier_coefficients(f, G, gcutm=None):
+    """
+    Computes the Fourier coefficients of the quantity *f* given on the FFT grid.
+
+    :param f: the quantity on the FFT grid (a nr1 x nr2 x nr3 array)
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param gcutm: if given, only the G vectors with G^2 <= gcutm are kept
+    :return: the G vectors (a ng x 3 array) and the coefficients f(G) (ng complex values)
+    """
+    g = np.reshape(G, (-1, 3))
+    coeffs = np.fft.fftn(f).ravel() / f.size
+    if gcutm is not None:
+        mask = np.einsum('ij,ij->i', g, g) <= gcutm
+        g, coeffs = g[mask], coeffs[mask]
+    return g, coeffs
+
+
+def get_grid_coefficients(f, G=None, gcutm=None):
+    """
+    Computes the Fourier coefficients of the quantity *f* on the FFT grid, as needed by
+    the FFT based functions of this module. The coefficients can be computed once and
+    reused for any number of sections or points.
+
+    :param f: the quantity on the FFT grid (a nr1 x nr2 x nr3 array)
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param gcutm: if given, the coefficients with G^2 > gcutm are set to zero
+    :return: the coefficients f(G) (a nr1 x nr2 x nr3 complex array)
+    """
+    coeffs = np.fft.fftn(f) / f.size
+    if gcutm is not None:
+        coeffs[np.einsum('...i,...i', G, G) > gcutm] = 0.0
+    return coeffs
+
+
+def get_chunk_size(ng, max_memory=MAX_MEMORY):
+    """Returns the number of points that can be evaluated together within *max_memory*."""
+    return max(1, int(max_memory // (16 * max(ng, 1))))
+
+
+def fourier_interpolate(points, g, coeffs, max_memory=MAX_MEMORY, max_workers=None):
+    """
+    Evaluates the Fourier expansion with G vectors *g* and coefficients *coeffs* at
+    the given points.
+
+    :param points: the points where to evaluate the quantity (a npoints x 3 array, alat units)
+    :param g: G vectors (a ng x 3 array, 2*pi/alat units)
+    :param coeffs: the Fourier coefficients for each G vector
+    :param max_memory: the memory ceiling (in bytes) for the matrix of the phases
+    :param max_workers: if given, the chunks of points are evaluated by a pool of \
+    max_workers threads (NumPy releases the GIL), sharing the memory ceiling
+    :return: the complex values at the points
+    """
+    points = np.reshape(np.asarray(points, dtype=float), (-1, 3))
+    values = np.zeros(points.shape[0], dtype=complex)
+    workers = max(1, max_workers or 1)
+    chunk = get_chunk_size(g.shape[0], max_memory // workers)
+
+    def evaluate_chunk(start):
+        phases = np.exp(2.0j * pi * np.dot(points[start:start + chunk], g.T))
+        values[start:start + chunk] = np.dot(phases, coeffs)
+
+    starts = range(0, points.shape[0], chunk)
+    if workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(evaluate_chunk, starts))
+    else:
+        for start in starts:
+            evaluate_chunk(start)
+    return values
+
+
+def fourier_interpolate_2d(x0, e1, e2, x1, x2, g, coeffs, max_memory=MAX_MEMORY):
+    """
+    Evaluates the Fourier expansion on the plane points x0 + x1[i]*e1 + x2[j]*e2.
+    The sum is separable: with A[i,G] = exp(2*pi*i*x1[i]*G.e1), B[j,G] = exp(2*pi*i*x2[j]*G.e2)
+    and w[G] = f(G)*exp(2*pi*i*G.x0), the plane is the matrix product (A*w).B^T, computed by
+    BLAS in chunks of G vectors.
+
+    :param x0: the origin of the plane (alat units)
+    :param e1, e2: the unit vectors of the two directions of the plane
+    :param x1, x2: the coordinates of the points along e1 and e2
+    :param g: G vectors (a ng x 3 array, 2*pi/alat units)
+    :param coeffs: the Fourier coefficients for each G vector
+    :param max_memory: the memory ceiling (in bytes) for the matrices of the phases
+    :return: the complex values on the plane (a len(x1) x len(x2) array)
+    """
+    x1, x2 = np.asarray(x1, dtype=float), np.asarray(x2, dtype=float)
+    weights = coeffs * np.exp(2.0j * pi * np.dot(g, x0))
+    g1, g2 = np.dot(g, e1), np.dot(g, e2)
+
+    values = np.zeros((x1.size, x2.size), dtype=complex)
+    chunk = get_chunk_size(x1.size + x2.size, max_memory)
+    for start in range(0, g.shape[0], chunk):
+        end = start + chunk
+        eig1 = np.exp(2.0j * pi * np.outer(x1, g1[start:end]))
+        eig2 = np.exp(2.0j * pi * np.outer(x2, g2[start:end]))
+        values += np.dot(eig1 * weights[start:end], eig2.T)
+    return values
+
+
+################################################################################
+# Zero-padding FFT interpolation, exact for sections along the lattice vectors
+################################################################################
+
+def get_frequencies(n):
+    """Returns the signed frequencies of the n points of an FFT axis (as in compute_G)."""
+    i = np.arange(n)
+    return np.where(i >= n // 2, i - n, i)
+
+
+def resample(f, new_nr, coeffs=None):
+    """
+    Interpolates the quantity *f* on a finer FFT grid by zero padding its Fourier
+    coefficients, with a single inverse FFT. The result is the same of the direct
+    summation of the Fourier expansion on the points of the new grid.
+
+    :param f: the quantity on the FFT grid (a nr1 x nr2 x nr3 array)
+    :param new_nr: the dimensions of the new grid, not smaller than f.shape
+    :param coeffs: if given, the Fourier coefficients of *f* to use, as computed by \
+    get_grid_coefficients (eg. with a cutoff)
+    :return: the quantity on the new grid
+    """
+    new_nr = tuple(int(n) for n in new_nr)
+    if any(m < n for m, n in zip(new_nr, f.shape)):
+        raise ValueError("the new grid %r is coarser than the grid %r" % (new_nr, f.shape))
+    if coeffs is None:
+        coeffs = get_grid_coefficients(f)
+
+    padded = np.zeros(new_nr, dtype=complex)
+    padded[np.ix_(*[get_frequencies(n) % m for n, m in zip(f.shape, new_nr)])] = coeffs
+    return np.fft.ifftn(padded).real * padded.size
+
+
+def get_lattice_direction(v, a, tol=1.0E-6):
+    """
+    Checks if the vector *v* is a lattice vector, ie. n1*a[0] + n2*a[1] + n3*a[2]
+    with integer n1, n2, n3.
+
+    :param v: a 3D vector (alat units)
+    :param a: the direct lattice vectors (rows, alat units)
+    :return: the integer array (n1, n2, n3) or None if v is not a lattice vector
+    """
+    c = np.linalg.solve(np.transpose(a), v)
+    n = np.rint(c).astype(int)
+    if n.any() and np.allclose(c, n, atol=tol):
+        return n
+    return None
+
+
+def _get_padded_axis(qmin, qmax, npoints):
+    """
+    Returns the length of a zero-padded FFT axis holding the frequencies from qmin
+    to qmax and the indices on it of the points i/(npoints-1), i = 0, ..., npoints - 1.
+    """
+    step = -(-(qmax - qmin + 1) // (npoints - 1))  # ceil(span / (npoints - 1))
+    length = (npoints - 1) * step
+    return length, (np.arange(npoints) * step) % length
+
+
+def _get_section_coefficients(coeffs, G, x0, directions):
+    """
+    Returns the Fourier coefficients translated so that x0 is the origin and, for each
+    lattice vector n in *directions*, the integer frequencies G.n of the coefficients.
+    """
+    coeffs = coeffs * np.exp(2.0j * pi * np.dot(G, x0))
+    m = np.meshgrid(*[get_frequencies(n) for n in coeffs.shape], indexing='ij')
+    return coeffs.ravel(), [(m[0] * n[0] + m[1] * n[1] + m[2] * n[2]).ravel() for n in directions]
+
+
+def fourier_line(coeffs, G, x0, n, npoints):
+    """
+    Evaluates the Fourier interpolation on the points x0 + i/(npoints-1)*v, for
+    i = 0, ..., npoints - 1, where v = n1*a[0] + n2*a[1] + n3*a[2] is a lattice vector.
+    Along the line exp(2*pi*i*G.r) depends only on the integer G.v, hence the coefficients
+    are summed for each G.v and the line is computed with a zero-padded 1D inverse FFT.
+
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param x0: the origin of the line (alat units)
+    :param n: the integer components (n1, n2, n3) of the lattice vector v
+    :param npoints: the number of points of the line
+    :return: the complex values on the line
+    """
+    coeffs, (q,) = _get_section_coefficients(coeffs, G, x0, [n])
+    qmin, qmax = q.min(), q.max()
+    length, indices = _get_padded_axis(qmin, qmax, npoints)
+
+    padded = np.zeros(length, dtype=complex)
+    padded[np.arange(qmin, qmax + 1) % length] = \
+        np.bincount(q - qmin, coeffs.real) + 1j * np.bincount(q - qmin, coeffs.imag)
+    return np.fft.ifft(padded)[indices] * length
+
+
+def fourier_plane(coeffs, G, x0, n1, n2, npoints):
+    """
+    Evaluates the Fourier interpolation on the points
+    x0 + i/(npoints[0]-1)*v1 + j/(npoints[1]-1)*v2, where v1 and v2 are the lattice
+    vectors with integer components n1 and n2, with a zero-padded 2D inverse FFT.
+
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param x0: the origin of the plane (alat units)
+    :param n1, n2: the integer components of the lattice vectors v1 and v2
+    :param npoints: the number of points along the two directions
+    :return: the complex values on the plane (a npoints[0] x npoints[1] array)
+    """
+    coeffs, (q1, q2) = _get_section_coefficients(coeffs, G, x0, [n1, n2])
+    q1min, q1max, q2min, q2max = q1.min(), q1.max(), q2.min(), q2.max()
+    length1, indices1 = _get_padded_axis(q1min, q1max, npoints[0])
+    length2, indices2 = _get_padded_axis(q2min, q2max, npoints[1])
+
+    span1, span2 = q1max - q1min + 1, q2max - q2min + 1
+    bins = (q1 - q1min) * span2 + (q2 - q2min)
+    binned = np.bincount(bins, coeffs.real, span1 * span2) + 1j * np.bincount(bins, coeffs.imag, span1 * span2)
+
+    padded = np.zeros((length1, length2), dtype=complex)
+    padded[np.ix_(np.arange(q1min, q1max + 1) % length1, np.arange(q2min, q2max + 1) % length2)] = \
+        binned.reshape(span1, span2)
+    return np.fft.ifft2(padded)[np.ix_(indices1, indices2)] * (length1 * length2)
+
+
+def planar_average(coeffs, axis=2, npoints=None, windows=()):
+    """
+    Computes the average of the quantity on the planes parallel to the two lattice vectors
+    different from a[axis], as a function of the crystal coordinate along a[axis]. Only the
+    coefficients of the G vectors multiple of b[axis] (G parallel to the planes equal to 0)
+    contribute. Each window of *windows* convolves the average with a square window of that
+    width, that in reciprocal space is a product by sinc(k*width) (macroscopic average).
+
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param axis: the index of the lattice vector along which the average is computed
+    :param npoints: the number of points of the result (default is the grid dimension along axis)
+    :param windows: the widths of the windows (in units of the lattice vector a[axis])
+    :return: the complex values of the average at the crystal coordinates i/npoints
+    """
+    index = [0, 0, 0]
+    index[axis] = slice(None)
+    line = coeffs[tuple(index)]
+    k = get_frequencies(line.size)
+    for width in windows:
+        line = line * np.sinc(k * width)
+
+    npoints = npoints or line.size
+    if npoints < line.size:
+        raise ValueError("the number of points must be at least %d" % line.size)
+    padded = np.zeros(npoints, dtype=complex)
+    padded[k % npoints] = line
+    return np.fft.ifft(padded) * npoints
+
+
+################################################################################
+# Spherical averages and sampling on spheres
+################################################################################
+
+def get_shells(g, decimals=8):
+    """
+    Groups the G vectors in shells of the same modulus.
+
+    :param g: G vectors (a ng x 3 array, 2*pi/alat units)
+    :param decimals: the number of decimals used to compare the moduli
+    :return: the moduli of the shells, the indices that sort g by shell and the \
+    starting position of each shell in the sorted g
+    """
+    norms = np.round(np.sqrt(np.einsum('ij,ij->i', g, g)), decimals)
+    order = np.argsort(norms, kind='stable')
+    gnorms, starts = np.unique(norms[order], return_index=True)
+    return gnorms, order, starts
+
+
+def spherical_average(centers, r, g, coeffs, max_memory=MAX_MEMORY):
+    """
+    Computes the spherical averages of the Fourier expansion around some centers. The
+    average of exp(2*pi*i*G.x) on the sphere of radius r around x0 is
+    exp(2*pi*i*G.x0)*j0(2*pi*|G|*r), so the coefficients are summed once for each shell
+    of G vectors with the same modulus and the averages are a product between the matrix
+    of the shell sums and the matrix of the spherical Bessel functions j0.
+
+    :param centers: the centers of the spheres (a ncenters x 3 array, alat units)
+    :param r: the radii of the spheres (alat units)
+    :param g: G vectors (a ng x 3 array, 2*pi/alat units)
+    :param coeffs: the Fourier coefficients for each G vector
+    :param max_memory: the memory ceiling (in bytes) for the matrix of the phases
+    :return: the averages (a ncenters x len(r) array)
+    """
+    centers = np.reshape(np.asarray(centers, dtype=float), (-1, 3))
+    r = np.asarray(r, dtype=float)
+    gnorms, order, starts = get_shells(g)
+    g, coeffs = g[order], coeffs[order]
+    bessel = np.sinc(2.0 * np.outer(gnorms, r))  # j0(2*pi*|G|*r), as sinc(x) = sin(pi*x)/(pi*x)
+
+    averages = np.zeros((centers.shape[0], r.size))
+    chunk = get_chunk_size(g.shape[0], max_memory)
+    for start in range(0, centers.shape[0], chunk):
+        weights = np.exp(2.0j * pi * np.dot(centers[start:start + chunk], g.T)) * coeffs
+        averages[start:start + chunk] = np.dot(np.add.reduceat(weights, starts, axis=1), bessel).real
+    return averages
+
+
+def fibonacci_sphere(npoints):
+    """
+    Returns npoints almost uniformly distributed on the unit sphere (Fibonacci lattice).
+
+    :return: the polar and azimuthal angles (theta, phi) and the unit vectors (a npoints x 3 array)
+    """
+    i = np.arange(npoints) + 0.5
+    theta = np.arccos(1.0 - 2.0 * i / npoints)
+    phi = (pi * (1.0 + 5.0 ** 0.5) * i) % (2.0 * pi)
+    versors = np.column_stack((np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)))
+    return theta, phi, versors
+
+
+def sphere_interpolate(centers, radius, npoints, coeffs, G, a, max_memory=MAX_MEMORY, max_workers=None):
+    """
+    Evaluates the Fourier interpolation on spheres of the same radius around some
+    centers, sampled with a Fibonacci lattice. The points of all the spheres are evaluated
+    together (see interpolate).
+
+    :param centers: the centers of the spheres (a ncenters x 3 array, alat units)
+    :param radius: the radius of the spheres (alat units)
+    :param npoints: the number of points on each sphere
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param a: the direct lattice vectors (rows, alat units)
+    :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+    :param max_workers: if given, the chunks of points are evaluated by a pool of threads
+    :return: the polar and azimuthal angles of the points and the complex values \
+    (a ncenters x npoints array)
+    """
+    centers = np.reshape(np.asarray(centers, dtype=float), (-1, 3))
+    theta, phi, versors = fibonacci_sphere(npoints)
+    points = centers[:, None, :] + radius * versors
+    values = interpolate(points, coeffs, G, a, max_memory, max_workers)
+    return theta, phi, values.reshape(centers.shape[0], npoints)
+
+
+################################################################################
+# Non-uniform FFT (type 2) for many scattered points
+################################################################################
+
+# Number of points above which interpolate() uses the non-uniform FFT
+NUFFT_MIN_POINTS = 20000
+
+
+def _gaussian_gridding(x, coeffs, eps=1.0E-8, max_memory=MAX_MEMORY):
+    """
+    Type 2 non-uniform FFT with Gaussian gridding (Greengard and Lee, SIAM Review 46,
+    443 (2004)): the coefficients are divided by the Fourier transform of a Gaussian,
+    transformed on a grid oversampled by a factor 2 and the values at the points are
+    the convolutions with the Gaussian over the 2*msp nearest points of each axis.
+
+    :param x: the points (a npoints x 3 array of angles in [0, 2*pi))
+    :param coeffs: the coefficients on the FFT grid (in the FFT order)
+    :param eps: the requested precision
+    :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+    :return: the complex values sum_k coeffs[k]*exp(i*k.x) at the points
+    """
+    msp = min(16, max(2, int(np.ceil(-np.log10(eps) / 0.9))))  # the error is about 10^(-0.9*msp)
+    offsets = np.arange(1 - msp, msp + 1)
+    modes = [n + n % 2 for n in coeffs.shape]  # for odd n, k = -(n+1)/2, ..., (n-3)/2
+    shape = tuple(2 * n for n in modes)
+
+    # Deconvolution and oversampled inverse FFT
+    taus, indices, deconvolutions = [], [], []
+    for n, nk, m in zip(coeffs.shape, modes, shape):
+        k = get_frequencies(n)
+        taus.append(pi * msp / (nk * nk * 3.0))  # R = 2, tau = pi*msp/(nk^2*R*(R-1/2))
+        indices.append(k % m)
+        deconvolutions.append(np.sqrt(pi / taus[-1]) * np.exp(k * k * taus[-1]))
+    padded = np.zeros(shape, dtype=complex)
+    padded[np.ix_(*indices)] = coeffs * np.einsum('i,j,k->ijk', *deconvolutions)
+    fine = np.fft.ifftn(padded)
+
+    values = np.zeros(x.shape[0], dtype=complex)
+    chunk = max(1, int(max_memory // (64 * offsets.size)))
+    for start in range(0, x.shape[0], chunk):
+        # nearest grid points and Gaussian weights along each axis
+        grid, weights = [], []
+        for d, (m, tau) in enumerate(zip(shape, taus)):
+            xd = x[start:start + chunk, d]
+            j = np.floor(xd * m / (2.0 * pi)).astype(int)[:, None] + offsets
+            weights.append(np.exp(-(xd[:, None] - 2.0 * pi * j / m) ** 2 / (4.0 * tau)))
+            grid.append(j % m)
+        chunk_values = values[start:start + chunk]
+        for o1 in range(offsets.size):
+            for o2 in range(offsets.size):
+                column = fine[grid[0][:, o1, None], grid[1][:, o2, None], grid[2]]
+                chunk_values += weights[0][:, o1] * weights[1][:, o2] * np.einsum('ij,ij->i', column, weights[2])
+    return values
+
+
+def nufft_interpolate(points, coeffs, a, eps=1.0E-8, max_memory=MAX_MEMORY):
+    """
+    Evaluates the Fourier interpolation at the given points with a type 2 non-uniform
+    FFT, with a cost O(N_grid*log(N_grid) + N_points) instead of O(N_G*N_points) of the
+    direct summation. The finufft package is used if installed, otherwise a pure NumPy
+    Gaussian gridding.
+
+    :param points: the points where to evaluate the quantity (a npoints x 3 array, alat units)
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param a: the direct lattice vectors (rows, alat units)
+    :param eps: the requested precision
+    :param max_memory: the memory ceiling (in bytes) for the temporary arrays of the gridding
+    :return: the complex values at the points
+    """
+    points = np.reshape(np.asarray(points, dtype=float), (-1, 3))
+
+    # G.r = 2*pi*m.s, with s the crystal coordinates of r
+    x = 2.0 * pi * (np.linalg.solve(np.transpose(a), points.T).T % 1.0)
+    if finufft is None:
+        return _gaussian_gridding(x, coeffs, eps, max_memory)
+    else:
+        # finufft modes are -n/2, ..., (n-1)/2 (rounded down), while compute_G uses
+        # -(n+1)/2, ..., (n-3)/2 for odd n: odd axes get an additional (zero) mode
+        shape = tuple(n + n % 2 for n in coeffs.shape)
+        if shape != coeffs.shape:
+            padded = np.zeros(shape, dtype=complex)
+            padded[np.ix_(*[get_frequencies(n) % m for n, m in zip(coeffs.shape, shape)])] = coeffs
+            coeffs = padded
+        return finufft.nufft3d2(x[:, 0], x[:, 1], x[:, 2], np.ascontiguousarray(coeffs),
+                                isign=1, eps=eps, modeord=1)
+
+
+def interpolate(points, coeffs, G, a, max_memory=MAX_MEMORY, max_workers=None):
+    """
+    Evaluates the Fourier interpolation at the given points, by direct summation over the
+    non-zero coefficients (see fourier_interpolate) or, for more than NUFFT_MIN_POINTS
+    points, with a non-uniform FFT (see nufft_interpolate).
+
+    :param points: the points where to evaluate the quantity (a npoints x 3 array, alat units)
+    :param coeffs: the Fourier coefficients on the FFT grid, as computed by get_grid_coefficients
+    :param G: G vectors for each point of the grid, as computed by compute_G
+    :param a: the direct lattice vectors (rows, alat units)
+    :param max_memory: the memory ceiling (in bytes) for the temporary arrays
+    :param max_workers: if given, the chunks of points are evaluated by a pool of threads
+    :return: the complex values at the points
+    """
+    points = np.reshape(np.asarray(points, dtype=float), (-1, 3))
+    if points.shape[0] > NUFFT_MIN_POINTS:
+        return nufft_interpolate(points, coeffs, a, max_memory=max_memory)
+    mask = coeffs != 0.0
+    return fourier_interpolate(points, G[mask], coeffs[mask], max_memory, max_workers)
@@ -6,122 +6,251 @@ A collection of wrappers for the *matplotlib* functions.
 
 .. Note::
   All functions return a *matplotlib* figure object which can be modified by the user.
+  With set_interactive(False) the figures are created with the Agg backend and never
+  shown, so the functions can be used in batch runs without a display.
 """
 
 ################################################################################
 
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 import matplotlib.pyplot as plt
 from matplotlib import cm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from mpl_toolkits.mplot3d import axes3d
 from .eos_postqe import calculate_fitted_points
-from .bands import set_high_symmetry_points, compute_kx
-from .constants import pi
-
-
-def FFTinterp1D(charge, G, a, x0, e1, nx):
-
-        # normalize e1
-        m1 = np.linalg.norm(e1)
-        if abs(m1) < 1.0E-6:  # if the module is less than 1.0E-6
-            e1 = a[1]
-            m1 = np.linalg.norm(e1)
-        e1 = e1 / m1
-
-        # Computes the FFT of the charge
-        fft_charge = np.fft.fftn(charge)
-        nr = charge.shape
-
-        # Steps along the e1 direction...
-        deltax = m1 / (nx - 1)
-        X = np.zeros(nx)
-        Y = np.zeros(nx, dtype=complex)
-
-        for i in range(0, nx):
-            xi = x0[0] + i * deltax * e1[0]
-            yi = x0[1] + i * deltax * e1[1]
-            zi = x0[2] + i * deltax * e1[2]
-
-            # For each point, evaluate the charge by Fourier interpolation
-            for x in range(0, nr[0]):
-                for y in range(0, nr[1]):
-                    for z in range(0, nr[2]):
-                        arg = 2.0 * pi * (xi * G[x, y, z, 0] + yi * G[x, y, z, 1] + zi * G[x, y, z, 2])
-                        Y[i] += fft_charge[x, y, z] * complex(np.cos(arg), np.sin(arg))
-
-            X[i] = i * deltax
-            Y[i] = Y[i] / (nr[0] * nr[1] * nr[2])
-            print(X[i], Y[i].real)
-
-        return X, Y
-
-
-
-def FFTinterp2D(charge, G, a, x0, e1, e2, nx, ny):
-    # normalize e1
-    m1 = np.linalg.norm(e1)
-    if (abs(m1) < 1.0E-6):  # if the module is less than 1.0E-6
-        e1 = a[1]
-        m1 = np.linalg.norm(e1)
-    e1 = e1 / m1
-
-    # normalize e2
-    m2 = np.linalg.norm(e2)
-    if abs(m2) < 1.0E-6:  # if the module is less than 1.0E-6
-        e2 = a[2]
-        m2 = np.linalg.norm(e2)
-    e2 = e2 / m2
-
-    # Computes the FFT of the charge
-    fft_charge = np.fft.fftn(charge)
-    nr = charge.shape
-
-    # Steps along the e1 and e2 directions...
-    deltax = m1 / (nx - 1)
-    deltay = m2 / (ny - 1)
-
-    temp = np.zeros((nx, ny), dtype=complex)
-    X = np.zeros((nx, ny))
-    Y = np.zeros((nx, ny))
-    Z = np.zeros((nx, ny))
-
-    for i in range(0, nx):
-        for j in range(0, ny):
-            X[i, j] = i * deltax
-            Y[i, j] = j * deltay
-
-    # loop(s) over the G points
-    for x in range(0, nr[0]):
-        for y in range(0, nr[1]):
-            for z in range(0, nr[2]):
-
-                # eigx=exp(iG*e1+iGx0), eigy=(iG*e2)
-                # compute these factors to save CPU time
-                eigx = np.zeros(nx, dtype=complex)
-                for i in range(0, nx):
-                    eigx[i] = np.exp(2.0 * pi * complex(0.0, 1.0) * (i * deltax *
-                                                                        (e1[0] * G[x, y, z, 0] + e1[1] * G[x, y, z, 1] +
-                                                                         e1[2] * G[x, y, z, 2]) +
-                                                                        (x0[0] * G[x, y, z, 0] + x0[1] * G[x, y, z, 1] +
-                                                                         x0[2] * G[x, y, z, 2])))
-
-                eigy = np.zeros(ny, dtype=complex)
-                for j in range(0, ny):
-                    eigy[j] = np.exp(2.0 * pi * complex(0.0, 1.0) * (j * deltax *
-                                                                        (e2[0] * G[x, y, z, 0] + e2[1] * G[x, y, z, 1] +
-                                                                         e2[2] * G[x, y, z, 2])))
-
-                for i in range(0, nx):
-                    for j in range(0, ny):
-                        temp[i, j] += fft_charge[x, y, z] * eigx[i] * eigy[j]
-
-    Z = temp.real / (nr[0] * nr[1] * nr[2])
+from .bands import set_high_symmetry_points, compute_kx, get_high_symmetry_labels
+from .fourier import MAX_MEMORY, NUFFT_MIN_POINTS, finufft, get_grid_coefficients, fourier_interpolate_2d, interpolate, \
+    nufft_interpolate, get_lattice_direction, fourier_line, fourier_plane
+
+
+# If False the figures are rendered with the Agg backend and never shown
+interactive = True
+
+
+def set_interactive(flag=True):
+    """
+    Sets the interactive mode of the plot functions. In non-interactive mode the figures
+    are not managed by pyplot (no window is opened and plt.show() is never called) and
+    they can only be saved to files.
+    """
+    global interactive
+    interactive = bool(flag)
+
+
+def new_figure():
+    """Creates a new figure, managed by pyplot only in interactive mode."""
+    if interactive:
+        return plt.figure()
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def show_figure(fig, fig_file=''):
+    """Saves the figure into *fig_file* if given and shows it in interactive mode."""
+    if fig_file != '':
+        fig.savefig(fig_file)
+    if interactive:
+        plt.show()
+
+
+def _get_axis(v, default, n):
+    """
+    Normalizes the direction v of a section (default is used if v is null).
+
+    :return: the unit vector, the length of v and the coordinates of n points along it
+    """
+    m = np.linalg.norm(v)
+    if abs(m) < 1.0E-6:  # if the module is less than 1.0E-6
+        v = default
+        m = np.linalg.norm(v)
+    return np.asarray(v) / m, m, np.arange(n) * m / (n - 1)
+
+
+def FFTinterp1D(charge, G, a, x0, e1, nx, gcutm=None, coeffs=None):
+    """
+    Computes the charge (or else) along the line from x0 along e1 by Fourier interpolation.
+    If e1 is a lattice vector the line is computed with a zero-padded FFT, otherwise
+    all points are evaluated together by the vectorized engine in the fourier module (with
+    a non-uniform FFT for more than NUFFT_MIN_POINTS points). Only the G vectors with
+    G^2 <= gcutm are used if *gcutm* is given. The Fourier coefficients of the charge
+    can be given in *coeffs* (see fourier.get_grid_coefficients), then *charge* is not used.
+
+    :return: X (the coordinate along the line) and Y (the complex values of the charge)
+    """
+    if coeffs is None:
+        coeffs = get_grid_coefficients(charge, G, gcutm)
+
+    e1, m1, X = _get_axis(e1, a[1], nx)
+    points = np.asarray(x0, dtype=float) + np.outer(X, e1)
+
+    # a line along a lattice vector is computed exactly with a zero-padded FFT
+    n1 = get_lattice_direction(m1 * e1, a)
+    if n1 is not None:
+        Y = fourier_line(coeffs, G, x0, n1, nx)
+    else:
+        Y = interpolate(points, coeffs, G, a)
+
+    return X, Y
+
+
+def FFTinterp2D(charge, G, a, x0, e1, e2, nx, ny, gcutm=None, coeffs=None):
+    """
+    Computes the charge (or else) on the plane from x0 along e1 and e2 by Fourier
+    interpolation. If e1 and e2 are lattice vectors the plane is computed with a
+    zero-padded FFT, otherwise as a product of phase matrices (see fourier_interpolate_2d) or,
+    if finufft is installed, with a non-uniform FFT for more than NUFFT_MIN_POINTS points (the
+    NumPy gridding is slower than the product of phase matrices). Only the G vectors with
+    G^2 <= gcutm are used if *gcutm* is given. The Fourier coefficients of the charge
+    can be given in *coeffs* (see fourier.get_grid_coefficients), then *charge* is not used.
+
+    :return: X, Y (the coordinates along e1 and e2) and Z (the charge), all nx x ny arrays
+    """
+    if coeffs is None:
+        coeffs = get_grid_coefficients(charge, G, gcutm)
+
+    e1, m1, x = _get_axis(e1, a[1], nx)
+    e2, m2, y = _get_axis(e2, a[2], ny)
+    X, Y = np.meshgrid(x, y, indexing='ij')
+
+    # a plane along two lattice vectors is computed exactly with a zero-padded FFT
+    n1 = get_lattice_direction(m1 * e1, a)
+    n2 = get_lattice_direction(m2 * e2, a)
+    if n1 is not None and n2 is not None and np.any(np.cross(n1, n2)):
+        Z = fourier_plane(coeffs, G, x0, n1, n2, (nx, ny)).real
+    elif nx * ny > NUFFT_MIN_POINTS and finufft is not None:
+        points = np.asarray(x0, dtype=float) + X[..., None] * e1 + Y[..., None] * e2
+        Z = nufft_interpolate(points, coeffs, a).real.reshape(nx, ny)
+    else:
+        mask = coeffs != 0.0
+        Z = fourier_interpolate_2d(np.asarray(x0, dtype=float), e1, e2, X[:, 0], Y[0, :], G[mask], coeffs[mask]).real
 
     return X, Y, Z
 
 
-def plot1D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), nx=20, ylab='charge', plot_file=''):
+def compute_sections(charge, G, a, sections, gcutm=None, coeffs=None, max_memory=MAX_MEMORY):
+    """
+    Computes many 1D and 2D sections of the charge (or else) sharing the same Fourier
+    coefficients. The sections along lattice vectors are computed with zero-padded FFTs,
+    the points of all the other lines are evaluated together in one chunked pass and the
+    other planes as products of phase matrices.
+
+    :param charge: eletronic charge density (or other quantity), not used if coeffs is given
+    :param G: G vectors in the reciprocal space
+    :param a: basis vectors of the unit cell (alat units)
+    :param sections: a list of dictionaries with the arguments of each section: dim (1 or 2), \
+    x0, e1, e2, nx and ny (as for FFTinterp1D and FFTinterp2D)
+    :param gcutm: if given, only the G vectors with G^2 <= gcutm (in (2pi/alat)^2 units) are used
+    :param coeffs: the Fourier coefficients of the charge, if already computed (see FFTinterp1D)
+    :param max_memory: the memory ceiling (in bytes) for the matrix of the phases
+    :return: the list of the arrays of each section, (X, Y) for a line and (X, Y, Z) for a \
+    plane, with the values (Y or Z) real
+    """
+    if coeffs is None:
+        coeffs = get_grid_coefficients(charge, G, gcutm)
+    mask = coeffs != 0.0
+
+    results = []
+    pending = []  # the lines to be computed together
+    for k, section in enumerate(sections):
+        x0 = np.asarray(section.get('x0', (0, 0, 0)), dtype=float)
+        e1, m1, x = _get_axis(section.get('e1', (1, 0, 0)), a[1], section.get('nx', 20))
+        n1 = get_lattice_direction(m1 * e1, a)
+        if section.get('dim', 1) == 1:
+            if n1 is not None:
+                results.append((x, fourier_line(coeffs, G, x0, n1, x.size).real))
+            else:
+                results.append((x, None))
+                pending.append((k, x0 + np.outer(x, e1)))
+            continue
+
+        e2, m2, y = _get_axis(section.get('e2', (1, 0, 0)), a[2], section.get('ny', 20))
+        n2 = get_lattice_direction(m2 * e2, a)
+        X, Y = np.meshgrid(x, y, indexing='ij')
+        if n1 is not None and n2 is not None and np.any(np.cross(n1, n2)):
+            Z = fourier_plane(coeffs, G, x0, n1, n2, (x.size, y.size))
+        else:
+            Z = fourier_interpolate_2d(x0, e1, e2, x, y, G[mask], coeffs[mask], max_memory)
+        results.append((X, Y, Z.real))
+
+    if pending:
+        values = interpolate(np.concatenate([points for k, points in pending]), coeffs, G, a, max_memory).real
+        start = 0
+        for k, points in pending:
+            results[k] = results[k][0], values[start:start + len(points)]
+            start += len(points)
+    return results
+
+
+def write_sections(filename, results):
+    """
+    Writes the arrays computed by compute_sections() into a single binary file, a NumPy
+    .npz archive or a HDF5 file (for the extensions .h5 and .hdf5). The arrays of the k-th
+    section are named sectionk/X, sectionk/Y and, for a plane, sectionk/Z.
+    """
+    arrays = {}
+    for k, section in enumerate(results):
+        for name, data in zip('XYZ', section):
+            arrays['section%d/%s' % (k, name)] = data
+
+    if filename.lower().endswith(('.h5', '.hdf5')):
+        import h5py
+        with h5py.File(filename, 'w') as h5f:
+            for name, data in arrays.items():
+                h5f.create_dataset(name, data=data)
+    else:
+        np.savez(filename, **arrays)
+
+
+def write_section(filename, *arrays):
+    """
+    Writes the coordinates and the values of a 1D (X, Y) or 2D (X, Y, Z) section into a text
+    file, one point for each line, with a single bulk write.
+    """
+    header = (16 * ' ').join('XYZ'[:len(arrays)])
+    data = np.column_stack([np.ravel(x) for x in arrays])
+    np.savetxt(filename, data, fmt='%.9E', delimiter='  ', header=header, comments='')
+
+
+def draw_section_1D(X, Y, x0, e1, ylab='charge'):
+    """Draws the values Y of a 1D section from x0 along e1 and returns the figure."""
+    fig = new_figure()
+    ax = fig.add_subplot(1, 1, 1)
+    xlab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
+    xlab += "x*("+str(e1[0])+","+str(e1[1])+","+str(e1[2])+")"
+    ax.set_xlabel(xlab)
+    ax.set_ylabel(ylab)
+    ax.plot(X, Y, 'r')
+    return fig
+
+
+def draw_section_2D(X, Y, Z, x0, e1, e2, zlab='charge'):
+    """Draws the values Z of a 2D section from x0 along e1 and e2 and returns the figure."""
+    fig = new_figure()
+    ax = fig.add_subplot(1, 1, 1, projection='3d')
+    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, alpha=0.3)
+    cset = ax.contour(X, Y, Z, zdir='z', offset=Z.min(), cmap=cm.coolwarm)
+    cset = ax.contour(X, Y, Z, zdir='x', offset=X.min(), cmap=cm.coolwarm)
+    cset = ax.contour(X, Y, Z, zdir='y', offset=Y.max(), cmap=cm.coolwarm)
+
+    xlab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
+    xlab += "x*("+str(e1[0])+","+str(e1[1])+","+str(e1[2])+")"
+    ylab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
+    ylab += "y*("+str(e2[0])+","+str(e2[1])+","+str(e2[2])+")"
+    ax.set_xlabel(xlab)
+    ax.set_xlim(X.min(), X.max())
+    ax.set_ylabel(ylab)
+    ax.set_ylim(Y.min(), Y.max())
+    ax.set_zlabel(zlab)
+    ax.set_zlim(Z.min(), Z.max())
+    return fig
+
+
+def plot1D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), nx=20, ylab='charge', plot_file='', gcutm=None,
+                     fig_file='', coeffs=None):
     """
     This function calculates a 1D plot of the input charge (or else), starting from the
     input point x0 and along the direction given by the vector e1. The G vectors
@@ -136,33 +265,25 @@ def plot1D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), nx=20, ylab='char
     :param nx: number of points in the line
     :param ylab: y axix label in the plot ('charge', 'Vtot', etc.)
     :param plot_file: if plot_file!='', write the plotting values on a text file
+    :param gcutm: if given, only the G vectors with G^2 <= gcutm (in (2pi/alat)^2 units) are used
+    :param fig_file: if fig_file!='', save the figure into this file (the format is given by the extension)
+    :param coeffs: the Fourier coefficients of the charge, if already computed (see FFTinterp1D)
     :return: the matplotlib figure object
     """
 
-    try:
-        from cythonfn import FFTinterp1D_Cython
-        X, Y = FFTinterp1D_Cython(charge, G, a, x0, e1, nx)
-    except ImportError:
-        X, Y = FFTinterp1D(charge, G, a, x0, e1, nx)
+    X, Y = FFTinterp1D(charge, G, a, x0, e1, nx, gcutm, coeffs)
 
     if plot_file != '':
-        f = open(plot_file, 'w')
-        f.write('X' + 16 * ' ' + 'Y\n')
-        for i in range(0, nx):
-            f.write("{:.9E}  ".format(X[i]) + "{:.9E}\n".format(Y[i].real))
+        write_section(plot_file, X, np.real(Y))
 
-    xlab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
-    xlab += "x*("+str(e1[0])+","+str(e1[1])+","+str(e1[2])+")"
-    fig = plt.figure()
-    plt.xlabel(xlab)
-    plt.ylabel(ylab)
-    plt.plot(X, np.real(Y), 'r')
-    plt.show()
+    fig = draw_section_1D(X, np.real(Y), x0, e1, ylab)
+    show_figure(fig, fig_file)
 
     return fig
-    
-    
-def plot2D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), e2=(1, 0, 0), nx=20, ny=20, zlab='charge', plot_file=''):
+
+
+def plot2D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), e2=(1, 0, 0), nx=20, ny=20, zlab='charge', plot_file='',
+                     gcutm=None, fig_file='', coeffs=None):
     """
     This function calculates a 2D plot of the input charge (or else), starting from the
     input point x0 and along the directions given by the vectors e1, e2. These
@@ -177,47 +298,120 @@ def plot2D_FFTinterp(charge, G, a, x0=(0, 0, 0), e1=(1, 0, 0), e2=(1, 0, 0), nx=
     :param e1, e2: 3D vectors which determines the plotting plane
     :param nx, ny: number of points along e1, e2 respectively
     :param zlab: y axix label in the plot
+    :param plot_file: if plot_file!='', write the plotting values on a text file
+    :param gcutm: if given, only the G vectors with G^2 <= gcutm (in (2pi/alat)^2 units) are used
+    :param fig_file: if fig_file!='', save the figure into this file (the format is given by the extension)
+    :param coeffs: the Fourier coefficients of the charge, if already computed (see FFTinterp2D)
     :return: the matplotlib figure object
     """
 
-    try:
-        from cythonfn import FFTinterp2D_Cython
-        X, Y, Z = FFTinterp2D_Cython(charge, G, a, x0, e1, e2, nx, ny)
-    except ImportError:
-        X, Y, Z = FFTinterp2D(charge, G, a, x0, e1, e2, nx, ny)
-
+    X, Y, Z = FFTinterp2D(charge, G, a, x0, e1, e2, nx, ny, gcutm, coeffs)
 
     if plot_file != '':
-        f = open(plot_file,'w')
-        f.write('X'+16*' '+'Y'+16*' '+'Z\n')
-
-    # loop again over nx,ny to normalize, print on screen and write on file
-    for i in range(0,nx):
-        for j in range(0,ny): 
-            print (X[i,j], Y[i,j], Z[i,j])
-            try:
-                f.write("{:.9E}  ".format(X[i, j]) + "{:.9E}  ".format(Y[i, j]) + "{:.9E}\n".format(Z[i, j]))
-            except:
-                pass
-
-    fig = plt.figure()
-    ax = fig.gca(projection='3d')
-    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, alpha=0.3)
-    cset = ax.contour(X, Y, Z, zdir='z', offset=Z.min(), cmap=cm.coolwarm)
-    cset = ax.contour(X, Y, Z, zdir='x', offset=X.min(), cmap=cm.coolwarm)
-    cset = ax.contour(X, Y, Z, zdir='y', offset=Y.max(), cmap=cm.coolwarm)
+        write_section(plot_file, X, Y, Z)
 
-    xlab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
-    xlab += "x*("+str(e1[0])+","+str(e1[1])+","+str(e1[2])+")"
-    ylab = "("+str(x0[0])+","+str(x0[1])+","+str(x0[2])+") + "
-    ylab += "y*("+str(e2[0])+","+str(e2[1])+","+str(e2[2])+")"
-    ax.set_xlabel(xlab)
-    ax.set_xlim(X.min(), X.max())
+    fig = draw_section_2D(X, Y, Z, x0, e1, e2, zlab)
+    show_figure(fig, fig_file)
+
+    return fig
+
+
+# Fourier coefficients, G vectors and lattice vectors used by the worker processes of render_sections()
+_worker_data = None
+
+
+def _init_worker(charge, G, a, gcutm):
+    global _worker_data
+    set_interactive(False)
+    _worker_data = get_grid_coefficients(charge, G, gcutm), G, a
+
+
+def _render_section(section):
+    coeffs, G, a = _worker_data
+    x0, e1 = section.get('x0', (0, 0, 0)), section.get('e1', (1, 0, 0))
+    if section.get('dim', 1) == 1:
+        X, Y = FFTinterp1D(None, G, a, x0, e1, section.get('nx', 20), coeffs=coeffs)
+        arrays = X, np.real(Y)
+        fig = draw_section_1D(X, np.real(Y), x0, e1, section.get('label', 'charge'))
+    else:
+        e2 = section.get('e2', (1, 0, 0))
+        X, Y, Z = arrays = FFTinterp2D(None, G, a, x0, e1, e2, section.get('nx', 20), section.get('ny', 20),
+                                       coeffs=coeffs)
+        fig = draw_section_2D(X, Y, Z, x0, e1, e2, section.get('label', 'charge'))
+
+    if section.get('plot_file', ''):
+        write_section(section['plot_file'], *arrays)
+    if section.get('fig_file', ''):
+        fig.savefig(section['fig_file'])
+    return arrays
+
+
+def render_sections(charge, G, a, sections, gcutm=None, max_workers=None):
+    """
+    Computes and renders many 1D or 2D sections of the charge (or else) with a pool of
+    worker processes, in non-interactive mode (Agg backend). The charge is sent once to
+    each worker.
+
+    :param charge: eletronic charge density (or other quantity) to be plotted
+    :param G: G vectors in the reciprocal space
+    :param a: basis vectors of the unit cell (alat units)
+    :param sections: a list of dictionaries with the arguments of each section: dim (1 or 2), \
+    x0, e1, e2, nx, ny, label, plot_file and fig_file (the file where the figure is saved)
+    :param gcutm: if given, only the G vectors with G^2 <= gcutm (in (2pi/alat)^2 units) are used
+    :param max_workers: the number of worker processes (default is the number of CPUs)
+    :return: the list of the computed arrays, (X, Y) or (X, Y, Z) for each section
+    """
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(charge, G, a, gcutm)) as executor:
+        return list(executor.map(_render_section, sections))
+
+
+def plot_spherical_average(r, averages, ylab='charge', labels=None, fig_file=''):
+    """
+    This function plots the spherical average(s) of the charge (or else) as a function of
+    the radius.
+
+    :param r: the radii
+    :param averages: the averages, a 1D array or a 2D array with one profile for each row
+    :param ylab: y axis label in the plot
+    :param labels: the labels of the profiles (eg. the atomic symbols)
+    :param fig_file: if fig_file!='', save the figure into this file
+    :return: the matplotlib figure object
+    """
+    averages = np.atleast_2d(averages)
+    fig = new_figure()
+    ax = fig.add_subplot(1, 1, 1)
+    for i, profile in enumerate(averages):
+        ax.plot(r, profile, label=labels[i] if labels is not None else None)
+    if labels is not None:
+        ax.legend()
+    ax.set_xlabel('r (alat)')
     ax.set_ylabel(ylab)
-    ax.set_ylim(Y.min(), Y.max())
-    ax.set_zlabel(zlab)
-    ax.set_zlim(Z.min(), Z.max())
-    plt.show()
+    show_figure(fig, fig_file)
+
+    return fig
+
+
+def plot_polar_sphere(theta, phi, values, zlab='charge', fig_file=''):
+    """
+    This function plots the charge (or else) on a sphere as a color map of the polar
+    and azimuthal angles. The points on the sphere don't need to be on a regular grid.
+
+    :param theta: the polar angles of the points (radians)
+    :param phi: the azimuthal angles of the points (radians)
+    :param values: the values at the points
+    :param zlab: label of the color bar
+    :param fig_file: if fig_file!='', save the figure into this file
+    :return: the matplotlib figure object
+    """
+    fig = new_figure()
+    ax = fig.add_subplot(1, 1, 1)
+    cset = ax.tricontourf(np.degrees(phi), np.degrees(theta), values, 50, cmap=cm.coolwarm)
+    fig.colorbar(cset, ax=ax, label=zlab)
+    ax.set_xlabel('phi (degrees)')
+    ax.set_ylabel('theta (degrees)')
+    ax.set_xlim(0.0, 360.0)
+    ax.set_ylim(180.0, 0.0)
+    show_figure(fig, fig_file)
 
     return fig
 
@@ -226,12 +420,12 @@ def simple_plot_xy(x, y, xlabel="", ylabel=""):
     """
     This function generates a simple x:y plot with matplotlib.
     """
-    fig = plt.figure()
+    fig = new_figure()
     ax = fig.add_subplot(1, 1, 1)  # create an axes object in the figure
     ax.plot(x, y, 'r')
     ax.set_xlabel(xlabel)
     ax.set_ylabel(ylabel)
-    plt.show()
+    show_figure(fig)
 
     return fig
 
@@ -249,7 +443,7 @@ def multiple_plot_xy(x, y, xlabel="", ylabel="", labels=""):
 
     colors = ['k', 'r', 'b', 'g', 'c', 'm', 'y']
 
-    fig = plt.figure()
+    fig = new_figure()
     ax = fig.add_subplot(1, 1, 1)  # create an axes object in the figure
     if (labels == ""):
         try:  # try if there are multiple data on x axis
@@ -270,7 +464,7 @@ def multiple_plot_xy(x, y, xlabel="", ylabel="", labels=""):
     ax.set_xlabel(xlabel)
     ax.set_ylabel(ylabel)
 
-    plt.show()
+    show_figure(fig)
 
     return fig
 
@@ -281,7 +475,7 @@ def plot_EV(V, E, a=(0., 0., 0., 0.), labely="Etot"):
     the fitted results
     """
 
-    fig = plt.figure()
+    fig = new_figure()
     ax = fig.add_subplot(1, 1, 1)  # create an axes object in the figure
 
     ax.plot(V, E, 'o', label=labely + " data", markersize=10)
@@ -291,13 +485,16 @@ def plot_EV(V, E, a=(0., 0., 0., 0.), labely="Etot"):
     ax.legend()
     ax.set_xlabel('V (a.u.^3)')
     ax.set_ylabel('E (Ry)')
-    plt.show()
+    show_figure(fig)
 
     return fig
 
 
-def plot_bands(kpoints, bands, fileplot='fileplot', e_min='', e_max=''):
-    """"""
+def plot_bands(kpoints, bands, fileplot='fileplot', e_min='', e_max='', b=None):
+    """
+    Plots the bands along the k-points path. If the reciprocal lattice vectors *b* are
+    given, the high symmetry points are labelled.
+    """
 
     # if not set in input, determine e_min and e_max
     if e_min=='':
@@ -307,33 +504,36 @@ def plot_bands(kpoints, bands, fileplot='fileplot', e_min='', e_max=''):
 
     high_sym = set_high_symmetry_points(kpoints)
     kx = compute_kx(kpoints)
+    if b is not None:
+        labels = get_high_symmetry_labels(kpoints, b)
+    else:
+        labels = np.full(len(kpoints), '')
 
     nks = bands.shape[0]
     nbnd = bands.shape[1]
 
-    fout = open(fileplot, "w")
-    for i in range(0,nks):
-        if high_sym[i]:
-            fout.write("# high-symmetry point: "+str(kpoints[i])+"   x coordinate   "+str(kx[i])+"\n")
-
-    bands_to_plot = np.zeros((nbnd,nks))
-    fout.write("#\n# kx           E (eV) \n")
-    for j in range(0,nbnd):
-        bands_to_plot[j, :] = bands[:, j]
-        for i in range(0,nks):
-            fout.write('   {:.3E}'.format(kx[i])+'   {:.3E}'.format(bands[i,j])+'\n')
-        fout.write('\n')
-
-    import matplotlib.pyplot as plt
-    fig = plt.figure()
+    with open(fileplot, "w") as fout:
+        for i in np.flatnonzero(high_sym):
+            fout.write("# high-symmetry point: "+str(kpoints[i])+"   x coordinate   "+str(kx[i])
+                       + ("   "+labels[i] if labels[i] else "")+"\n")
+
+        fout.write("#\n# kx           E (eV) \n")
+        for j in range(0,nbnd):
+            np.savetxt(fout, np.column_stack((kx, bands[:, j])), fmt='   %.3E', delimiter='')
+            fout.write('\n')
+
+    fig = new_figure()
     ax = fig.add_subplot(1, 1, 1)  # create an axes object in the figure
 
     for i in range(0,nbnd):
         ax.plot(kx, bands[:,i], 'x', label="band "+str(i+1), markersize=10)
         ax.plot(kx, bands[:,i], '')
     ax.legend()
+    if labels[high_sym].any():
+        ax.set_xticks(kx[high_sym])
+        ax.set_xticklabels(labels[high_sym])
     ax.set_xlabel('kx')
     ax.set_ylabel('E (eV)')
-    plt.show()
+    show_figure(fig)
 
     return fig
\ No newline at end of file
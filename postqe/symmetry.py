@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Unfolding of the k-points of the irreducible wedge of the Brillouin zone (IBZ) to the
+full Brillouin zone (BZ), with the crystal symmetries of the xml file.
+
+All the images of the IBZ k-points are computed at once, as crystal coordinates, and
+the images on a Monkhorst-Pack grid are identified by an integer index into the grid,
+so the equivalent k-points are found by array indexing. A rotation r transforms the
+crystal coordinates n of a vector of the direct lattice into np.dot(r, n) (see
+xmlfile.read_symmetries), so it transforms the crystal coordinates x of k into
+np.dot(x, inv(r)).
+"""
+import numpy as np
+
+
+def kpoint_keys(x, tol=1.0E-5):
+    """
+    Hashes the crystal coordinates of k-points into integer keys, on a grid of step *tol*.
+    The k-points that differ by a translation of the reciprocal lattice have the same key.
+
+    :param x: the crystal coordinates of the k-points (an array with the coordinates in the last axis)
+    :param tol: the tolerance on the crystal coordinates of the k-points
+    :return: an integer array with the shape of x without the last axis
+    """
+    m = int(round(1.0 / tol))
+    indices = np.rint(np.asarray(x, dtype=float) / tol).astype(np.int64) % m
+    return np.ravel_multi_index(np.moveaxis(indices, -1, 0), (m, m, m))
+
+
+def get_kpoint_images(x, rotations, time_reversal=True):
+    """
+    Computes the images of k-points by the symmetry operations.
+
+    :param x: the crystal coordinates of the k-points (a nks x 3 array)
+    :param rotations: the rotations of the crystal symmetries (a nsym x 3 x 3 array)
+    :param time_reversal: if True the images by time reversal (k -> -k) are added
+    :return: a nops x nks x 3 array, with nops = nsym or 2 * nsym
+    """
+    rotations = np.asarray(rotations, dtype=int).reshape(-1, 3, 3)
+    if time_reversal:
+        rotations = np.concatenate((rotations, -rotations))
+    inverses = np.rint(np.linalg.inv(rotations)).astype(int)
+    return np.einsum('kj,nji->nki', np.asarray(x, dtype=float).reshape(-1, 3), inverses)
+
+
+def get_grid_indices(x, nk, shift=(0, 0, 0), tol=1.0E-5):
+    """
+    Gets the integer index of k-points into a flattened (C order) Monkhorst-Pack grid.
+
+    :param x: the crystal coordinates of the k-points (an array with the coordinates in the last axis)
+    :param nk: the sizes of the grid
+    :param shift: the offsets of the grid (0 or 1 for each direction)
+    :param tol: the tolerance on the position of the k-points on the grid
+    :return: an integer array with the shape of x without the last axis, -1 for the \
+    k-points that are not on the grid
+    """
+    nk = np.asarray(nk, dtype=int)
+    x = np.asarray(x, dtype=float) * nk - np.asarray(shift) / 2.0
+    indices = np.rint(x).astype(int)
+    indices = np.ravel_multi_index(np.moveaxis(indices % nk, -1, 0), nk)
+    return np.where(np.all(np.abs(x - np.rint(x)) < tol, axis=-1), indices, -1)
+
+
+def get_bz_to_ibz_map(kpoints, b, rotations, nk, shift=(0, 0, 0), time_reversal=True):
+    """
+    Maps the k-points of a full Monkhorst-Pack grid to the equivalent k-points of
+    the irreducible wedge.
+
+    :param kpoints: the IBZ k-points (a nks x 3 array, in the same units of b)
+    :param b: the reciprocal lattice vectors
+    :param rotations: the rotations of the crystal symmetries (a nsym x 3 x 3 array)
+    :param nk: the sizes of the grid
+    :param shift: the offsets of the grid (0 or 1 for each direction)
+    :param time_reversal: if True the time reversal symmetry (k -> -k) is used
+    :return: two arrays of nk1*nk2*nk3 integers, with the index of the equivalent IBZ \
+    k-point and the index of the symmetry operation that transforms it into the grid \
+    point (the operations >= nsym are the ones combined with time reversal)
+    """
+    nk = np.asarray(nk, dtype=int)
+    x = np.dot(np.asarray(kpoints, dtype=float).reshape(-1, 3), np.linalg.inv(b))
+    if np.any(get_grid_indices(x, nk, shift) < 0):
+        raise ValueError("The k-points are not on the Monkhorst-Pack grid")
+
+    # The images out of the grid (for the symmetries that don't leave a shifted grid
+    # unchanged) are skipped, as in pw.x. The first operation that gives a grid point
+    # is kept, so the identity if it's the first rotation.
+    indices = get_grid_indices(get_kpoint_images(x, rotations, time_reversal), nk, shift)
+    nks = indices.shape[1]
+    order = np.flatnonzero(indices.ravel() >= 0)[::-1]
+    bz_to_ibz = np.full(nk.prod(), -1)
+    operations = np.full(nk.prod(), -1)
+    bz_to_ibz[indices.ravel()[order]] = order % nks
+    operations[indices.ravel()[order]] = order // nks
+    if np.any(bz_to_ibz < 0):
+        raise ValueError("The k-points and the symmetries don't cover the full Monkhorst-Pack grid")
+    return bz_to_ibz, operations
+
+
+def get_grid_kpoints(nk, shift=(0, 0, 0)):
+    """
+    Gets the crystal coordinates of the k-points of a full Monkhorst-Pack grid, in the
+    order of the flattened grid (C order), folded into [-0.5, 0.5).
+
+    :param nk: the sizes of the grid
+    :param shift: the offsets of the grid (0 or 1 for each direction)
+    :return: a nk1*nk2*nk3 x 3 array
+    """
+    nk = np.asarray(nk, dtype=int)
+    x = (np.indices(nk).reshape(3, -1).T + np.asarray(shift) / 2.0) / nk
+    return x - np.floor(x + 0.5)
+
+
+def unfold_kpoints(kpoints, b, rotations, time_reversal=True, tol=1.0E-5):
+    """
+    Unfolds a list of k-points that is not a Monkhorst-Pack grid, keeping the distinct
+    images (up to a translation of the reciprocal lattice) in order of first appearance.
+
+    :param kpoints: the IBZ k-points (a nks x 3 array, in the same units of b)
+    :param b: the reciprocal lattice vectors
+    :param rotations: the rotations of the crystal symmetries (a nsym x 3 x 3 array)
+    :param time_reversal: if True the time reversal symmetry (k -> -k) is used
+    :param tol: the tolerance on the crystal coordinates of the k-points
+    :return: the crystal coordinates of the unfolded k-points (folded into [-0.5, 0.5)) \
+    and the indices of the equivalent IBZ k-points
+    """
+    x = np.dot(np.asarray(kpoints, dtype=float).reshape(-1, 3), np.linalg.inv(b))
+    images = get_kpoint_images(x, rotations, time_reversal)
+    nops = len(images)
+
+    # Images are ordered by k-point and then by operation
+    images = np.swapaxes(images, 0, 1).reshape(-1, 3)
+    first = np.sort(np.unique(kpoint_keys(images, tol), return_index=True)[1])
+    images = images[first]
+    return images - np.floor(images + 0.5), first // nops
@@ -9,121 +9,197 @@
 #
 """
 XML data access classes for postqe.
+
+The XML file is parsed once, but its content is decoded with the schema only
+when a key is accessed for the first time. Only the subtree needed for the
+requested key is decoded and the result is memoized, so that accessing a few
+scalars (eg. *nr* or *alat*) doesn't require to decode all the band structure.
 """
-from collections import MutableMapping
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+import os
+from xml.etree import ElementTree
 import numpy as np
 import xmlschema
 
 
+XSI_SCHEMA_LOCATION = '{http://www.w3.org/2001/XMLSchema-instance}schemaLocation'
+
+
+def as_list(obj):
+    """Returns the argument wrapped into a list if it's not already a list."""
+    return obj if isinstance(obj, list) else [obj]
+
+
+def get_schema_location(root, base_dir=''):
+    """
+    Gets the location of the schema of an XML document from the xsi:schemaLocation
+    attribute of its root.
+
+    :param root: the root element of the XML document.
+    :param base_dir: the directory of the XML file, for relative locations.
+    :return: the path or the URL of the schema.
+    """
+    namespace = root.tag[1:].split('}')[0] if root.tag.startswith('{') else ''
+    items = root.get(XSI_SCHEMA_LOCATION, '').split()
+    for uri, location in zip(items[0::2], items[1::2]):
+        if uri == namespace:
+            if '://' in location or os.path.isabs(location):
+                return location
+            return os.path.join(base_dir, location)
+    raise ValueError("The XML root doesn't have a schema location for the namespace %r" % namespace)
+
+
 class XMLData(MutableMapping):
     """
-    Dictionary-like class for mapping data from an XML file.
+    Dictionary-like class for mapping data from an XML file. The keys are
+    the tags of the children of the XML root, and each of them is decoded
+    only at first access.
     """
     def __init__(self, xmlfile=None, schema=None):
+        self._data = {}
+        self._pending = {}
+        self._decoded = {}
+        self._root = None
+        self._schema = None
         if xmlfile is not None:
             self.read(xmlfile, schema)
-        else:
-            self._data = {}
 
     def __repr__(self):
         return '<%s %s at %#x>' % (self.__class__.__name__, str(self._data), id(self))
 
     def __getitem__(self, key):
-        return self._data[key]
+        try:
+            return self._data[key]
+        except KeyError:
+            if key not in self._pending:
+                raise
+        self._data[key] = value = self._resolve(key)
+        del self._pending[key]
+        return value
 
     def __setitem__(self, key, value):
         self._data[key] = value
+        self._pending.pop(key, None)
 
     def __delitem__(self, key):
-        del self._data[key]
+        if key in self._pending:
+            del self._pending[key]
+        else:
+            del self._data[key]
 
     def __iter__(self):
-        return iter(self._data)
+        for key in self._data:
+            yield key
+        for key in self._pending:
+            yield key
 
     def __len__(self):
-        return len(self._data)
+        return len(self._data) + len(self._pending)
 
     def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
         try:
-            return super(XMLData, self).__getattribute__(key)
-        except AttributeError:
-            if key not in self._data:
-                raise
-            return self._data[key]
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
 
     def __setattr__(self, key, value):
-        if key == '_data':
+        if key.startswith('_'):
             super(XMLData, self).__setattr__(key, value)
         else:
-            self._data[key] = value
+            self[key] = value
 
     def __delattr__(self, key):
-        if key == '_data':
+        if key.startswith('_'):
             super(XMLData, self).__delattr__(key)
         else:
-            del self._data[key]
+            del self[key]
 
     def read(self, xmlfile, schema=None):
-        self._data = xmlschema.to_dict(xmlfile, schema)
-
+        """
+        Parses the XML file and prepares the lazy keys. No decoding is done here.
+
+        :param xmlfile: name of the XML file to read from or a file descriptor.
+        :param schema: optional XML Schema (a file or an XMLSchema instance). For \
+        default the schema is found using the schemaLocation attribute of the XML root.
+        """
+        # The file is read once, also for finding the schema, so a stream can be used
+        self._root = ElementTree.parse(xmlfile).getroot()
+        if schema is None:
+            filename = getattr(xmlfile, 'name', xmlfile)
+            base_dir = os.path.dirname(filename) if isinstance(filename, str) else ''
+            schema = get_schema_location(self._root, base_dir)
+        if not hasattr(schema, 'to_dict'):
+            schema = xmlschema.XMLSchema(schema)
+
+        self._schema = schema
+        self._data = {}
+        self._decoded = {}
+        self._pending = dict.fromkeys(self._lazy_keys())
 
-class PWData(XMLData):
+    def decode(self, path):
+        """
+        Decodes the subtree selected by *path* (relative to the XML root). The result
+        is memoized, so each subtree is decoded at most once.
 
-    def read(self, xmlfile, schema=None):
-        self._data = {}
-        data = xmlschema.to_dict(xmlfile, schema)
+        :param path: an XPath expression, eg. 'output/basis_set/fft_grid'.
+        :return: the decoded data (a list if the path matches more elements).
+        """
         try:
-            self['pseudodir'] = data["input"]["control_variables"]["pseudo_dir"]
+            return self._decoded[path]
         except KeyError:
-            self['pseudodir'] = './'  # DB: ['./', os.path.dirname(filename)] ... alternatives?
-
-        self["prefix"] = data["input"]["control_variables"]["prefix"]
-        self["outdir"] = data["input"]["control_variables"]["outdir"]
-
-        dout = data["output"]
-        self["ecutwfc"] = dout["basis_set"]["ecutwfc"]
-        self["ecutrho"] = dout["basis_set"]["ecutrho"]
-        self["alat"] = dout["atomic_structure"]["@alat"]
-        self["ibrav"] = dout["atomic_structure"]["@bravais_index"]
-
-        self['a'] = np.array([
-            np.array(dout["atomic_structure"]["cell"]["a1"]),
-            np.array(dout["atomic_structure"]["cell"]["a2"]),
-            np.array(dout["atomic_structure"]["cell"]["a3"])
-        ])
-        self['b'] = np.array([
-            np.array(dout["basis_set"]["reciprocal_lattice"]["b1"]),
-            np.array(dout["basis_set"]["reciprocal_lattice"]["b2"]),
-            np.array(dout["basis_set"]["reciprocal_lattice"]["b3"])
-        ])
-        self["functional"] = np.array(dout["dft"]["functional"])
-
-        self["nat"] = (dout["atomic_structure"]["@nat"])
+            if self._root is None:
+                raise KeyError(path)
+        value = self._schema.to_dict(self._root, path=path)
+        self._decoded[path] = value
+        return value
 
-        # for subsequent loops it is important to have always lists for atomic_positions
-        # and atomic_species. If this is not, convert
-        a_p = dout["atomic_structure"]["atomic_positions"]["atom"]
-        if isinstance(a_p, list):
-            self["atomic_positions"] = a_p
-        else:
-            self["atomic_positions"] = [a_p]
+    def _lazy_keys(self):
+        return [child.tag for child in self._root]
 
-        a_s = dout["atomic_species"]["species"]
-        if isinstance(a_s, list):
-            self["atomic_species"] = a_s
-        else:
-            self["atomic_species"] = [a_s]
-
-        self["ntyp"] = dout["atomic_species"]["@ntyp"]
-        self["lsda"] = dout["magnetization"]["lsda"]
-        self["noncolin"] = dout["magnetization"]["noncolin"]
-        self['nr'] = np.array([
-            dout["basis_set"]["fft_grid"]["@nr1"],
-            dout["basis_set"]["fft_grid"]["@nr2"],
-            dout["basis_set"]["fft_grid"]["@nr3"]
-        ])
-        self['nr_smooth'] = np.array([
-            dout["basis_set"]["fft_smooth"]["@nr1"],
-            dout["basis_set"]["fft_smooth"]["@nr2"],
-            dout["basis_set"]["fft_smooth"]["@nr3"]
-        ])
+    def _resolve(self, key):
+        return self.decode(key)
+
+
+class PWData(XMLData):
+    """
+    Data of a pw.x XML output file. Each key is associated to the XPath of the
+    subtree to decode and to a function that extracts the value from it.
+    """
+    fields = {
+        'pseudodir': ('input/control_variables', lambda d: d.get('pseudo_dir', './')),
+        'prefix': ('input/control_variables', lambda d: d['prefix']),
+        'outdir': ('input/control_variables', lambda d: d['outdir']),
+        'ecutwfc': ('output/basis_set/ecutwfc', lambda d: d),
+        'ecutrho': ('output/basis_set/ecutrho', lambda d: d),
+        'alat': ('output/atomic_structure', lambda d: d['@alat']),
+        'ibrav': ('output/atomic_structure', lambda d: d['@bravais_index']),
+        'nat': ('output/atomic_structure', lambda d: d['@nat']),
+        'a': ('output/atomic_structure', lambda d: np.array([
+            np.array(d['cell']['a1']), np.array(d['cell']['a2']), np.array(d['cell']['a3'])
+        ])),
+        # for subsequent loops it is important to have always lists for atomic_positions
+        # and atomic_species.
+        'atomic_positions': ('output/atomic_structure', lambda d: as_list(d['atomic_positions']['atom'])),
+        'b': ('output/basis_set/reciprocal_lattice', lambda d: np.array([
+            np.array(d['b1']), np.array(d['b2']), np.array(d['b3'])
+        ])),
+        'functional': ('output/dft', lambda d: np.array(d['functional'])),
+        'atomic_species': ('output/atomic_species', lambda d: as_list(d['species'])),
+        'ntyp': ('output/atomic_species', lambda d: d['@ntyp']),
+        'lsda': ('output/magnetization', lambda d: d['lsda']),
+        'noncolin': ('output/magnetization', lambda d: d['noncolin']),
+        'nr': ('output/basis_set/fft_grid', lambda d: np.array([d['@nr1'], d['@nr2'], d['@nr3']])),
+        'nr_smooth': ('output/basis_set/fft_smooth', lambda d: np.array([d['@nr1'], d['@nr2'], d['@nr3']])),
+    }
+
+    def _lazy_keys(self):
+        return list(self.fields)
+
+    def _resolve(self, key):
+        path, getter = self.fields[key]
+        return getter(self.decode(path))
@@ -7,6 +7,7 @@ A set of utility functions to extract data from the xml file produced by QE.
 
 import numpy as np
 import xmlschema
+from xml.etree import ElementTree
 
 
 def get_dict(xmlfile):
@@ -105,3 +106,240 @@ def get_calculation_data(xmlfile):
 
 
     return prefix, outdir, ecutwfc, ecutrho, functional, lsda, noncolin, pseudodir, nr, nr_smooth
+
+
+################################################################################
+# Streaming reader for large xml files (relaxations, MD, nscf with many k-points)
+################################################################################
+
+# Paths of the elements that are discarded as soon as they have been processed
+STREAMED_PATHS = ('step', 'output/band_structure/ks_energies')
+
+
+def iterparse_xml(xmlfile):
+    """
+    Walks an xml output file with iterparse, yielding a couple (path, elem) at the end
+    of each element. The path is relative to the root (eg. 'output/band_structure/nks').
+    The children of the root and the elements in STREAMED_PATHS are removed from the
+    tree after they have been yielded, so the memory used doesn't grow with the size
+    of the file. No validation is done.
+
+    :param xmlfile: the xml file or a file descriptor
+    """
+    elements = []
+    tags = []
+    for event, elem in ElementTree.iterparse(xmlfile, events=('start', 'end')):
+        if event == 'start':
+            elements.append(elem)
+            tags.append(elem.tag)
+            continue
+
+        path = '/'.join(tags[1:])
+        elements.pop()
+        tags.pop()
+        yield path, elem
+
+        if len(elements) == 1 or path in STREAMED_PATHS:
+            elements[-1].remove(elem)
+
+
+def get_values(elem, dtype=float):
+    """Returns the numeric content of an element as a numpy array."""
+    return np.array(elem.text.split(), dtype=dtype)
+
+
+def get_structure(elem):
+    """
+    Gets the data of an atomic_structure element.
+
+    :return: a dictionary with alat, nat, cell (3x3 array), symbols and positions (nat x 3 array)
+    """
+    atoms = elem.findall('atomic_positions/atom')
+    return {
+        'alat': float(elem.get('alat')),
+        'nat': int(elem.get('nat')),
+        'cell': np.array([get_values(elem.find('cell/a%d' % k)) for k in (1, 2, 3)]),
+        'symbols': [atom.get('name') for atom in atoms],
+        'positions': np.array(' '.join(atom.text for atom in atoms).split(), dtype=float).reshape(-1, 3)
+    }
+
+
+def get_step(elem):
+    """
+    Gets the data of a step element (structure, energy and forces) of a relaxation or MD run.
+    """
+    step = get_structure(elem.find('atomic_structure'))
+    step['n_step'] = int(elem.get('n_step', 0))
+    step['etot'] = float(elem.find('total_energy/etot').text)
+    step['forces'] = get_values(elem.find('forces')).reshape(-1, 3)
+    stress = elem.find('stress')
+    step['stress'] = get_values(stress).reshape(3, 3) if stress is not None else None
+    return step
+
+
+def iter_steps(xmlfile):
+    """
+    Iterates over the steps of a relaxation or MD xml output file without loading the
+    whole file in memory. Values are in atomic units, as in the xml file.
+
+    :param xmlfile: the xml file or a file descriptor
+    :return: yields a dictionary for each step, with keys 'n_step', 'alat', 'nat', 'cell', \
+    'symbols', 'positions', 'etot', 'forces' and 'stress'
+    """
+    for path, elem in iterparse_xml(xmlfile):
+        if path == 'step':
+            yield get_step(elem)
+
+
+def read_band_structure(xmlfile):
+    """
+    Reads the band structure from an xml output file. The arrays are allocated when
+    nks is read and filled one k-point at a time, so the memory used is the one of the
+    arrays only. Energies are in Hartree, as in the xml file.
+
+    :param xmlfile: the xml file or a file descriptor
+    :return: a dictionary with the scalars of band_structure element (nbnd, nks, lsda, \
+    nelec, fermi_energy, ...), the arrays kpoints (nks x 3, 2pi/alat units), weights (nks), \
+    eigenvalues and occupations (nks x nbnd), the reciprocal lattice b (2pi/alat units), \
+    the Bravais lattice index ibrav and, \
+    for a Monkhorst-Pack grid, its sizes mp_grid and offsets mp_shift
+    """
+    bands = {}
+    ik = 0
+    for path, elem in iterparse_xml(xmlfile):
+        if path == 'output/basis_set/reciprocal_lattice':
+            bands['b'] = np.array([get_values(elem.find('b%d' % k)) for k in (1, 2, 3)])
+        elif path == 'output/atomic_structure':
+            bands['ibrav'] = int(elem.get('bravais_index', 0))
+        elif not path.startswith('output/band_structure'):
+            continue
+        elif path == 'output/band_structure/nks':
+            nks, nbnd = int(elem.text), bands['nbnd']
+            bands['kpoints'] = np.zeros((nks, 3))
+            bands['weights'] = np.zeros(nks)
+            bands['eigenvalues'] = np.zeros((nks, nbnd))
+            bands['occupations'] = np.zeros((nks, nbnd))
+        elif path == 'output/band_structure/nbnd':
+            bands['nbnd'] = int(elem.text)
+        elif path == 'output/band_structure/ks_energies':
+            k_point = elem.find('k_point')
+            bands['kpoints'][ik] = get_values(k_point)
+            bands['weights'][ik] = float(k_point.get('weight'))
+            bands['eigenvalues'][ik] = get_values(elem.find('eigenvalues'))
+            bands['occupations'][ik] = get_values(elem.find('occupations'))
+            ik += 1
+        elif path == 'output/band_structure':
+            for child in elem:
+                if child.tag in ('lsda', 'noncolin', 'spinorbit', 'wf_collected'):
+                    bands[child.tag] = child.text.strip() == 'true'
+                elif child.tag in ('nbnd', 'nbnd_up', 'nbnd_dw', 'nks', 'num_of_atomic_wfc'):
+                    bands[child.tag] = int(child.text)
+                elif child.tag in ('nelec', 'fermi_energy', 'highestOccupiedLevel'):
+                    bands[child.tag] = float(child.text)
+                elif child.tag == 'two_fermi_energies':
+                    bands[child.tag] = get_values(child)
+                elif child.tag == 'occupations_kind':
+                    bands[child.tag] = child.text.strip()
+                elif child.tag == 'starting_k_points' and child.find('monkhorst_pack') is not None:
+                    mp = child.find('monkhorst_pack')
+                    bands['mp_grid'] = np.array([int(mp.get('nk%d' % k)) for k in (1, 2, 3)])
+                    bands['mp_shift'] = np.array([int(mp.get('k%d' % k)) for k in (1, 2, 3)])
+                elif child.tag == 'smearing':
+                    bands['smearing'] = child.text.strip()
+                    bands['degauss'] = float(child.get('degauss'))
+            break
+
+    return bands
+
+
+def read_symmetries(xmlfile):
+    """
+    Reads the rotations of the crystal symmetries from an xml output file. A rotation
+    transforms the crystal coordinates n of a vector of the direct lattice into np.dot(r, n).
+
+    :param xmlfile: the xml file or a file descriptor
+    :return: an integer array nsym x 3 x 3
+    """
+    rotations = []
+    for path, elem in iterparse_xml(xmlfile):
+        if path == 'output/symmetries/symmetry':
+            info = elem.find('info')
+            if info is None or info.text.strip() == 'crystal_symmetry':
+                rotations.append(np.rint(get_values(elem.find('rotation'))).astype(int).reshape(3, 3))
+        elif path == 'output/symmetries':
+            break
+    return np.array(rotations, dtype=int).reshape(-1, 3, 3)
+
+
+################################################################################
+# Fast non-validating decoding
+################################################################################
+
+# Elements that are decoded to a list also when they appear only once
+REPEATED_TAGS = {'step', 'ks_energies', 'atom', 'species', 'symmetry'}
+
+# Elements whose text content is decoded to a list also when it contains only one value
+VECTOR_TAGS = {'eigenvalues', 'occupations', 'k_point', 'atom', 'a1', 'a2', 'a3', 'b1', 'b2', 'b3',
+               'forces', 'stress', 'rotation', 'fractional_translation', 'equivalent_atoms',
+               'two_fermi_energies'}
+
+
+def convert_text(text, tag=None):
+    """
+    Converts the text of an element to a Python value, guessing its type
+    (bool, int, float or str). Lists of numbers are converted to lists.
+    """
+    if text is None or not text.strip():
+        return None
+    tokens = text.split()
+    for convert in (int, float):
+        try:
+            values = list(map(convert, tokens))
+        except ValueError:
+            continue
+        else:
+            return values if len(values) > 1 or tag in VECTOR_TAGS else values[0]
+
+    text = text.strip()
+    if text in ('true', 'false'):
+        return text == 'true'
+    return text
+
+
+def etree_to_dict(elem):
+    """
+    Converts an ElementTree element to a dictionary without using the schema. The
+    result has the same layout of xmlschema decoding: attributes are prefixed with '@',
+    the text of an element with attributes is under the '$' key and repeated children
+    are grouped into lists.
+    """
+    if len(elem) == 0:
+        value = convert_text(elem.text, elem.tag)
+        if not elem.attrib:
+            return value
+        data = {'@%s' % k: convert_text(v) for k, v in elem.attrib.items()}
+        if value is not None:
+            data['$'] = value
+        return data
+
+    data = {'@%s' % k: convert_text(v) for k, v in elem.attrib.items()}
+    for child in elem:
+        value = etree_to_dict(child)
+        if child.tag in data:
+            if not isinstance(data[child.tag], list) or child.tag not in REPEATED_TAGS:
+                data[child.tag] = [data[child.tag]]
+            data[child.tag].append(value)
+        elif child.tag in REPEATED_TAGS:
+            data[child.tag] = [value]
+        else:
+            data[child.tag] = value
+    return data
+
+
+def get_fast_dict(xmlfile):
+    """
+    Fast non-validating alternative to get_dict(): the xml file is parsed with
+    ElementTree and converted to a dictionary without using the schema. Types
+    are guessed from the text of the elements.
+    """
+    return etree_to_dict(ElementTree.parse(xmlfile).getroot())
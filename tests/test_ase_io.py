@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the ASE Atoms built from the xml output files.
+"""
+import unittest
+import sys
+import os
+import numpy as np
+import xmlschema
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.ase.io import get_atoms_from_xml_output
+from postqe.xmlfile import get_fast_dict
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+
+# The symbols, the positions and the cells (in a.u.) of the test runs
+FCC_NI = [[-3.325, 0.0, 3.325], [0.0, 3.325, 3.325], [-3.325, 3.325, 0.0]]
+STRUCTURES = {
+    'Si/Si.xml': (['Si', 'Si'], [[0.0, 0.0, 0.0], [2.55, 2.55, 2.55]],
+                  [[-5.1, 0.0, 5.1], [0.0, 5.1, 5.1], [-5.1, 5.1, 0.0]]),
+    'Ni_pbe_us/Ni.xml': (['Ni'], [[0.0, 0.0, 0.0]], FCC_NI),
+    'Ni_pz_nc/Ni.xml': (['Ni'], [[0.0, 0.0, 0.0]], FCC_NI),
+}
+
+
+class TestAseIo(unittest.TestCase):
+
+    def test_atoms_from_xml_output(self):
+        for name, (symbols, positions, cell) in STRUCTURES.items():
+            xmlfile = os.path.join(TEST_DIR, name)
+            for output in (xmlschema.to_dict(xmlfile, schema=SCHEMA, path='./output'), get_fast_dict(xmlfile)['output']):
+                atoms = get_atoms_from_xml_output(xmlfile, output=output)
+                self.assertEqual(atoms.get_chemical_symbols(), symbols)
+                self.assertTrue(np.allclose(atoms.get_positions(), positions))
+                self.assertTrue(np.allclose(atoms.get_cell(), cell))
+                self.assertFalse(atoms.get_pbc().any())
+
+
+if __name__ == '__main__':
+    unittest.main()
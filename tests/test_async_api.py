@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the asyncio API of postqe.
+"""
+import unittest
+import sys
+import os
+import time
+import asyncio
+from unittest import mock
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe import async_api
+from postqe.async_api import get_charge, get_potential
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+LABEL = os.path.join(TEST_DIR, 'Si/Si')
+
+
+def read_charge(calcul):
+    # A slow read of the charge file, for having the calls pending together
+    time.sleep(0.2)
+    return object()
+
+
+class TestAsyncApi(unittest.TestCase):
+
+    def setUp(self):
+        # The blocking stages are replaced by mocks that count the reads
+        patchers = [
+            mock.patch.object(async_api, 'read_calculator', return_value=object()),
+            mock.patch.object(async_api, 'read_charge', side_effect=read_charge),
+            mock.patch.object(async_api, 'compute_potential', side_effect=lambda charge, pot_type: (charge, pot_type)),
+        ]
+        self.read_calculator, self.read_charge, self.compute_potential = [p.start() for p in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def run_loop(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_shared_loads(self):
+        async def main():
+            return await asyncio.gather(get_charge(LABEL, SCHEMA), get_charge(LABEL, SCHEMA),
+                                        get_potential(LABEL, SCHEMA), get_potential(LABEL, SCHEMA),
+                                        get_potential(LABEL, SCHEMA, 'v_h'))
+
+        charge1, charge2, potential1, potential2, potential3 = self.run_loop(main())
+        self.assertIs(charge1, charge2)
+        self.assertIs(potential1, potential2)
+        self.assertEqual(potential1, (charge1, 'v_tot'))
+        self.assertEqual(potential3, (charge1, 'v_h'))
+        self.assertEqual(self.read_calculator.call_count, 1)
+        self.assertEqual(self.read_charge.call_count, 1)
+        self.assertEqual(self.compute_potential.call_count, 2)
+        self.assertEqual(async_api._pending_tasks, {})
+
+        # A new call after the completion reads the file again
+        self.assertIsNot(self.run_loop(get_charge(LABEL, SCHEMA)), charge1)
+        self.assertEqual(self.read_charge.call_count, 2)
+
+    def test_cancelled_waiter(self):
+        async def main():
+            waiters = [asyncio.ensure_future(get_charge(LABEL, SCHEMA)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            waiters[0].cancel()
+            results = await asyncio.gather(*waiters, return_exceptions=True)
+            return waiters, results
+
+        waiters, results = self.run_loop(main())
+        self.assertTrue(waiters[0].cancelled())
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertIs(results[1], results[2])
+        self.assertNotIsInstance(results[1], BaseException)
+        self.assertEqual(self.read_charge.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
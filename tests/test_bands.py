@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the band structure functions of postqe.
+"""
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.bands import compute_bands, read_bands, compute_kx, set_high_symmetry_points, get_high_symmetry_labels, \
+    get_bravais_lattice
+from postqe.band_interpolation import get_irreducible_kpoints, fit_bands, interpolate_bands, get_mp_kpoints, \
+    interpolate_xml_bands
+from postqe.xmlfile import read_band_structure, read_symmetries
+
+
+class TestBands(unittest.TestCase):
+
+    def test_compute_bands(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filebands = os.path.join(tmpdir, 'filebands')
+            kpoints, bands = compute_bands(os.path.join(TEST_DIR, 'Si/Si.xml'), filebands)
+            self.assertEqual(bands.shape, (10, 4))
+            with open(filebands) as fp:
+                self.assertEqual(fp.readline(), '& plot  nbnd = 4 nks = 10 /\n')
+                self.assertEqual(fp.readline(), '             -1.250000E-01 1.250000E-01 1.250000E-01\n')
+            self.assertTrue(np.allclose(read_bands(filebands)[1], bands, rtol=1.0E-3))
+
+            for ext in ('.npz', '.h5'):
+                compute_bands(os.path.join(TEST_DIR, 'Si/Si.xml'), filebands + ext)
+                self.assertTrue(np.array_equal(read_bands(filebands + ext)[1], bands))
+
+        kpoints, bands = compute_bands(os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml'), os.devnull, spin_component=1)
+        self.assertEqual(bands.shape, (6, 9))
+
+    def test_kpoints_path(self):
+        data = read_band_structure(os.path.join(TEST_DIR, 'Si/Si.xml'))
+        self.assertEqual(data['ibrav'], 2)
+        corners = np.array([[0.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.5, 1.0, 0.0], [0.5, 0.5, 0.5], [0.0, 0.0, 0.0],
+                            [0.25, 1.0, 0.25], [-1.0, 0.0, 0.0]])
+        t = np.linspace(0.0, 1.0, 5)[1:, None]
+        kpoints = np.vstack([corners[:1]] + [p + (q - p) * t for p, q in zip(corners[:-1], corners[1:])])
+
+        high_sym = set_high_symmetry_points(kpoints)
+        self.assertEqual(list(np.flatnonzero(high_sym)), [0, 4, 8, 12, 16, 20, 24])
+        self.assertEqual(list(get_high_symmetry_labels(kpoints, data['b'])[high_sym]),
+                         ['G', 'X', 'W', 'L', 'G', 'K', 'X'])
+
+        # The same cell given by other primitive vectors (ibrav=0), in a rotated frame
+        a = np.dot([[1, 1, 0], [0, 1, 0], [1, 1, 1]], np.linalg.inv(data['b']).T)
+        c, s = np.cos(0.3), np.sin(0.3)
+        rotation = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+        b = np.dot(np.linalg.inv(a).T, rotation)
+        self.assertEqual(list(get_high_symmetry_labels(np.dot(kpoints, rotation), b)[high_sym]),
+                         ['G', 'X', 'W', 'L', 'G', 'K', 'X'])
+        kx = compute_kx(kpoints)
+        self.assertAlmostEqual(kx[4], 1.0)
+        self.assertAlmostEqual(kx[-1], 1.5 + np.sqrt(0.5) + np.sqrt(0.75) + np.sqrt(1.125) + np.sqrt(2.625))
+
+        # A jump between two lines of the path does not advance kx
+        kx = compute_kx(np.vstack((kpoints[:5], kpoints[12:] + [2.0, 0.0, 0.0])))
+        self.assertAlmostEqual(kx[5], kx[4])
+
+    def test_band_interpolation(self):
+        xmlfile = os.path.join(TEST_DIR, 'Si/Si.xml')
+        data = read_band_structure(xmlfile)
+        rotations = read_symmetries(xmlfile)
+        a = np.linalg.inv(data['b']).T
+        self.assertEqual(rotations.shape, (48, 3, 3))
+        self.assertEqual(len(get_irreducible_kpoints(get_mp_kpoints((4, 4, 4), data['b'], (1, 1, 1)), a, rotations)), 10)
+
+        # The interpolation passes through the eigenvalues and has the symmetry of the crystal
+        kpoints, bands = compute_bands(xmlfile, os.devnull)
+        self.assertTrue(np.allclose(interpolate_xml_bands(xmlfile, kpoints), bands))
+        fit = fit_bands(data['kpoints'], data['eigenvalues'], a, rotations)
+        k = np.random.RandomState(0).rand(5, 3)
+        rotation = np.dot(np.dot(a.T, rotations[7]), np.linalg.inv(a.T))
+        self.assertTrue(np.allclose(interpolate_bands(np.dot(k, rotation.T), *fit), interpolate_bands(k, *fit)))
+
+        # Interpolation of a model band from the full grid
+        kpoints = get_mp_kpoints((12, 12, 12), data['b'])
+        fit = fit_bands(kpoints, -np.cos(2.0 * np.pi * kpoints).sum(axis=1) + 0.3 * np.cos(4.0 * np.pi * kpoints).sum(axis=1),
+                        a, rotations)
+        values = -np.cos(2.0 * np.pi * k).sum(axis=1) + 0.3 * np.cos(4.0 * np.pi * k).sum(axis=1)
+        self.assertTrue(np.allclose(interpolate_bands(k, *fit)[:, 0], values, atol=1.0E-3))
+
+    def test_bravais_lattice(self):
+        # Cells of pw.x: hexagonal (ibrav=4), rhombohedral (5), body-centered tetragonal (7),
+        # base-centered orthorhombic (9), base-centered monoclinic (13) and triclinic (14)
+        cells = {
+            'hP': [[1.0, 0.0, 0.0], [-0.5, np.sqrt(0.75), 0.0], [0.0, 0.0, 1.6]],
+            'hR1': [[0.5, -np.sqrt(1.0 / 12.0), 0.7], [0.0, np.sqrt(1.0 / 3.0), 0.7], [-0.5, -np.sqrt(1.0 / 12.0), 0.7]],
+            'tI2': [[0.5, -0.5, 0.9], [0.5, 0.5, 0.9], [-0.5, -0.5, 0.9]],
+            'oC': [[0.5, 0.7, 0.0], [-0.5, 0.7, 0.0], [0.0, 0.0, 1.6]],
+            'mC': [[0.5, 0.0, -0.8], [0.4, 1.2, 0.0], [0.5, 0.0, 0.8]],
+            'aP': [[1.0, 0.0, 0.0], [0.3, 1.2, 0.0], [0.2, 0.4, 1.5]],
+        }
+        for symbol, a in cells.items():
+            # Any choice of the primitive vectors gives the same lattice
+            for t in (np.eye(3), [[1, 0, 0], [1, 1, 0], [-1, 2, 1]]):
+                bravais, cell = get_bravais_lattice(np.dot(t, a))
+                self.assertEqual(bravais, symbol)
+                n = np.dot(cell, np.linalg.inv(a))
+                self.assertTrue(np.allclose(n, np.rint(n)))
+                self.assertAlmostEqual(abs(np.linalg.det(cell)), abs(np.linalg.det(a)))
+
+        # The high symmetry points of the hexagonal lattice
+        b = np.linalg.inv(cells['hP']).T
+        kpoints = np.dot([[0.0, 0.0, 0.0], [0.5, 0.0, 0.0], [1.0 / 3.0, 1.0 / 3.0, 0.5], [0.1, 0.2, 0.0]], b)
+        self.assertEqual(list(get_high_symmetry_labels(kpoints, b)), ['G', 'M', 'H', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()
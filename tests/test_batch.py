@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the batch scanner of the pw.x runs of postqe.
+"""
+import unittest
+import sys
+import os
+import csv
+import tempfile
+import numpy as np
+import xmlschema
+import ase.units as units
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.batch import COLUMNS, find_xml_outputs, scan_run, scan_runs, get_gap
+from postqe.ase.calculator import PostqeCalculator
+from postqe.xmldata import PWData
+from postqe.xmlfile import get_fast_dict
+from postqe.cli import scan
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+
+
+class TestBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = scan_runs(TEST_DIR, max_workers=2)
+
+    def test_scan_runs(self):
+        table = self.table
+        self.assertEqual(list(table['filename']), find_xml_outputs(TEST_DIR))
+        row = list(table['filename']).index(os.path.join(TEST_DIR, 'Si/Si.xml'))
+        self.assertAlmostEqual(table['energy'][row], -215.661, places=3)  # etot = -7.925 Ha
+
+        for name in ('Si/Si.xml', 'Ni_pbe_us/Ni.xml', 'Ni_pz_nc/Ni.xml', 'examples/Si.xml'):
+            xmlfile = os.path.join(TEST_DIR, name)
+            row = list(table['filename']).index(xmlfile)
+            data = PWData(xmlfile, schema=SCHEMA)
+            self.assertEqual(table['nat'][row], data['nat'])
+            self.assertAlmostEqual(table['volume'][row], abs(np.linalg.det(data['a'])))
+
+            # The values of the validated decoding
+            calcul = PostqeCalculator(atoms=None, label=os.path.splitext(xmlfile)[0], schema=SCHEMA)
+            calcul.read_results()
+            etot = xmlschema.to_dict(xmlfile, schema=SCHEMA, path='./output/total_energy')['etot']
+            self.assertAlmostEqual(calcul.results['energy'], etot * units.Hartree)
+            self.assertAlmostEqual(table['energy'][row], calcul.results['energy'])
+            self.assertAlmostEqual(table['fermi_energy'][row], calcul.get_fermi_level())
+            np.testing.assert_equal(table['gap'][row], get_gap(calcul))
+            self.assertEqual(table['functional'][row], calcul.get_xc_functional())
+            self.assertEqual(table['error'][row], '')
+
+    def test_scan_errors(self):
+        # The runs that can't be read are kept in the table, with the error
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'broken.xml')
+            with open(filename, 'w') as fp:
+                fp.write('<qes:espresso xmlns:qes="http://www.quantum-espresso.org/ns/qes/qes-1.0">\n<output>')
+            row = scan_run(filename)
+        self.assertTrue(row['error'].startswith('ParseError: '))
+        self.assertTrue(np.isnan(row['energy']))
+        self.assertTrue(scan_run(os.path.join(TEST_DIR, 'missing.xml'))['error'].startswith('FileNotFoundError: '))
+
+    def test_fast_dict(self):
+        xmlfile = os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml')
+        fast_output = get_fast_dict(xmlfile)['output']
+        output = xmlschema.to_dict(xmlfile, schema=SCHEMA, path='./output')
+        self.assertEqual(fast_output['atomic_structure']['@nat'], output['atomic_structure']['@nat'])
+        self.assertEqual(fast_output['total_energy']['etot'], output['total_energy']['etot'])
+        self.assertEqual(fast_output['band_structure']['fermi_energy'], output['band_structure']['fermi_energy'])
+        self.assertEqual(len(fast_output['band_structure']['ks_energies']), len(output['band_structure']['ks_energies']))
+
+    def test_scan_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'runs.csv')
+            scan([os.path.join(TEST_DIR, 'Si'), '-output', filename, '-nproc', '1'])
+            with open(filename) as fp:
+                rows = list(csv.reader(fp))
+        self.assertEqual(tuple(rows[0]), COLUMNS)
+        self.assertEqual(len(rows), 3)  # Si.xml and reference/tmp/Si.xml
+        self.assertAlmostEqual(float(rows[1][1]), -215.661, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the energies of the ASE calculator of postqe.
+"""
+import unittest
+import sys
+import os
+import numpy as np
+import xmlschema
+import ase.units as units
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.ase.calculator import PostqeCalculator
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+
+
+def get_calculator(name):
+    calcul = PostqeCalculator(atoms=None, label=os.path.join(TEST_DIR, name), schema=SCHEMA)
+    calcul.read_results()
+    return calcul
+
+
+class TestCalculator(unittest.TestCase):
+
+    def test_energies(self):
+        # The energies of the xml file are in Hartree, the ones of the calculator in eV
+        calcul = get_calculator('Si/Si')
+        output = xmlschema.to_dict(os.path.join(TEST_DIR, 'Si/Si.xml'), schema=SCHEMA, path='./output')
+        self.assertAlmostEqual(calcul.results['energy'], output['total_energy']['etot'] * units.Hartree)
+        self.assertAlmostEqual(calcul.results['energy'], -215.661, places=3)
+        eigenvalues = output['band_structure']['ks_energies'][1]['eigenvalues']
+        self.assertTrue(np.allclose(calcul.get_eigenvalues(kpt=1), np.array(eigenvalues) * units.Hartree))
+
+    def test_spin_polarized(self):
+        calcul = get_calculator('Ni_pbe_us/Ni')
+        output = xmlschema.to_dict(os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml'), schema=SCHEMA, path='./output')
+        self.assertAlmostEqual(calcul.get_fermi_level(), output['band_structure']['fermi_energy'] * units.Hartree)
+        eigenvalues = np.array(output['band_structure']['ks_energies'][0]['eigenvalues']) * units.Hartree
+        nbnd_up = len(eigenvalues) // 2
+        self.assertTrue(np.allclose(calcul.get_eigenvalues(spin=0), eigenvalues[:nbnd_up]))
+        self.assertTrue(np.allclose(calcul.get_eigenvalues(spin=1), eigenvalues[nbnd_up:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the density of states of postqe.
+"""
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.dos_postqe import w0gauss, dos_gaussian, compute_dos, get_tetrahedra, dos_tetrahedra, \
+    get_grid_eigenvalues, get_energy_range, refine_grid, DOS
+from postqe.xmlfile import read_band_structure, read_symmetries
+from postqe.constants import ev_to_ry
+from postqe.symmetry import get_bz_to_ibz_map, get_kpoint_images, get_grid_indices, get_grid_kpoints, unfold_kpoints
+
+
+class TestDos(unittest.TestCase):
+
+    def test_w0gauss(self):
+        x = np.linspace(-20.0, 20.0, 4001)
+        for ngauss in (0, 1, 2, -1, -99):
+            self.assertAlmostEqual(w0gauss(x, ngauss).sum() * 0.01, 1.0, places=6)
+        self.assertTrue(np.allclose(w0gauss(x, 1), np.exp(-x ** 2) * (1.5 - x ** 2) / np.sqrt(np.pi)))
+        self.assertTrue(np.allclose(w0gauss(x, -99), 1.0 / (2.0 + np.exp(-x) + np.exp(x))))
+        self.assertRaises(ValueError, w0gauss, x, -2)
+
+    def test_dos_gaussian(self):
+        eigenvalues = np.random.RandomState(0).rand(5, 3)
+        weights = np.array([0.1, 0.2, 0.3, 0.2, 0.2])
+        e = np.linspace(-1.0, 2.0, 301)
+        dos = dos_gaussian(e, eigenvalues, weights, 0.05, max_memory=1024)
+        self.assertTrue(np.allclose(dos, dos_gaussian(e, eigenvalues, weights, 0.05)))
+        self.assertAlmostEqual(dos[150], sum(w * np.exp(-((e[150] - eig) / 0.05) ** 2)
+                                             for w, row in zip(weights, eigenvalues) for eig in row)
+                               / 0.05 / np.sqrt(np.pi))
+        self.assertAlmostEqual(dos.sum() * 0.01, 3.0, places=6)
+
+    def test_tetrahedra(self):
+        b = np.array([[-1.0, -1.0, 1.0], [1.0, 1.0, 1.0], [-1.0, 1.0, -1.0]])
+        tetrahedra = get_tetrahedra((4, 4, 4), b)
+        self.assertEqual(tetrahedra.shape, (384, 4))
+        self.assertTrue(np.all(np.bincount(tetrahedra.ravel()) == 24))
+        self.assertEqual(get_tetrahedra((4, 4, 4), b, optimized=True).shape, (384, 20))
+
+        def get_band(nk):
+            k = np.dot(np.indices(nk).reshape(3, -1).T / np.array(nk, dtype=float), b)
+            return -np.cos(2.0 * np.pi * k).sum(axis=1)[:, None] + np.array([0.0, 0.5])
+
+        e = np.linspace(-3.55, 4.05, 381)
+        ref_dos, ref_idos = dos_tetrahedra(e, get_band((16, 16, 16)), (16, 16, 16), b, weight=2.0)
+        self.assertAlmostEqual(ref_idos[-1], 4.0)
+        self.assertAlmostEqual(ref_dos.sum() * 0.02, 4.0, places=2)
+
+        dos, idos = dos_tetrahedra(e, get_band((8, 8, 8)), (8, 8, 8), b, weight=2.0, max_memory=65536)
+        opt_dos, opt_idos = dos_tetrahedra(e, get_band((8, 8, 8)), (8, 8, 8), b, weight=2.0, optimized=True)
+        self.assertLess(np.abs(opt_idos - ref_idos).max(), 0.5 * np.abs(idos - ref_idos).max())
+
+    def test_grid_eigenvalues(self):
+        bands = read_band_structure(os.path.join(TEST_DIR, 'Si/Si.xml'))
+        self.assertEqual(list(bands['mp_grid']), [4, 4, 4])
+        self.assertRaises(ValueError, get_grid_eigenvalues, bands['kpoints'], bands['eigenvalues'],
+                          bands['b'], bands['mp_grid'], bands['mp_shift'])  # only the irreducible k-points
+        rotations = read_symmetries(os.path.join(TEST_DIR, 'Si/Si.xml'))
+        bz_to_ibz, operations = get_bz_to_ibz_map(bands['kpoints'], bands['b'], rotations, (4, 4, 4), (1, 1, 1))
+        self.assertTrue(np.allclose(np.bincount(bz_to_ibz) / 32.0, bands['weights']))
+        x = np.dot(bands['kpoints'], np.linalg.inv(bands['b']))
+        images = get_kpoint_images(x, rotations)[operations, bz_to_ibz]
+        self.assertTrue(np.allclose(get_grid_indices(images, (4, 4, 4), (1, 1, 1)), np.arange(64)))
+        self.assertTrue(np.allclose(get_grid_indices(get_grid_kpoints((4, 4, 4), (1, 1, 1)), (4, 4, 4), (1, 1, 1)),
+                                    np.arange(64)))
+        self.assertTrue(np.allclose(get_grid_eigenvalues(bands['kpoints'], bands['eigenvalues'], bands['b'],
+                                                         (4, 4, 4), (1, 1, 1), rotations),
+                                    bands['eigenvalues'][bz_to_ibz]))
+        kpoints, ibz = unfold_kpoints([[0.0, 0.0, 0.0], [0.5, 0.5, 0.5], [0.0, 1.0, 0.0]], bands['b'], rotations)
+        self.assertEqual(list(ibz), [0, 1, 1, 1, 1, 2, 2, 2])  # the stars of Gamma, L and X
+
+        b = bands['b']
+        kpoints = np.dot(np.indices((2, 2, 2)).reshape(3, -1).T / 2.0 + 0.25, b)
+        eigenvalues = np.random.RandomState(0).rand(8, 3)
+        grid_eigenvalues = get_grid_eigenvalues(kpoints[::-1], eigenvalues[::-1], b, (2, 2, 2), (1, 1, 1))
+        self.assertTrue(np.allclose(grid_eigenvalues, eigenvalues))
+
+    def test_compute_dos(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filedos = os.path.join(tmpdir, 'filedos')
+            e, dos_up, dos_down = compute_dos(os.path.join(TEST_DIR, 'Si/Si.xml'), filedos, -10.0, 20.0, 0.01)
+            self.assertTrue(np.allclose(np.loadtxt(filedos), np.column_stack((e, dos_up, dos_down))))
+        self.assertFalse(dos_down.any())
+        self.assertAlmostEqual(dos_up.sum() * 0.01, 8.0, places=3)  # 4 bands with weights summing to 2
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            e, dos_up, dos_down = compute_dos(os.path.join(TEST_DIR, 'Si/Si.xml'), os.path.join(tmpdir, 'filedos'))
+        self.assertAlmostEqual(dos_up[0] + dos_up[-1], 0.0)
+        self.assertAlmostEqual(dos_up.sum() * 0.01, 8.0, places=3)
+
+        e, dos_up, dos_down = compute_dos(os.path.join(TEST_DIR, 'Si/Si.xml'), os.devnull, -10.0, 20.0, 0.01,
+                                          bz_sum='tetrahedra')  # unfolded from the irreducible k-points
+        self.assertAlmostEqual(dos_up.sum() * 0.01, 8.0, places=2)
+
+    def test_dos_object(self):
+        dos = DOS.from_xml(os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml'), width=0.1, npts=2000)
+        e = dos.get_energies()
+        self.assertEqual(e.size, 2000)
+        self.assertAlmostEqual(dos.get_dos().sum() * (e[1] - e[0]), 18.0, places=5)  # 9 bands for each spin
+        self.assertTrue(np.allclose(dos.get_dos(), dos.get_dos(0) + dos.get_dos(1)))
+
+        # The DOS of ase.dft.DOS, with the weights normalized to 1
+        bands = read_band_structure(os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml'))
+        x = e[1234] - (bands['eigenvalues'][:, :9] - bands['fermi_energy']) * 2.0 / ev_to_ry
+        value = np.dot(bands['weights'] / bands['weights'].sum(), np.exp(-(x / 0.1) ** 2).sum(axis=1))
+        self.assertAlmostEqual(dos.get_dos(0)[1234], value / np.sqrt(np.pi) / 0.1)
+
+        # The DOS is cached for each set of parameters
+        dos.width = 0.05
+        dos.get_dos()
+        dos.smearing = 'cold'
+        dos.get_dos()
+        dos.width, dos.smearing = 0.1, 0
+        self.assertAlmostEqual(dos.get_dos(0)[1234], value / np.sqrt(np.pi) / 0.1)
+        self.assertEqual(len(dos._cache), 3)
+
+        dos = DOS.from_xml(os.path.join(TEST_DIR, 'Si/Si.xml'), window=(-15.0, 5.0), npts=2001)
+        self.assertEqual(dos.get_energies()[-1], 5.0)
+        self.assertAlmostEqual(dos.get_dos().sum() * 0.01, 8.0, places=3)  # 4 bands, spin degenerate
+
+    def test_adaptive_grid(self):
+        eigenvalues = np.array([[-1.0, 0.0, 0.3], [2.0, 2.2, 4.0]])
+        e_min, e_max = get_energy_range(eigenvalues, 0.1)
+        self.assertEqual((e_min, e_max), (-1.5, 4.5))
+
+        e, dos = refine_grid(lambda x: dos_gaussian(x, eigenvalues, [1.0, 1.0], 0.1), e_min, e_max, 0.001,
+                             max_step=0.1)
+        self.assertEqual((e[0], e[-1]), (e_min, e_max))
+        self.assertLess(e.size, 1000)
+        x = np.arange(e_min, e_max, 0.001)
+        self.assertLess(np.abs(np.interp(x, e, dos) - dos_gaussian(x, eigenvalues, [1.0, 1.0], 0.1)).max(),
+                        0.01 * dos.max())
+
+
+if __name__ == '__main__':
+    unittest.main()
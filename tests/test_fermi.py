@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the Fermi energy and band edges solver of postqe.
+"""
+import unittest
+import sys
+import os
+import numpy as np
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.fermi import wgauss, get_occupations, get_fermi_energy, get_band_edges
+from postqe.dos_postqe import w0gauss
+from postqe.xmlfile import read_band_structure
+from postqe.band_analysis import get_direct_gap, get_effective_masses, analyze_bands
+from postqe.symmetry import get_grid_kpoints
+from postqe.batch import analyze_run
+from postqe.constants import ev_to_ry
+
+
+class TestFermi(unittest.TestCase):
+
+    def test_wgauss(self):
+        x = np.linspace(-40.0, 40.0, 8001)
+        for ngauss in (0, 1, 2, -1, -99):
+            w = wgauss(x, ngauss)
+            self.assertAlmostEqual(w[0], 0.0)
+            self.assertAlmostEqual(w[-1], 1.0)
+            self.assertTrue(np.allclose(np.gradient(w, x), w0gauss(x, ngauss), atol=1.0E-4))
+
+    def test_fermi_energy(self):
+        # Smearing: the Fermi energy and the occupations of the xml file are reproduced
+        bands = read_band_structure(os.path.join(TEST_DIR, 'Ni_pbe_us/Ni.xml'))
+        degauss = bands['degauss'] / 2.0  # the xml file has it in Ry
+        ef = get_fermi_energy(bands['eigenvalues'], bands['weights'], bands['nelec'], degauss, ngauss=1)
+        self.assertAlmostEqual(ef, bands['fermi_energy'], places=8)
+        occupations = get_occupations(bands['eigenvalues'], ef, degauss, ngauss=1)
+        self.assertTrue(np.allclose(occupations, bands['occupations'], atol=1.0E-8))
+        self.assertEqual(get_band_edges(bands['eigenvalues'], ef)[2], 0.0)
+
+        # Fixed occupations
+        eigenvalues = np.array([[-1.0, 0.5, 2.0], [-0.8, 0.2, 1.5]])
+        ef = get_fermi_energy(eigenvalues, [1.0, 1.0], 4)
+        self.assertEqual(ef, 0.5)
+        self.assertEqual(get_band_edges(eigenvalues, ef), (0.5, 1.5, 1.0))
+        self.assertRaises(ValueError, get_fermi_energy, eigenvalues, [1.0, 1.0], 8)
+
+    def test_band_analysis(self):
+        b = np.array([[-1.0, -1.0, 1.0], [1.0, 1.0, 1.0], [-1.0, 1.0, -1.0]])
+        alat = 10.0
+        x = get_grid_kpoints((12, 12, 12))
+        k = np.dot(x, b) * 2.0 * np.pi / alat
+
+        # Parabolic bands with masses 0.5 (holes at Gamma) and 0.3, 0.6, 0.9 (electrons at x[2])
+        dk = k - k[2]
+        valence = -0.5 * np.sum(k ** 2, axis=1) / 0.5
+        conduction = 0.1 + 0.5 * (dk[:, 0] ** 2 / 0.3 + dk[:, 1] ** 2 / 0.6 + dk[:, 2] ** 2 / 0.9)
+        eigenvalues = np.column_stack((valence, conduction)) * 2.0 / ev_to_ry  # in eV
+        self.assertTrue(np.allclose(get_effective_masses(x, eigenvalues[:, 1], 2, b, alat), [0.3, 0.6, 0.9]))
+
+        result = analyze_bands(eigenvalues, 0.0, x, np.arange(len(x)), b, alat)
+        self.assertAlmostEqual(result['gap'], 0.2 / ev_to_ry)
+        self.assertFalse(result['direct'])
+        self.assertEqual((result['k_vbm'], result['k_cbm']), (0, 2))
+        self.assertTrue(np.allclose(result['hole_masses'], 0.5))
+        self.assertAlmostEqual(result['electron_mass'], 3.0 / (1.0 / 0.3 + 1.0 / 0.6 + 1.0 / 0.9))
+        self.assertAlmostEqual(get_direct_gap(eigenvalues, 0.0)[0], np.min(eigenvalues[:, 1] - eigenvalues[:, 0]))
+
+        # A degenerate valence band edge: the hole masses are not computed
+        result = analyze_bands(eigenvalues[:, [0, 0, 1]], 0.0, x, np.arange(len(x)), b, alat)
+        self.assertTrue(np.all(np.isnan(result['hole_masses'])))
+        self.assertTrue(np.allclose(result['electron_masses'], [0.3, 0.6, 0.9]))
+
+        # Bands along lines of the Brillouin zone: the gap of silicon is indirect,
+        # and the effective masses are not computed
+        row = analyze_run(os.path.join(TEST_DIR, 'examples/Si.xml'))
+        self.assertAlmostEqual(row['gap'], 0.501, places=3)
+        self.assertFalse(row['direct'])
+        self.assertTrue(np.isnan(row['hole_mass']) and np.isnan(row['electron_mass']))
+        self.assertTrue(np.isnan(analyze_run(os.path.join(TEST_DIR, 'missing.xml'))['gap']))
+
+
+if __name__ == '__main__':
+    unittest.main()
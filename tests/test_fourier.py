@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the Fourier interpolation of postqe.
+"""
+import unittest
+import sys
+import os
+from unittest import mock
+import numpy as np
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.compute_vs import compute_G
+from postqe.fourier import get_gcutm, get_fourier_coefficients, get_grid_coefficients, fourier_interpolate, get_lattice_direction, \
+    fourier_line, fourier_plane, resample, spherical_average, fibonacci_sphere, sphere_interpolate, \
+    nufft_interpolate, _gaussian_gridding, planar_average
+from postqe.charge import Charge, Potential
+from postqe.plot import FFTinterp1D, FFTinterp2D, compute_sections
+
+
+class TestFourier(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.b = np.array([[-1.0, -1.0, 1.0], [1.0, 1.0, 1.0], [-1.0, 1.0, -1.0]])
+        cls.a = np.linalg.inv(cls.b).T  # direct lattice in alat units
+        cls.charge = np.random.RandomState(0).rand(6, 7, 8)
+        cls.G = compute_G(cls.b, cls.charge.shape)
+
+    def direct_sum(self, point):
+        fft_charge = np.fft.fftn(self.charge)
+        value = 0.0
+        for x in range(self.charge.shape[0]):
+            for y in range(self.charge.shape[1]):
+                for z in range(self.charge.shape[2]):
+                    arg = 2.0 * np.pi * np.dot(point, self.G[x, y, z])
+                    value += fft_charge[x, y, z] * complex(np.cos(arg), np.sin(arg))
+        return value / self.charge.size
+
+    def test_grid_points(self):
+        g, coeffs = get_fourier_coefficients(self.charge, self.G)
+        nr = self.charge.shape
+        points = [(i / nr[0]) * self.a[0] + (j / nr[1]) * self.a[1] + (k / nr[2]) * self.a[2]
+                  for i, j, k in [(0, 0, 0), (1, 2, 3), (5, 6, 7)]]
+        values = fourier_interpolate(points, g, coeffs, max_memory=1024)
+        self.assertTrue(np.allclose(values.real, [self.charge[0, 0, 0], self.charge[1, 2, 3], self.charge[5, 6, 7]]))
+
+    def test_threaded_chunks(self):
+        g, coeffs = get_fourier_coefficients(self.charge, self.G)
+        points = np.random.RandomState(1).rand(50, 3)
+        values = fourier_interpolate(points, g, coeffs)
+        self.assertTrue(np.allclose(fourier_interpolate(points, g, coeffs, max_memory=4096, max_workers=3), values))
+        self.assertAlmostEqual(values[7], self.direct_sum(points[7]))
+
+    def test_fft_interp_1d(self):
+        x0, e1 = np.array([0.1, 0.0, 0.2]), np.array([1.0, 0.5, 0.0])
+        X, Y = FFTinterp1D(self.charge, self.G, self.a, x0, e1, 5)
+        e1 = e1 / np.linalg.norm(e1)
+        for x, y in zip(X, Y):
+            self.assertAlmostEqual(y, self.direct_sum(x0 + x * e1))
+
+    def test_compute_sections(self):
+        x0 = np.array([0.1, 0.0, 0.2])
+        sections = [dict(x0=x0, e1=(1.0, 0.5, 0.0), nx=5), dict(dim=2, x0=x0, e1=(1.0, 0.0, 0.0), e2=(0.0, 0.0, 2.0),
+                                                               nx=4, ny=3),
+                    dict(x0=x0, e1=self.a[0], nx=6), dict(dim=2, x0=x0, e1=(0.3, 0.0, 0.1), e2=(0.0, 1.0, 0.0), nx=3)]
+        results = compute_sections(self.charge, self.G, self.a, sections)
+        self.assertEqual(len(results), 4)
+        X, Y = FFTinterp1D(self.charge, self.G, self.a, x0, np.array([1.0, 0.5, 0.0]), 5)
+        self.assertTrue(np.allclose(results[0][1], Y.real))
+        X, Y, Z = FFTinterp2D(self.charge, self.G, self.a, x0, np.array([1.0, 0.0, 0.0]), np.array([0.0, 0.0, 2.0]), 4, 3)
+        self.assertTrue(np.allclose(results[1][2], Z))
+        self.assertAlmostEqual(results[2][1][5], self.direct_sum(x0 + self.a[0]).real)
+        self.assertEqual(results[3][2].shape, (3, 20))
+
+    def test_cutoff(self):
+        gcutm = 3.0
+        coeffs = get_grid_coefficients(self.charge, self.G, gcutm)
+        g, list_coeffs = get_fourier_coefficients(self.charge, self.G, gcutm)
+        self.assertEqual(np.count_nonzero(coeffs), list_coeffs.size)
+        X, Y = FFTinterp1D(None, self.G, self.a, np.zeros(3), np.array([0.3, 0.1, 0.0]), 4, coeffs=coeffs)
+        self.assertTrue(np.allclose(Y, fourier_interpolate(np.outer(X, [0.3, 0.1, 0.0]) / np.hypot(0.3, 0.1),
+                                                           g, list_coeffs)))
+
+    def test_fft_interp_2d(self):
+        x0, e1, e2 = np.array([0.1, 0.0, 0.2]), np.array([1.0, 0.0, 0.0]), np.array([0.0, 0.0, 2.0])
+        X, Y, Z = FFTinterp2D(self.charge, self.G, self.a, x0, e1, e2, 4, 3)
+        self.assertEqual(Z.shape, (4, 3))
+        self.assertAlmostEqual(Y[0, 2], 2.0)
+        for i, j in [(0, 0), (1, 2), (3, 1)]:
+            point = x0 + X[i, j] * e1 + Y[i, j] * e2 / 2.0
+            self.assertAlmostEqual(Z[i, j], self.direct_sum(point).real)
+
+    def test_lattice_direction(self):
+        self.assertEqual(list(get_lattice_direction(self.a[0] - 2 * self.a[2], self.a)), [1, 0, -2])
+        self.assertIsNone(get_lattice_direction(np.array([0.3, 0.0, 0.1]), self.a))
+        self.assertIsNone(get_lattice_direction(np.zeros(3), self.a))
+
+    def test_fourier_line(self):
+        x0 = np.array([0.1, 0.0, 0.2])
+        values = fourier_line(get_grid_coefficients(self.charge), self.G, x0, (1, 0, -2), 7)
+        for i in [0, 2, 6]:
+            self.assertAlmostEqual(values[i], self.direct_sum(x0 + i / 6.0 * (self.a[0] - 2 * self.a[2])))
+
+    def test_fourier_plane(self):
+        x0 = np.array([0.1, 0.0, 0.2])
+        values = fourier_plane(get_grid_coefficients(self.charge), self.G, x0, (1, 1, 0), (0, 0, 1), (4, 5))
+        for i, j in [(0, 0), (1, 2), (3, 4)]:
+            point = x0 + i / 3.0 * (self.a[0] + self.a[1]) + j / 4.0 * self.a[2]
+            self.assertAlmostEqual(values[i, j], self.direct_sum(point))
+
+    def test_resample(self):
+        new_charge = resample(self.charge, (12, 7, 16))
+        self.assertTrue(np.allclose(new_charge[::2, :, ::2], self.charge))
+        for i, j, k in [(0, 0, 0), (3, 2, 5), (11, 6, 15)]:
+            point = (i / 12.0) * self.a[0] + (j / 7.0) * self.a[1] + (k / 16.0) * self.a[2]
+            self.assertAlmostEqual(new_charge[i, j, k], self.direct_sum(point).real)
+        self.assertRaises(ValueError, resample, self.charge, (4, 7, 8))
+
+    def test_charge_resample(self):
+        alat = 2.0 * np.pi
+        calculator = mock.Mock(**{'get_alat.return_value': alat, 'get_ecutrho.return_value': 2.0,
+                                  'get_a_vectors.return_value': self.a * alat,
+                                  'get_b_vectors.return_value': self.b})
+        charge = Potential(self.charge.shape, self.charge)
+        charge.set_calculator(calculator)
+        charge.v = self.charge
+        new = charge.resample((12, 7, 16))
+        self.assertIsNone(new.charge_diff)
+
+        # The charge has no components beyond gcutm, the potential is not band-limited
+        coeffs = get_grid_coefficients(self.charge, self.G, get_gcutm(2.0, alat))
+        self.assertLess(np.count_nonzero(coeffs), coeffs.size)
+        self.assertTrue(np.allclose(new.charge, resample(self.charge, (12, 7, 16), coeffs)))
+        self.assertTrue(np.allclose(new.charge[::2, :, ::2], np.fft.ifftn(coeffs).real * coeffs.size))
+        self.assertTrue(np.allclose(new.v, resample(self.charge, (12, 7, 16))))
+        self.assertIsNone(Charge(self.charge.shape).resample((12, 7, 16)).charge)
+
+    def test_spherical_average(self):
+        g, coeffs = get_fourier_coefficients(self.charge, self.G)
+        centers = np.array([[0.0, 0.0, 0.0], [0.1, 0.2, 0.3]])
+        averages = spherical_average(centers, [0.0, 0.15], g, coeffs, max_memory=1024)
+        self.assertEqual(averages.shape, (2, 2))
+        self.assertAlmostEqual(averages[1, 0], self.direct_sum(centers[1]).real)
+
+        theta, phi, values = sphere_interpolate(centers, 0.15, 4000, get_grid_coefficients(self.charge), self.G, self.a)
+        self.assertEqual(values.shape, (2, 4000))
+        self.assertTrue(np.allclose(values.real.mean(axis=1), averages[:, 1], rtol=1.0E-3))
+
+    def test_fibonacci_sphere(self):
+        theta, phi, versors = fibonacci_sphere(100)
+        self.assertTrue(np.allclose(np.linalg.norm(versors, axis=1), 1.0))
+        self.assertTrue(np.allclose(versors[:, 2], np.cos(theta)))
+        self.assertTrue(np.allclose(versors.mean(axis=0), 0.0, atol=1.0E-2))
+
+    def test_nufft(self):
+        g, coeffs = get_fourier_coefficients(self.charge, self.G)
+        points = np.random.RandomState(2).randn(100, 3)
+        values = fourier_interpolate(points, g, coeffs)
+        self.assertTrue(np.allclose(nufft_interpolate(points, get_grid_coefficients(self.charge), self.a, eps=1.0E-12), values))
+
+        x = 2.0 * np.pi * (np.linalg.solve(self.a.T, points.T).T % 1.0)
+        gridded = _gaussian_gridding(x, np.fft.fftn(self.charge) / self.charge.size, eps=1.0E-12, max_memory=4096)
+        self.assertTrue(np.allclose(gridded, values))
+
+    def test_planar_average(self):
+        coeffs = get_grid_coefficients(self.charge)
+        self.assertTrue(np.allclose(planar_average(coeffs, axis=1), self.charge.mean(axis=(0, 2))))
+        self.assertTrue(np.allclose(planar_average(coeffs, axis=2, npoints=16)[::2], self.charge.mean(axis=(0, 1))))
+        self.assertTrue(np.allclose(planar_average(coeffs, axis=0, windows=[1.0]), self.charge.mean()))
+        self.assertRaises(ValueError, planar_average, coeffs, 2, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the non-interactive plotting of postqe.
+"""
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.compute_vs import compute_G
+from postqe.plot import set_interactive, new_figure, plot1D_FFTinterp, compute_sections, render_sections
+
+
+class TestPlot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.b = np.array([[-1.0, -1.0, 1.0], [1.0, 1.0, 1.0], [-1.0, 1.0, -1.0]])
+        cls.a = np.linalg.inv(cls.b).T  # direct lattice in alat units
+        cls.charge = np.random.RandomState(0).rand(6, 7, 8)
+        cls.G = compute_G(cls.b, cls.charge.shape)
+
+    def setUp(self):
+        set_interactive(False)
+        self.addCleanup(set_interactive, True)
+        plt.close('all')
+
+    def test_non_interactive(self):
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(plt, 'show') as show:
+            fig_file = os.path.join(tmpdir, 'line.png')
+            fig = plot1D_FFTinterp(self.charge, self.G, self.a, nx=5, fig_file=fig_file)
+            self.assertTrue(os.path.isfile(fig_file))
+        self.assertFalse(show.called)
+        self.assertEqual(plt.get_fignums(), [])
+        self.assertIsNot(fig, plt.gcf())
+        plt.close('all')
+
+        # In interactive mode the figures are managed by pyplot
+        set_interactive(True)
+        fig = new_figure()
+        self.assertEqual(plt.get_fignums(), [fig.number])
+        plt.close('all')
+
+    def test_render_sections(self):
+        x0 = np.array([0.1, 0.0, 0.2])
+        sections = [dict(x0=x0, e1=(1.0, 0.5, 0.0), nx=5),
+                    dict(dim=2, x0=x0, e1=(1.0, 0.0, 0.0), e2=(0.0, 0.0, 2.0), nx=4, ny=3)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for k, section in enumerate(sections):
+                section['fig_file'] = os.path.join(tmpdir, 'section%d.png' % k)
+                section['plot_file'] = os.path.join(tmpdir, 'section%d.dat' % k)
+            with mock.patch.object(plt, 'show') as show:
+                results = render_sections(self.charge, self.G, self.a, sections, max_workers=2)
+            for section in sections:
+                self.assertTrue(os.path.isfile(section['fig_file']))
+                self.assertTrue(os.path.isfile(section['plot_file']))
+            self.assertTrue(np.allclose(np.loadtxt(sections[1]['plot_file'], skiprows=1)[:, 2],
+                                        np.ravel(results[1][2])))
+
+        self.assertFalse(show.called)
+        self.assertEqual(plt.get_fignums(), [])
+        expected = compute_sections(self.charge, self.G, self.a, sections)
+        for arrays, expected_arrays in zip(results, expected):
+            self.assertEqual(len(arrays), len(expected_arrays))
+            for x, y in zip(arrays, expected_arrays):
+                self.assertTrue(np.allclose(x, y))
+
+
+if __name__ == '__main__':
+    unittest.main()
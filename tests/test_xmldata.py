@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the lazy XML data access classes of postqe.
+"""
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+from unittest import mock
+import xmlschema
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.xmldata import XMLData, PWData
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+
+
+class TestXMLData(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = xmlschema.XMLSchema(SCHEMA)
+
+    def test_lazy_decoding(self):
+        data = PWData(os.path.join(TEST_DIR, 'Si/Si.xml'), schema=self.schema)
+        with mock.patch.object(self.schema, 'to_dict', wraps=self.schema.to_dict) as to_dict:
+            def decoded():
+                return [call[1]['path'] for call in to_dict.call_args_list]
+
+            self.assertEqual(len(data), len(PWData.fields))
+            self.assertEqual(decoded(), [])
+
+            # Only the subtree of the key is decoded, once also for the keys with the same path
+            self.assertEqual(data['nat'], 2)
+            self.assertEqual(decoded(), ['output/atomic_structure'])
+            self.assertIs(data['a'], data.a)
+            self.assertEqual(data.decode('output/atomic_structure')['@alat'], data['alat'])
+            self.assertEqual(decoded(), ['output/atomic_structure'])
+
+            self.assertEqual(list(data['nr']), [24, 24, 24])
+            self.assertEqual(decoded(), ['output/atomic_structure', 'output/basis_set/fft_grid'])
+
+    def test_xml_data(self):
+        data = XMLData(os.path.join(TEST_DIR, 'Si/Si.xml'), schema=self.schema)
+        self.assertEqual(list(data), ['general_info', 'parallel_info', 'input', 'output', 'status',
+                                      'cputime', 'closed'])
+        self.assertEqual(data['output']['atomic_structure']['@nat'], 2)
+        self.assertIs(data['output'], data.output)
+        data['nat'] = 2
+        del data['input']
+        self.assertNotIn('input', data)
+        self.assertEqual(len(data), 7)
+
+    def test_schema_location(self):
+        # The schema is found from the xsi:schemaLocation of the root, also reading from a file object
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copy(os.path.join(TEST_DIR, 'Si/Si.xml'), tmpdir)
+            shutil.copy(SCHEMA, os.path.join(tmpdir, 'espresso.xsd'))
+            self.assertEqual(PWData(os.path.join(tmpdir, 'Si.xml'))['nat'], 2)
+            with open(os.path.join(tmpdir, 'Si.xml'), 'rb') as fp:
+                self.assertEqual(PWData(fp)['nat'], 2)
+            with open(os.path.join(tmpdir, 'Si.xml'), 'rb') as fp:
+                self.assertEqual(PWData(io.BytesIO(fp.read()), schema=SCHEMA)['nat'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
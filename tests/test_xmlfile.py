@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c), 2016-2017, Quantum Espresso Foundation and SISSA (Scuola
+# Internazionale Superiore di Studi Avanzati). All rights reserved.
+# This file is distributed under the terms of the LGPL-2.1 license. See the
+# file 'LICENSE' in the root directory of the present distribution, or
+# https://opensource.org/licenses/LGPL-2.1
+#
+"""
+Tests for the streaming reader of the xml output files of postqe.
+"""
+import unittest
+import sys
+import os
+import io
+import re
+import numpy as np
+import xmlschema
+
+# Adds the the package directory to sys.path, in order to make
+# the development module loadable also without set PYTHONPATH.
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEST_DIR)
+if sys.path[0] != PACKAGE_DIR:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from postqe.xmlfile import iterparse_xml, iter_steps, read_band_structure
+from postqe.xmldata import PWData
+
+SCHEMA = os.path.join(TEST_DIR, 'schemas/qes.xsd')
+
+
+def get_relax_xml(nsteps):
+    """Builds a relax-style xml output, adding *nsteps* step elements to the Si test file."""
+    with open(os.path.join(TEST_DIR, 'Si/Si.xml')) as fp:
+        text = fp.read()
+    start = text.index('  <output>')
+    structure = re.search(r'    <atomic_structure.*?</atomic_structure>', text[start:], re.S).group(0)
+    steps = []
+    for k in range(1, nsteps + 1):
+        steps.append('  <step n_step="%d">\n%s\n    <total_energy><etot>%f</etot></total_energy>\n'
+                     '    <forces rank="2" dims="3 2">%s</forces>\n  </step>\n'
+                     % (k, structure, -7.9 - 0.01 * k, ' '.join(['%f' % (0.1 * k)] * 6)))
+    return (text[:start] + ''.join(steps) + text[start:]).encode()
+
+
+def get_content(value):
+    """Gets the content of an element decoded by xmlschema, also when it has attributes."""
+    return value['$'] if isinstance(value, dict) else value
+
+
+class TestXmlFile(unittest.TestCase):
+
+    def test_iter_steps(self):
+        steps = list(iter_steps(io.BytesIO(get_relax_xml(3))))
+        self.assertEqual([step['n_step'] for step in steps], [1, 2, 3])
+        self.assertEqual([step['etot'] for step in steps], [-7.91, -7.92, -7.93])
+        cell = PWData(os.path.join(TEST_DIR, 'Si/Si.xml'), schema=SCHEMA)['a']
+        for k, step in enumerate(steps, 1):
+            self.assertEqual(step['nat'], 2)
+            self.assertEqual(step['forces'].shape, (2, 3))
+            self.assertTrue(np.allclose(step['forces'], 0.1 * k))
+            self.assertTrue(np.allclose(step['cell'], cell))
+            self.assertEqual(step['positions'].shape, (2, 3))
+
+    def test_cleared_elements(self):
+        # The elements are complete when yielded, then the steps and the children
+        # of the root are removed from the tree
+        paths = []
+        for path, elem in iterparse_xml(io.BytesIO(get_relax_xml(3))):
+            if path == 'step':
+                self.assertEqual([child.tag for child in elem], ['atomic_structure', 'total_energy', 'forces'])
+            elif path == 'output/band_structure':
+                self.assertEqual(len(elem.findall('ks_energies')), 0)
+            paths.append(path)
+            root = elem
+        self.assertEqual(paths[-1], '')
+        self.assertEqual(paths.count('step'), 3)
+        self.assertEqual(len(root), 0)
+
+    def test_read_band_structure(self):
+        for name in ('Si/Si.xml', 'Ni_pbe_us/Ni.xml', 'examples/Si.xml'):
+            xmlfile = os.path.join(TEST_DIR, name)
+            bands = read_band_structure(xmlfile)
+            data = PWData(xmlfile, schema=SCHEMA)
+            self.assertTrue(np.allclose(bands['b'], data['b']))
+            self.assertEqual(bands['ibrav'], data['ibrav'])
+            self.assertEqual(bands['lsda'], data['lsda'])
+
+            output = xmlschema.to_dict(xmlfile, schema=SCHEMA, path='./output')
+            ks_energies = output['band_structure']['ks_energies']
+            self.assertEqual(bands['nks'], len(ks_energies))
+            self.assertTrue(np.allclose(bands['eigenvalues'], [get_content(ks['eigenvalues']) for ks in ks_energies]))
+            self.assertTrue(np.allclose(bands['weights'], [ks['k_point']['@weight'] for ks in ks_energies]))
+            self.assertTrue(np.allclose(bands['kpoints'], [get_content(ks['k_point']) for ks in ks_energies]))
+
+
+if __name__ == '__main__':
+    unittest.main()